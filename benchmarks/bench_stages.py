@@ -0,0 +1,261 @@
+#!python
+# -*- coding: utf-8 -*-
+#
+# Date        : Oct 18, 2026
+"""
+.. note::
+
+    This program times the in-process (``--engine numpy``) stages of the
+    pipeline on the synthetic data of synthetic.py, for several numbers of
+    objects and worker processes. It needs neither jedisim nor IMCAT.
+
+    Stages and what is timed:
+
+    =========  ===========================================================
+    build      a02 measurement of the images: peaks.find_peaks,
+               shapes.refine_catalog, shapes.getshapes and
+               psf_correction.correct_catalog, one image per task of a pool
+               of --jobs processes
+    cut        a03 bigcat_cutcat_stream: concatenate and cut the catalogs
+    fit        a03 create_pars_numpy: the 8 P_gamma fits
+    model      a04 fitted_shear_numpy: evaluate the models, shear catalog
+    profile    a05 etprofile_numpy: the four tangential profiles
+    merge      a06 run: the color-mono dat and cat files
+    plot       a08 plots_numpy: the multipage pdf (matplotlib, or plotcat
+               when matplotlib is not installed, skipped without both)
+    =========  ===========================================================
+
+    Measuring the images is far slower than the catalog stages, so build
+    uses at most ``--build-max`` objects (objects_in of its record).
+
+    The data are made before timing, in a temporary directory that is
+    removed at the end (``--keep`` to keep it). Every (stage, objects, jobs)
+    gives one JSON line with the wall and CPU time (this process and its
+    children), the peak RSS and objects per second, appended to --output.
+
+:Usage: Typical use::
+
+    python benchmarks/bench_stages.py --objects 1000 100000 1000000
+    python benchmarks/bench_stages.py --stages build --objects 20000 --jobs 1 2 4 8
+    python benchmarks/bench_stages.py --objects 10000000 --files 300 --binary
+
+"""
+# Imports
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import socket
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'scripts'))
+sys.path.insert(0, HERE)
+import catalog
+import peaks
+import psf_correction
+import shapes
+import synthetic
+
+STAGES = ['build','cut','fit','model','profile','merge','plot']
+
+# redshift used for the directory names
+Z = 0.7
+
+# galaxies per image of the build stage
+PER_IMAGE = 2000
+IMAGE_SIZE = 2048
+BUILD_MAX = 20000
+
+
+def _usage():
+    """Return (cpu seconds, peak RSS kB) of this process and its children."""
+    me = resource.getrusage(resource.RUSAGE_SELF)
+    ch = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return (me.ru_utime + me.ru_stime + ch.ru_utime + ch.ru_stime,
+            max(me.ru_maxrss, ch.ru_maxrss))
+
+
+def timed(func, *args):
+    """Run func(*args) and return (its result, wall seconds, cpu seconds, peak RSS kB)."""
+    cpu0, _ = _usage()
+    t0 = time.perf_counter()
+    result = func(*args)
+    wall = time.perf_counter() - t0
+    cpu1, rss = _usage()
+    return result, wall, cpu1 - cpu0, rss
+
+
+def _build_image(args):
+    """Measure one synthetic image like a02 --engine numpy, return the number of objects."""
+    path, = args
+    image = np.load(path, mmap_mode='r')
+    cat = peaks.find_peaks(np.asarray(image))
+    cat['fs'] = np.full(len(cat), float(np.median(image[::8, ::8])))
+    cat = shapes.refine_catalog(cat, image)
+    n = len(cat)
+    # the same stars for the four measurements, no psf anisotropy
+    stmod = np.tile([1.,0.,0.,1., 1.,0.,0.,1., 0.,0., 0.], (n,1))
+    for p in psf_correction.PREFIXES:
+        meas = shapes.getshapes(cat, image)
+        for k in ['e','psh','psm']:
+            cat[p+k] = meas[k]
+        cat[p+'stmod'] = stmod
+    psf_correction.correct_catalog(cat)
+    return n
+
+
+def bench_build(objects, jobs, images):
+    """Measure the images with a pool of jobs processes."""
+    if jobs > 1:
+        pool = multiprocessing.Pool(processes=jobs)
+        try:
+            counts = pool.map(_build_image, [(p,) for p in images])
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        counts = [_build_image((p,)) for p in images]
+    return sum(counts)
+
+
+def make_images(objects, seed, workdir):
+    """Write the images of the build stage as .npy files, return their paths."""
+    nimages = max(1, int(np.ceil(objects / float(PER_IMAGE))))
+    paths = []
+    for k in range(nimages):
+        n = min(PER_IMAGE, objects - k * PER_IMAGE)
+        image, cat = synthetic.make_image(n, IMAGE_SIZE, seed, k)
+        path = os.path.join(workdir, 'image_{:d}.npy'.format(k))
+        np.save(path, image)
+        paths.append(path)
+    return paths
+
+
+def run_stage(stage, objects, jobs, seed, workdir, files, binary, build_max=BUILD_MAX):
+    """Time one stage and return its record (None when it was skipped)."""
+    import a03_Pgamma_cat as a03
+    import a04_fitted_Pgamma as a04
+    import a05_etprofile_cm_shear_ellip as a05
+    import a06_cm_galshear_shear_ellip_dat as a06
+    import a08_create_plots as a08
+
+    pwd = 'galshear/galshear_cat_z{}'.format(Z)
+    nin = objects
+    if stage == 'build':
+        nin = min(objects, build_max)
+        images = make_images(nin, seed, workdir)
+        nout, wall, cpu, rss = timed(bench_build, nin, jobs, images)
+    elif stage == 'cut':
+        synthetic.make_galshear_cats(Z, objects, files, seed, binary=binary)
+        _, wall, cpu, rss = timed(a03.bigcat_cutcat_stream, Z)
+        nout = len(catalog.read_cat(os.path.join(pwd,'galshear_cut.cat')))
+    elif stage == 'fit':
+        nin = len(catalog.read_cat(os.path.join(pwd,'galshear_cut.cat')))
+        _, wall, cpu, rss = timed(a03.create_pars_numpy, Z)
+        nout = 8
+    elif stage == 'model':
+        nin = len(catalog.read_cat(os.path.join(pwd,'galshear_cut.cat')))
+        _, wall, cpu, rss = timed(a04.fitted_shear_numpy, Z)
+        nout = len(catalog.read_cat(os.path.join(pwd,'galshear_shear.cat')))
+    elif stage == 'profile':
+        nin = len(catalog.read_cat(os.path.join(pwd,'galshear_shear.cat')))
+        _, wall, cpu, rss = timed(a05.etprofile_numpy, Z)
+        nout = 4
+    elif stage == 'merge':
+        nin = 4
+        _, wall, cpu, rss = timed(a06.run, [Z])
+        nout = 4
+    elif stage == 'plot':
+        try:
+            import matplotlib
+            engine = 'numpy'
+        except ImportError:
+            engine = 'imcat'
+        if engine == 'imcat' and shutil.which('plotcat') is None:
+            print('Skipped : plot (neither matplotlib nor plotcat is installed)')
+            return None
+        _, wall, cpu, rss = timed(a08.run, Z, engine)
+        nin, nout = 2, 8
+    return {'stage': stage, 'objects': objects, 'jobs': jobs,
+            'objects_in': nin, 'objects_out': nout,
+            'wall': wall, 'cpu': cpu, 'maxrss_kb': rss,
+            'objects_per_s': nin / wall if wall > 0 else None}
+
+
+def bench(sizes, jobs, stages, seed=0, files=10, binary=False, keep=False,
+          build_max=BUILD_MAX):
+    """Run the stages for every number of objects and of jobs.
+
+    The stages of one number of objects run in order in the same directory
+    (each uses the outputs of the one before), only build uses several jobs.
+
+    Returns:
+      list: the records of run_stage.
+
+    """
+    env = {'host': socket.gethostname(), 'cores': os.cpu_count(),
+           'python': platform.python_version(), 'numpy': np.__version__,
+           'seed': seed, 'files': files, 'binary': binary,
+           'time': time.strftime('%Y-%m-%dT%H:%M:%S')}
+    records = []
+    cwd = os.getcwd()
+    for objects in sizes:
+        workdir = tempfile.mkdtemp(prefix='bench_{}_'.format(objects))
+        os.chdir(workdir)
+        try:
+            for stage in [s for s in STAGES if s in stages]:
+                for j in (jobs if stage == 'build' else [1]):
+                    record = run_stage(stage, objects, j, seed, workdir, files, binary,
+                                       build_max)
+                    if record is None:
+                        continue
+                    record.update(env)
+                    records.append(record)
+                    print('{:<8s} {:>9d} objects {:>3d} jobs {:>9.3f} s {:>12.0f} objects/s'.format(
+                          stage, record['objects_in'], j, record['wall'], record['objects_per_s'] or 0))
+        finally:
+            os.chdir(cwd)
+            if keep:
+                print('Kept : {}'.format(workdir))
+            else:
+                shutil.rmtree(workdir, ignore_errors=True)
+    return records
+
+
+def main():
+    """Run main function."""
+    parser = argparse.ArgumentParser(description='Time the pipeline stages on synthetic data.')
+    parser.add_argument('--objects', type=int, nargs='+', default=[1000, 10000, 100000],
+                        help='numbers of objects e.g. 1000 100000 10000000')
+    parser.add_argument('--jobs', type=int, nargs='+', default=[1],
+                        help='numbers of worker processes of the build stage')
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=STAGES,
+                        help='stages to time')
+    parser.add_argument('--build-max', type=int, default=BUILD_MAX,
+                        help='largest number of objects measured by the build stage')
+    parser.add_argument('--files', type=int, default=10, help='number of galaxy files')
+    parser.add_argument('--binary', action='store_true', help='binary galaxy catalogs')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=os.path.join(HERE, '..', 'bench_output.txt'),
+                        help='JSON lines file the results are appended to')
+    parser.add_argument('--keep', action='store_true', help='keep the data directories')
+    args = parser.parse_args()
+
+    records = bench(args.objects, args.jobs, args.stages, args.seed, args.files,
+                    args.binary, args.keep, args.build_max)
+    with open(args.output, 'a') as f:
+        for record in records:
+            f.write(json.dumps(record) + '\n')
+    print('Appended {} results to {}'.format(len(records), os.path.abspath(args.output)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+#!python
+# -*- coding: utf-8 -*-
+#
+# Date        : Oct 18, 2026
+"""
+.. note::
+
+    This module makes seeded synthetic data for the benchmarks, so the
+    stages can be timed without the jedisim outputs and without IMCAT.
+
+    make_image draws elliptical Gaussian galaxies on a noisy sky, and
+    write_fits saves it with astropy (the only use of astropy here).
+
+    make_galshear_cats writes galaxy catalogs like a02 does with
+    ``--engine numpy``. Every galaxy has an intrinsic ellipticity e_int, and
+    its 90 degree rotated twin has -e_int. All four measurements (c, c9, m,
+    m9) get the same tangential shear g_t = G0 (R0 / r) about
+    etprofile.ORIGIN, multiplied by their P_gamma. The profiles made from
+    these catalogs follow that shear, and the outputs of every stage are
+    real numbers that can be checked.
+
+    The same seed always gives the same data.
+
+:Usage: Typical use::
+
+    python synthetic.py galshear 0.7 --objects 1000000 --files 100
+    python synthetic.py image lsst_z0.7_0.fits --objects 2000 --size 2048
+
+"""
+# Imports
+import argparse
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+import catalog
+import etprofile
+import peaks
+
+# tangential shear g_t = G0 * R0 / r about etprofile.ORIGIN
+G0 = 0.05
+R0 = 200.0
+
+# intrinsic ellipticity dispersion per component
+SIGMA_E = 0.3
+
+# image of the detector, in pixels
+SIZE = 3400
+
+
+def _rng(seed, *keys):
+    """Return a generator for the seed and the keys (e.g. the galaxy file index)."""
+    return np.random.default_rng([seed] + [int(k) for k in keys])
+
+
+def tangential_shear(x, origin=etprofile.ORIGIN):
+    """Return the shear (g1, g2) of the objects at positions x, shape (n,2)."""
+    dx = x[:,0] - origin[0]
+    dy = x[:,1] - origin[1]
+    r2 = np.maximum(dx*dx + dy*dy, 1.0)
+    gt = G0 * R0 / np.sqrt(r2)
+    cos2phi = (dx*dx - dy*dy) / r2
+    sin2phi = 2 * dx*dy / r2
+    # e_t = -(e1 cos2phi + e2 sin2phi) like etprofile
+    return np.column_stack([-gt * cos2phi, -gt * sin2phi])
+
+
+def galshear_catalog(n, seed=0, gfile=0, size=SIZE):
+    """Return a synthetic catalog of a02 with n objects.
+
+    Object items: x, rg, mag, dx, converged, e, Pg and xe, xPg for the
+    prefixes c, c9, m, m9.
+    """
+    rng = _rng(seed, gfile)
+    cat = catalog.Catalog()
+    x   = rng.uniform(0, size, (n,2))
+    rg  = rng.uniform(1.5, 6.0, n)
+    cat['x']   = x
+    cat['rg']  = rg
+    cat['mag'] = rng.uniform(-1.0, 4.0, n)
+    cat['dx']  = rng.normal(0, 0.04, (n,2))
+    cat['converged'] = (rng.uniform(size=n) > 0.02).astype(float)
+
+    g     = tangential_shear(x)
+    e_int = rng.normal(0, SIGMA_E, (n,2))
+    for p, sign in [('c',1), ('c9',-1), ('m',1), ('m9',-1)]:
+        # P_gamma of a Gaussian is close to 2 (1 - e^2 / 2) and grows with size
+        pg = np.zeros((n,2,2))
+        diag = (1.6 + 0.05 * rg)[:,None] + rng.normal(0, 0.05, (n,2))
+        pg[:,0,0], pg[:,1,1] = diag[:,0], diag[:,1]
+        cat[p+'e']  = sign * e_int + diag * g + rng.normal(0, 0.01, (n,2))
+        cat[p+'Pg'] = pg
+    cat['e']  = cat['m9e']
+    cat['Pg'] = cat['m9Pg']
+    return cat
+
+
+def make_galshear_cats(z, objects, files, seed=0, outdir=None, binary=False):
+    """Write galshear_z{z}_{i}.cat for i < files, with objects in total.
+
+    Returns:
+      list: the paths of the catalogs.
+
+    """
+    if outdir is None:
+        outdir = 'galshear/galshear_cat_z{}'.format(z)
+    if not os.path.isdir(outdir):
+        os.makedirs(outdir)
+    sizes = np.full(files, objects // files)
+    sizes[:objects % files] += 1
+    paths = []
+    for i, n in enumerate(sizes):
+        path = os.path.join(outdir, 'galshear_z{}_{:d}.cat'.format(z,i))
+        catalog.write_cat(path, galshear_catalog(int(n), seed, i), binary=binary)
+        paths.append(path)
+    return paths
+
+
+def make_image(objects, size=2048, seed=0, index=0, sky=100.0, noise=5.0):
+    """Return an image of elliptical Gaussian galaxies and their true catalog.
+
+    Returns:
+      tuple: (image, cat) where cat has x (column, row), rg, flux and the
+      true ellipticity e.
+
+    """
+    rng = _rng(seed, index)
+    margin = 24
+    x    = rng.uniform(margin, size - margin, (objects,2))
+    rg   = rng.uniform(1.5, 4.0, objects)
+    flux = rng.uniform(500.0, 5000.0, objects)
+    e    = rng.normal(0, SIGMA_E, (objects,2))
+    e   /= np.maximum(1.0, np.hypot(e[:,0], e[:,1]) / 0.7)[:,None]
+
+    image = sky + rng.normal(0, noise, (size,size))
+    half  = int(np.ceil(4 * rg.max()))
+    u = np.arange(-half, half + 1, dtype=float)
+    for k in range(objects):
+        # second moments rg^2 (1 + e1, 1 - e1, e2) of an elliptical Gaussian
+        # the centre of pixel [i0, j0] is at (j0 + 0.5, i0 + 0.5), see peaks.py
+        i0 = int(round(x[k,1] - peaks.PIXEL_CENTRE))
+        j0 = int(round(x[k,0] - peaks.PIXEL_CENTRE))
+        dy = u[:,None] + i0 + peaks.PIXEL_CENTRE - x[k,1]
+        dx = u[None,:] + j0 + peaks.PIXEL_CENTRE - x[k,0]
+        q11, q22, q12 = rg[k]**2 * (1 + e[k,0]), rg[k]**2 * (1 - e[k,0]), rg[k]**2 * e[k,1]
+        det = q11*q22 - q12*q12
+        chi = (q22*dx*dx - 2*q12*dx*dy + q11*dy*dy) / det
+        stamp = flux[k] / (2*np.pi*np.sqrt(det)) * np.exp(-0.5 * chi)
+        image[i0 - half:i0 + half + 1, j0 - half:j0 + half + 1] += stamp
+
+    cat = catalog.Catalog()
+    cat['x'], cat['rg'], cat['flux'], cat['e'] = x, rg, flux, e
+    return image, cat
+
+
+def write_fits(path, image):
+    """Write an image as a fitsfile (needs astropy)."""
+    from astropy.io import fits
+    fits.PrimaryHDU(image.astype(np.float32)).writeto(path, overwrite=True)
+
+
+def main():
+    """Run main function."""
+    parser = argparse.ArgumentParser(description='Make synthetic benchmark data.')
+    sub = parser.add_subparsers(dest='command')
+    p = sub.add_parser('galshear', help='galaxy catalogs of a02')
+    p.add_argument('z', type=float, help='redshift e.g. 0.7')
+    p.add_argument('--objects', type=int, default=100000, help='objects in total')
+    p.add_argument('--files', type=int, default=10, help='number of galaxy files')
+    p.add_argument('--binary', action='store_true', help='write binary catalogs')
+    p.add_argument('--seed', type=int, default=0)
+    p = sub.add_parser('image', help='fitsfile of galaxies')
+    p.add_argument('fitsfile', help='output fitsfile')
+    p.add_argument('--objects', type=int, default=2000, help='galaxies in the image')
+    p.add_argument('--size', type=int, default=2048, help='image size in pixels')
+    p.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    if args.command == 'galshear':
+        paths = make_galshear_cats(args.z, args.objects, args.files, args.seed,
+                                   binary=args.binary)
+        print('Created {} catalogs with {} objects in {}'.format(len(paths), args.objects,
+              os.path.dirname(paths[0])))
+    elif args.command == 'image':
+        image, cat = make_image(args.objects, args.size, args.seed)
+        write_fits(args.fitsfile, image)
+        print('Created : {} ({} galaxies)'.format(args.fitsfile, len(cat)))
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
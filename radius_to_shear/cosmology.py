@@ -0,0 +1,166 @@
+#!python
+# -*- coding: utf-8 -*-
+#
+# Date        : Oct 18, 2026
+"""
+.. note::
+
+    This module computes the distances used by radius_to_shear.py for
+    arrays of lens and source redshifts.
+
+    The comoving distance is::
+
+      D_c(z) = c / H0 * int_0^z dz' / E(z'),   E(z) = sqrt(Omega_m (1+z)^3 + Omega_d)
+
+    It is integrated once on a fine grid of redshifts (trapezoid rule,
+    cumulative) for every (H0, Omega_m, Omega_d), and every query is an
+    interpolation in that table. The relative error is below 1e-6 with
+    the default step. The table is saved in SHEAR_COSMOLOGY_DIR (default
+    ./.cosmology) and read back by the next runs.
+
+    As in radius_to_shear.py the universe is taken to be flat::
+
+      D_s  = D_c(z_source) / (1 + z_source)
+      D_ds = (D_c(z_source) - D_c(z_lens)) / (1 + z_source)
+
+    and the convergence of a singular isothermal sphere at a radius of r
+    pixels is kappa_constant / r with::
+
+      kappa_constant = 206264.8062471 * 2 pi sigma^2 / c^2 * D_ds / D_s / pix_scale
+
+:Usage: Typical use::
+
+    import cosmology
+    cosmo = cosmology.get()                    # H0 67.80, Omega_m 0.315, Omega_d 0.685
+    D_s, D_ds = cosmo.distances(0.3, [0.5, 0.7, 1.0, 1.5])
+    k = cosmo.kappa_constant(1000, z_lens[:,None], z_source[None,:], 0.2)
+
+"""
+# Imports
+import os
+
+import numpy as np
+
+# Physics (the values of radius_to_shear.py)
+c         = 3e5     # Speed of light km/s
+Hubble    = 67.80   # Hubble constant (km/s)/Mpc
+Omega_m   = 0.315   # Current mass density parameter
+Omega_d   = 0.685   # Effective density of dark energy
+
+ARCSEC = 206264.8062471  # arcseconds per radian
+
+# redshift grid of the table
+ZMAX = 10.0
+DZ   = 1e-3
+
+COSMOLOGY_DIR = os.environ.get('SHEAR_COSMOLOGY_DIR', '.cosmology')
+
+_cosmologies = {}
+
+
+def E(z,Omega_m=Omega_m,Omega_d=Omega_d):
+    """Return E(z) = H(z) / H0."""
+    return np.sqrt(Omega_m * (1 + np.asarray(z, dtype=float))**3 + Omega_d)
+
+
+def table_path(H0=Hubble,Omega_m=Omega_m,Omega_d=Omega_d,zmax=ZMAX,dz=DZ):
+    """Return the file of the comoving distance table of a cosmology."""
+    name = 'comoving_H{!r}_Om{!r}_Od{!r}_z{!r}_dz{!r}.npz'.format(
+           float(H0), float(Omega_m), float(Omega_d), float(zmax), float(dz))
+    return os.path.join(COSMOLOGY_DIR, name)
+
+
+def comoving_table(H0=Hubble,Omega_m=Omega_m,Omega_d=Omega_d,zmax=ZMAX,dz=DZ):
+    """Return (z, D_c(z)) on a grid from 0 to zmax, in Mpc.
+
+    The integrand is evaluated on a grid 4 times finer than the table and
+    summed with the trapezoid rule.
+    """
+    n  = int(round(zmax / dz))
+    zf = np.linspace(0.0, zmax, 4 * n + 1)
+    f  = 1.0 / E(zf,Omega_m,Omega_d)
+    cum = np.concatenate([[0.0], np.cumsum(0.5 * (f[1:] + f[:-1]) * np.diff(zf))])
+    return zf[::4], c / H0 * cum[::4]
+
+
+def load_table(H0=Hubble,Omega_m=Omega_m,Omega_d=Omega_d,zmax=ZMAX,dz=DZ):
+    """Return the comoving distance table, from the disk cache when it is there."""
+    path = table_path(H0,Omega_m,Omega_d,zmax,dz)
+    if os.path.isfile(path):
+        try:
+            with np.load(path) as data:
+                return data['z'], data['D_c']
+        except (OSError, KeyError, ValueError):
+            pass
+    z, D_c = comoving_table(H0,Omega_m,Omega_d,zmax,dz)
+    try:
+        if not os.path.isdir(COSMOLOGY_DIR):
+            os.makedirs(COSMOLOGY_DIR, exist_ok=True)
+        # written next to path and renamed when complete
+        tmp = path + '.{}.part'.format(os.getpid())
+        with open(tmp, 'wb') as f:
+            np.savez(f, z=z, D_c=D_c)
+        os.rename(tmp, path)
+    except OSError as exc:
+        print('cosmology: cannot write {}: {}'.format(path, exc))
+    return z, D_c
+
+
+class Cosmology(object):
+    """Distances of a flat cosmology, by interpolation in a comoving distance table.
+
+    All the methods take numbers or arrays and broadcast them like numpy.
+    """
+
+    def __init__(self,H0=Hubble,Omega_m=Omega_m,Omega_d=Omega_d,zmax=ZMAX,dz=DZ):
+        self.H0      = H0
+        self.Omega_m = Omega_m
+        self.Omega_d = Omega_d
+        self.z, self.D_c = load_table(H0,Omega_m,Omega_d,zmax,dz)
+
+    def comoving_distance(self, z):
+        """Return the comoving distance to redshift z in Mpc."""
+        z = np.asarray(z, dtype=float)
+        if np.any(z < 0) or np.any(z > self.z[-1]):
+            raise ValueError('redshift outside of the table [0, {}]'.format(self.z[-1]))
+        return np.interp(z, self.z, self.D_c)
+
+    def angular_diameter_distance(self, z):
+        """Return the angular diameter distance of redshift z in Mpc."""
+        z = np.asarray(z, dtype=float)
+        return self.comoving_distance(z) / (1 + z)
+
+    def distances(self, z_lens, z_source):
+        """Return (D_s, D_ds) in Mpc, D_ds is 0 when the source is not behind the lens."""
+        z_lens   = np.asarray(z_lens, dtype=float)
+        z_source = np.asarray(z_source, dtype=float)
+        D_cs = self.comoving_distance(z_source)
+        D_s  = D_cs / (1 + z_source)
+        D_ds = np.maximum(D_cs - self.comoving_distance(z_lens), 0.0) / (1 + z_source)
+        return D_s, D_ds
+
+    def kappa_constant(self, sigma, z_lens, z_source, pix_scale):
+        """Return kappa_constant of a singular isothermal sphere.
+
+        Args:
+          sigma (float or array): velocity dispersion of the lens in km/s.
+          z_lens, z_source (float or array): redshifts.
+          pix_scale (float or array): arcseconds per pixel.
+
+        Returns:
+          array: kappa at one pixel from the lens centre (kappa = kappa_constant / r).
+
+        """
+        sigma = np.asarray(sigma, dtype=float)
+        D_s, D_ds = self.distances(z_lens, z_source)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratio = np.where(D_s > 0, D_ds / D_s, 0.0)
+        return ARCSEC * (2 * np.pi * sigma * sigma / (c * c)) * ratio / pix_scale
+
+
+def get(H0=Hubble,Omega_m=Omega_m,Omega_d=Omega_d,zmax=ZMAX,dz=DZ):
+    """Return the Cosmology of these parameters, made once per process."""
+    key = (float(H0), float(Omega_m), float(Omega_d), float(zmax), float(dz))
+    if key not in _cosmologies:
+        _cosmologies[key] = Cosmology(H0,Omega_m,Omega_d,zmax,dz)
+    return _cosmologies[key]
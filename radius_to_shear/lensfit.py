@@ -0,0 +1,219 @@
+#!python
+# -*- coding: utf-8 -*-
+#
+# Date        : Oct 18, 2026
+"""
+.. note::
+
+    This program fits a singular isothermal sphere to the measured shear
+    profiles of a05, for the color and the mono galaxies and for several
+    source redshifts at once.
+
+    The model is the reduced shear of radius_to_shear.py::
+
+      kappa = kappa_constant(sigma, z_lens, z_source) / r,   g = kappa / (1 - kappa)
+
+    It is evaluated on the whole (sigma, z_lens) grid for every redshift
+    and every radial bin as one broadcasted array of shape
+    (redshifts, sigma, z_lens, bins), and compared with the measured gt and
+    its error::
+
+      chi2 = sum over the bins of ((gt - g) / gterror)^2
+
+    The profiles of the redshifts may have different numbers of bins: they
+    are padded with NaN, and the padded and empty bins do not count. A grid
+    point that puts a bin inside the Einstein radius (kappa >= 1) has
+    chi2 = inf.
+
+    For a single source redshift only sigma^2 D_ds / D_s is measured, so
+    sigma and z_lens are degenerate; the joint chi2 (the sum over the
+    redshifts) constrains both.
+
+:Depends: galshear/galshear_cat_z{z}/color_galshear_shear.dat and
+  mono_galshear_shear.dat for every redshift.
+
+:Usage: Typical use::
+
+    python lensfit.py 0.5 0.7 1.0 1.5 --sigma 500 1500 201 --zlens 0.1 0.6 101
+    python lensfit.py 0.7 --save chi2_z0.7.npz
+
+"""
+# Imports
+import argparse
+import os
+
+import numpy as np
+
+import cosmology
+
+pix_scale = 0.2    # final pixel scale (arcsecond per pixel)
+
+# columns of the dat files of etprofile
+# bin   r   ngals   et  eterror   rkappa   kappa  kappaerror  nu
+COLS = {'r': 1, 'ngals': 2, 'et': 3, 'eterror': 4}
+
+# largest number of model values computed at once
+CHUNK = 1 << 22
+
+
+def read_profiles(redshifts, kind='color', pwd='galshear/galshear_cat_z{}'):
+    """Return the shear profiles of several redshifts padded with NaN.
+
+    Args:
+      redshifts (list): source redshifts e.g. [0.5, 0.7, 1.0, 1.5]
+      kind (str): 'color' or 'mono'
+      pwd (str): directory of the dat files, formatted with the redshift.
+
+    Returns:
+      tuple: (r, gt, gterror) of shape (redshifts, largest number of bins).
+
+    """
+    profiles = []
+    for z in redshifts:
+        path = os.path.join(pwd.format(z), '{}_galshear_shear.dat'.format(kind))
+        data = np.loadtxt(path, ndmin=2)
+        data = data[data[:,COLS['ngals']] > 0]
+        profiles.append(data[:,[COLS['r'], COLS['et'], COLS['eterror']]])
+    nbins = max(len(p) for p in profiles)
+    out = np.full((3, len(profiles), nbins), np.nan)
+    for k, p in enumerate(profiles):
+        out[:, k, :len(p)] = p.T
+    return out[0], out[1], out[2]
+
+
+def reduced_shear(kconst, r):
+    """Return g = kappa / (1 - kappa) with kappa = kconst / r, NaN where kappa >= 1."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        kappa = kconst / r
+        return np.where(kappa < 1, kappa / (1 - kappa), np.nan)
+
+
+def chi2_surfaces(r, gt, gterror, z_source, sigma, z_lens, cosmo=None,
+                  pix_scale=pix_scale, chunk=CHUNK):
+    """Return the chi2 of the model for every redshift, sigma and z_lens.
+
+    Args:
+      r, gt, gterror (array): profiles of shape (nz, nbins), NaN padded.
+      z_source (array): source redshifts, shape (nz,).
+      sigma (array): velocity dispersions in km/s, shape (ns,).
+      z_lens (array): lens redshifts, shape (nl,).
+      cosmo (cosmology.Cosmology): distances (default cosmology.get()).
+
+    Returns:
+      tuple: (chi2, nbins), chi2 of shape (nz, ns, nl) and the number of
+      bins used for each, the same shape. chi2 is inf when a bin of the
+      profile lies inside the Einstein radius.
+
+    """
+    cosmo    = cosmo or cosmology.get()
+    z_source = np.asarray(z_source, dtype=float)
+    sigma    = np.asarray(sigma, dtype=float)
+    z_lens   = np.asarray(z_lens, dtype=float)
+
+    valid = np.isfinite(r) & np.isfinite(gt) & np.isfinite(gterror) & (gterror > 0)
+    r     = np.where(valid, r, 1.0)[:,None,None,:]
+    gt    = np.where(valid, gt, 0.0)[:,None,None,:]
+    w     = np.where(valid, 1.0 / np.where(valid, gterror, 1.0)**2, 0.0)[:,None,None,:]
+
+    # kappa_constant of every (redshift, sigma, z_lens), then the bins in chunks of sigma
+    kconst = cosmo.kappa_constant(sigma[None,:,None], z_lens[None,None,:],
+                                  z_source[:,None,None], pix_scale)
+    nz, ns, nl = kconst.shape
+    step  = max(1, chunk // max(1, nz * nl * r.shape[-1]))
+    chi2  = np.empty((nz, ns, nl))
+    for i in range(0, ns, step):
+        g = reduced_shear(kconst[:, i:i+step, :, None], r)
+        d = np.where(w > 0, gt - g, 0.0)
+        c = np.sum(w * d * d, axis=-1)
+        # the model is NaN (kappa >= 1) in a used bin
+        chi2[:, i:i+step, :] = np.where(np.isnan(c), np.inf, c)
+    nbins = np.broadcast_to(valid.sum(axis=-1)[:,None,None], chi2.shape)
+    return chi2, nbins
+
+
+def best_fit(chi2, sigma, z_lens):
+    """Return (sigma, z_lens, chi2) at the minimum of every surface of shape (..., ns, nl)."""
+    flat = chi2.reshape(chi2.shape[:-2] + (-1,))
+    k    = np.argmin(flat, axis=-1)
+    i, j = np.unravel_index(k, chi2.shape[-2:])
+    return np.asarray(sigma)[i], np.asarray(z_lens)[j], np.take_along_axis(flat, k[...,None], -1)[...,0]
+
+
+def fit(redshifts, sigma, z_lens, kinds=('color','mono'), pwd='galshear/galshear_cat_z{}',
+        cosmo=None, pix_scale=pix_scale):
+    """Fit the color and mono shear profiles of several redshifts on a (sigma, z_lens) grid.
+
+    Returns:
+      dict: kind -> dict with
+        chi2 (nz, ns, nl), ndof (nz,), best_sigma, best_z_lens, chi2_min
+        (nz,) for every redshift, and joint_chi2 (ns, nl), joint_sigma,
+        joint_z_lens, joint_chi2_min, joint_ndof for all redshifts together.
+        ndof is the number of bins minus 1 for one redshift (sigma and
+        z_lens act as one parameter) and minus 2 for the joint fit.
+
+    """
+    results = {}
+    for kind in kinds:
+        r, gt, gterror = read_profiles(redshifts, kind, pwd)
+        chi2, nbins = chi2_surfaces(r, gt, gterror, redshifts, sigma, z_lens, cosmo, pix_scale)
+        res = {'chi2': chi2, 'ndof': nbins[:,0,0] - 1}
+        res['best_sigma'], res['best_z_lens'], res['chi2_min'] = best_fit(chi2, sigma, z_lens)
+        joint = chi2.sum(axis=0)
+        res['joint_chi2'] = joint
+        res['joint_ndof'] = int(nbins[:,0,0].sum()) - 2
+        res['joint_sigma'], res['joint_z_lens'], res['joint_chi2_min'] = best_fit(joint, sigma, z_lens)
+        results[kind] = res
+    return results
+
+
+def report(redshifts, results):
+    """Return the table of the best fits of color and mono."""
+    kinds = list(results)
+    lines = ['{:>6s} '.format('z') + ' '.join('{:>10s} {:>8s} {:>12s}'.format(
+             k + ' sigma', 'z_lens', 'chi2/ndof') for k in kinds)]
+
+    def cell(sigma, z_lens, chi2, ndof):
+        return '{:10.1f} {:8.3f} {:>12s}'.format(sigma, z_lens,
+               '{:.2f}/{:d}'.format(chi2, int(ndof)))
+
+    for k, z in enumerate(redshifts):
+        lines.append('{:>6} '.format(z) + ' '.join(cell(results[x]['best_sigma'][k],
+                     results[x]['best_z_lens'][k], results[x]['chi2_min'][k],
+                     results[x]['ndof'][k]) for x in kinds))
+    lines.append('{:>6s} '.format('joint') + ' '.join(cell(results[x]['joint_sigma'],
+                 results[x]['joint_z_lens'], results[x]['joint_chi2_min'],
+                 results[x]['joint_ndof']) for x in kinds))
+    return '\n'.join(lines)
+
+
+def main():
+    """Run main function."""
+    parser = argparse.ArgumentParser(description='Fit an SIS to the shear profiles.')
+    parser.add_argument('z', type=float, nargs='+', help='source redshifts e.g. 0.5 0.7 1.0 1.5')
+    parser.add_argument('--sigma', type=float, nargs=3, default=[200, 2000, 361],
+                        metavar=('MIN','MAX','N'), help='grid of the velocity dispersion (km/s)')
+    parser.add_argument('--zlens', type=float, nargs=3, default=[0.05, 0.6, 111],
+                        metavar=('MIN','MAX','N'), help='grid of the lens redshift')
+    parser.add_argument('--pix-scale', type=float, default=pix_scale,
+                        help='arcseconds per pixel')
+    parser.add_argument('--pwd', default='galshear/galshear_cat_z{}',
+                        help='directory of the dat files, {} is the redshift')
+    parser.add_argument('--save', help='write the chi2 surfaces to this npz file')
+    args = parser.parse_args()
+
+    sigma  = np.linspace(args.sigma[0], args.sigma[1], int(args.sigma[2]))
+    z_lens = np.linspace(args.zlens[0], args.zlens[1], int(args.zlens[2]))
+    results = fit(args.z, sigma, z_lens, pwd=args.pwd, pix_scale=args.pix_scale)
+    print(report(args.z, results))
+
+    if args.save:
+        arrays = {'z_source': np.asarray(args.z), 'sigma': sigma, 'z_lens': z_lens}
+        for kind, res in results.items():
+            for k, v in res.items():
+                arrays['{}_{}'.format(kind,k)] = v
+        np.savez(args.save, **arrays)
+        print('Created : {}'.format(args.save))
+
+
+if __name__ == "__main__":
+    main()
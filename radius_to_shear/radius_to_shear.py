@@ -12,38 +12,30 @@ Calculate and plot reduced shear vs other quantities.
 from __future__ import print_function, division,with_statement,unicode_literals,absolute_import
 import sys
 import matplotlib.pyplot as plt
-import scipy
 import numpy as np
 
+import cosmology
+
 
 # Physics
-c         = 3e5    # Speed of light km/h
-Hubble    = 67.80  # Hubble constant (km/h)/Mpc
-Omega_m   = 0.315  # Current mass density parameter
-Omega_d   = 0.685  # Effective density of dark energy
+c         = cosmology.c        # Speed of light km/s
+Hubble    = cosmology.Hubble   # Hubble constant (km/s)/Mpc
+Omega_m   = cosmology.Omega_m  # Current mass density parameter
+Omega_d   = cosmology.Omega_d  # Effective density of dark energy
 
 sigma     = 1000   # Lens Velocity dispersion km/h (lens.txt)
 z_source  = 0.7    # Source galaxy redshift
 z_lens    = 0.3    # Lens redshift
 pix_scale = 0.2    # final pixel scale (arcsecond per pixel)
 
+# Distances from the cached comoving distance table (cosmology.py)
+cosmo = cosmology.get(Hubble,Omega_m,Omega_d)
 
-def E(z,Omega_m,Omega_vac): # E(z) as it appears in Hubble parameter evolution
-    return np.sqrt(np.reciprocal((Omega_m * (1+z)**3.0)+ Omega_d))
-
-
-def comoving_dist(E,z1,z2): # Comoving distance
-    integral = scipy.integrate.quad(E,z1,z2,args=(Omega_m,Omega_d))
-    return c * integral[0] / Hubble
-
-# Angular diameter distance of source from observer
-D_s  = comoving_dist(E,0,z_source) / (1+z_source)
-
-# angular diameter distance of souce from lens   
-D_ds = comoving_dist(E,z_lens,z_source) / (1+z_source)
+# Angular diameter distances of source from observer and from lens
+D_s, D_ds = cosmo.distances(z_lens,z_source)
 
 # kappa_constant
-kappa_constant = 206264.8062471 * (2*np.pi * (sigma*sigma) / (c*c) ) * (D_ds/D_s) / pix_scale
+kappa_constant = cosmo.kappa_constant(sigma,z_lens,z_source,pix_scale)
 
 
 
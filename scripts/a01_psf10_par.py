@@ -36,31 +36,72 @@ The vector st has 11 components.
 
 :Runtime: 12 seconds on  Dec 15, 2017 (Pisces)
 
+:Usage: Fit psf10 only, or all the psfs psf/psf*.fits in parallel::
+
+    python a01_psf10_par.py
+    python a01_psf10_par.py --all --jobs 8
+
+  Each fit works in its own temporary directory, so several fits (and
+  several copies of this program) can run at once. A par file is refit only
+  when its psf file or psrat changed (see buildcache.py), use ``--force`` to
+  refit anyway.
+
 """
 
 
 # Imports
 from __future__ import print_function
+import argparse
+import glob
+import multiprocessing
 import os
+import re
+import shutil
 import sys
-import subprocess
+import tempfile
 import time
 
+import buildcache
+import runner
+import telemetry
+
+# ratio of pixscales 0.06/0.2
+PSRAT = 0.3
+
+# imcat programs run for every psf
+TOOLS = ['ic','hfindpeaks','getsky','apphot','lc','cleancat','getshapes','fit2Dpolymodel']
+
 def par_lmst(sfile,psrat,ffile,ofile):
     """Create par files for given input fits files.
 
+    The noisy copy of the psf is written to a new temporary directory, and
+    the par file to ofile.part which is renamed to ofile on success, so
+    several fits can run at the same time.
+
     Args:
       sfile (string): psf/psf10
       psrat (float): pixscale ratio 0.06/0.2 = 0.3 # getshapes -s 0.3
       ffile (string): psf/psf10.fits
       ofile (string): psf/psf10.par
 
+    Returns:
+      list: runner.StageResult of every program.
+
+    Raises:
+      runner.PipelineError: naming the imcat program that failed.
+
     """
+    tmpdir = tempfile.mkdtemp(prefix='a01_')
+    tfile  = os.path.join(tmpdir,'temp.fits')
+    pfile  = ofile + '.part'
 
     ## Do imcat analysis
-    commands = r"""
-    ic -s 100 '%1 grand .001 * +' {}  > temp.fits ;
-    hfindpeaks temp.fits -r 0.5 20 |
+    noise = r"""
+    ic -s 100 '%1 grand .001 * +' {}  > {}
+    """.format(ffile,tfile)
+
+    fit = r"""
+    hfindpeaks {} -r 0.5 20 |
     getsky -Z rg 3 |
     apphot -z 30 |
     lc -i '%flux 0 >' |
@@ -76,40 +117,130 @@ def par_lmst(sfile,psrat,ffile,ofile):
     apphot -z 30 |
     getshapes -s  {:.1f} |
     lc +all 'st = %psh[0][0] %psh[0][1] %psh[1][0] %psh[1][1] %psm[0][0] %psm[0][1] %psm[1][0] %psm[1][1] %e[0] %e[1] %rg 11 vector' |
-    fit2Dpolymodel x 0 0 st > {}  ;
-    rm temp.fits
-    """.format(ffile,psrat,psrat,psrat,psrat,ofile)
+    fit2Dpolymodel x 0 0 st > {}
+    """.format(tfile,psrat,psrat,psrat,psrat,pfile)
 
 
     # Print the commands
     print("\nRunning commands :\n")
-    print('Commands : \n', commands)
+    print('Commands : \n', noise, fit)
     print("\n\n")
-    os.system(commands)
+    try:
+        results  = runner.run_command(noise)
+        results += runner.run_command(fit)
+        if not (os.path.isfile(pfile) and os.path.getsize(pfile) > 0):
+            raise runner.PipelineError(results[-1], 'empty par file ' + pfile)
+        os.rename(pfile,ofile)
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+        if os.path.isfile(pfile):
+            os.remove(pfile)
+    return results
+
+
+def psf_files(psfdir='psf'):
+    """Return the psf fitsfiles psfdir/psf{k}.fits sorted by k."""
+    pattern = re.compile(r'psf(\d+)\.fits$')
+    files = [f for f in glob.glob(os.path.join(psfdir,'psf*.fits'))
+             if pattern.search(os.path.basename(f))]
+    return sorted(files, key=lambda f: int(pattern.search(os.path.basename(f)).group(1)))
+
+
+def fit_psf(ffile,psrat=PSRAT,force=False):
+    """Create the par file of one psf unless it is up to date.
+
+    Returns:
+      tuple: (ofile, error, fp, cached) where error is None on success.
+
+    """
+    sfile = ffile[:-len('.fits')]
+    ofile = sfile + '.par'
+    fp = buildcache.fingerprint(inputs=[ffile], params={'psrat': psrat},
+                                tools=TOOLS, code=[__file__])
+    if not force and buildcache.BuildCache.for_outputs([ofile]).is_fresh([ofile],fp):
+        return ofile, None, fp, True
+    try:
+        results = par_lmst(sfile,psrat,ffile,ofile)
+    except runner.PipelineError as exc:
+        return ofile, str(exc), fp, False
+    print(runner.format_results(results))
+    return ofile, None, fp, False
+
+
+def _fit_psf_star(args):
+    """Unpack the arguments of fit_psf for Pool.imap_unordered."""
+    return fit_psf(*args)
+
+
+def run(files=None,psrat=PSRAT,jobs=1,force=False):
+    """Create the par files of several psfs, jobs at a time.
+
+    Args:
+      files (list): psf fitsfiles (default psf/psf10.fits).
+      psrat (float): pixscale ratio.
+      jobs (int): number of worker processes.
+      force (bool): refit psfs whose par file is up to date.
+
+    Returns:
+      list: (ofile, error) for every psf that failed.
+
+    """
+    if files is None:
+        files = ['psf/psf10.fits']
+    tasks = [(f,psrat,force) for f in files]
+
+    if jobs > 1:
+        pool = multiprocessing.Pool(processes=jobs)
+        results = pool.imap_unordered(_fit_psf_star, tasks)
+    else:
+        pool = None
+        results = (_fit_psf_star(t) for t in tasks)
+
+    # Only this process writes the build caches.
+    caches = {}
+    failures = []
+    tele = telemetry.current()
+    try:
+        for ndone, (ofile, error, fp, cached) in enumerate(results, 1):
+            path = os.path.join(os.path.dirname(ofile) or '.', buildcache.CACHE_NAME)
+            cache = caches.setdefault(path, buildcache.BuildCache(path))
+            if cached:
+                print('[{}/{}] Up to date : {}'.format(ndone,len(tasks),ofile))
+            elif error is None:
+                print('[{}/{}] Created : {}'.format(ndone,len(tasks),ofile))
+                cache.record([ofile], fp, save=False)
+                tele.add_input(ofile[:-len('.par')] + '.fits')
+                tele.add_output(ofile)
+            else:
+                print('[{}/{}] Error: {} : {}'.format(ndone,len(tasks),ofile,error))
+                cache.forget([ofile], save=False)
+                failures.append((ofile, error))
+    finally:
+        for cache in caches.values():
+            cache.save()
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return failures
+
 
 def main():
     """Run main function."""
-
-    # psf10.fits
-    sfile = 'psf/psf10'
-    psrat = 0.3   # ratio of pixscales 0.06/0.2 = 0.3
-    ffile = 'psf/psf10.fits'
-    ofile = 'psf/psf10.par'
-    par_lmst(sfile,psrat,ffile,ofile)
+    parser = argparse.ArgumentParser(description='Create the par files of the psfs.')
+    parser.add_argument('files', nargs='*', help='psf fitsfiles (default psf/psf10.fits)')
+    parser.add_argument('--all', action='store_true', help='all the psfs psf/psf*.fits')
+    parser.add_argument('--psrat', type=float, default=PSRAT, help='pixscale ratio')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='number of psfs fitted in parallel')
+    parser.add_argument('--force', action='store_true', help='refit up to date psfs')
+    args = parser.parse_args()
+
+    files = psf_files() if args.all else (args.files or None)
+    with telemetry.stage('a01', echo=True, jobs=args.jobs):
+        failures = run(files,args.psrat,args.jobs,args.force)
+    if failures:
+        sys.exit(1)
 
 
 if __name__ == "__main__":
-    # Start time
-    start_time = time.time()
-
-    # Run main
     main()
-    
-    # # Print the time taken
-    # end_time = time.time()
-    # seconds  = end_time - start_time
-    # m, s     = divmod(seconds, 60)
-    # h, m     = divmod(m, 60)
-    # d, h     = divmod(h, 24)
-    # print("\nTime taken ==> {:2.0f} days, {:2.0f} hours,\
-    # {:2.0f} minutes, {:f} seconds.".format( d, h, m, s))
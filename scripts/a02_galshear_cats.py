@@ -41,163 +41,793 @@
 
 :Runtime:  15 mins for 216 galaxies with redshift 1.0 only ( Dec 15, 2017 Pisces)
 
+:Usage: The galaxy files are independent, use ``--jobs`` to spread them over
+  several worker processes::
+
+    python a02_galshear_cats.py 0.7 --jobs 16
+
+  ``--refine numpy`` replaces the fixed three centroid steps by
+  shapes.refine_centroids, which stops each object when its step is below
+  ``--tol`` pixels (at most ``--maxiter`` steps) and adds the object items
+  niter and converged (see ``a03_Pgamma_cat.py --converged``)::
+
+    python a02_galshear_cats.py 0.7 --jobs 16 --refine numpy --tol 0.001 --maxiter 10
+
+  ``--forced parallel`` measures the objects found on lsst on lsst90,
+  lsst_mono and lsst_mono90 at the same time, in threads of this process
+  on memory maps of the images (see forced_measure), instead of one after
+  another in the imcat pipe::
+
+    python a02_galshear_cats.py 0.7 --jobs 4 --forced parallel
+
+  With ``--store`` the catalogs are appended to the single columnar file
+  galshear/galshear_cat_z0.7/galshear_z0.7.store (see catstore.py) by the
+  main process; add ``--no-cats`` to not keep the per galaxy .cat files::
+
+    python a02_galshear_cats.py 0.7 --jobs 16 --store --no-cats
+
+  ``--measure numpy`` measures all the shapes after the detection with
+  shapes.py on memory maps of the images instead of getshapes (the
+  centroid refinement, lsst and, in threads, the three other images), so
+  only apphot and gen2Dpolymodel are run after cleancat::
+
+    python a02_galshear_cats.py 0.7 --jobs 16 --refine numpy --measure numpy
+
+  ``--detect numpy`` finds the objects with peaks.py instead of hfindpeaks
+  (it needs astropy to read the fitsfiles)::
+
+    python a02_galshear_cats.py 0.7 --jobs 16 --detect numpy
+
+  ``--watch`` does not wait for jedisim to finish: it polls the four
+  folders, builds each galaxy catalog once its four images are complete
+  and folds it into running profiles (*_galshear_*_running.dat, see
+  watch)::
+
+    python a02_galshear_cats.py 0.7 --jobs 4 --watch --poll 10 --idle 3600
+
 ..note::
 
     This program will read four folders lsst,lsst_mono,lsst90, and lsst_mono90.
 
 """
 # Imports
-import subprocess
+import argparse
+import concurrent.futures
+import multiprocessing
 import os
 import time
 import shutil
 import re
 import sys
 
+import numpy as np
+
+import buildcache
+import catalog
+import catstore
+import etprofile
+import peaks
+import psf_correction
+import runner
+import shapes
+import telemetry
+
+# imcat programs run for every galaxy file
+TOOLS = ['hfindpeaks','getsky','apphot','getshapes','lc','cleancat','gen2Dpolymodel']
+
+# object items written by correct_commands for every image, per engine
+MEASURED = {'imcat': ['e','Pg','mag'],
+            'numpy': ['e','psh','psm','stmod','mag']}
+
 # beginning time
 program_begin_time = time.time()
 begin_ctime        = time.ctime()
 print('Begin time: ', begin_ctime)
 
-def galshear_cats(z,start,end,indir):
+# lc expressions for the psf anisotropy correction of Pg and e.
+LC_PG = "'Pg = %psh %psm %stmod[0] %stmod[1] 2 vector "                                 + \
+        "%stmod[2] %stmod[3] 2 vector 2 vector "                                        + \
+        "%stmod[4] %stmod[5] 2 vector %stmod[6] "                                       + \
+        "%stmod[7] 2 vector 2 vector inverse dot "                                      + \
+        "dot msub'"
+LC_E  = "'e = %e %psm %stmod[4] "                                                       + \
+        "%stmod[5] 2 vector %stmod[6] "                                                 + \
+        "%stmod[7] 2 vector 2 vector inverse dot "                                      + \
+        "%stmod[8] %stmod[9] 2 vector dot vsub'"
+
+
+def detection_commands(cfile,detfile=None):
+    """Return the commands that find, clean and measure the objects of cfile.
+
+    They end with ``cleancat 5``, before the centroid refinement.
+    """
+    if detfile is None:
+        detect = "hfindpeaks " + cfile + " -r 0.5 20 | getsky -Z rg 3 | "
+    else:
+        detect = "getsky -Z rg 3 < " + detfile + " | "
+
+    return detect                                                                       + \
+    "apphot -z 30 -M 30 | "                                                             + \
+    "getshapes | "                                                                      + \
+    "lc +all 'ox = %x' | "                                                              + \
+    "cleancat 5"
+
+
+def correct_commands(x,engine='imcat'):
+    """Return the commands that store the measurement of image x (c, c9, m or m9).
+
+    With engine 'imcat' they do the psf correction with lc and keep {x}e,
+    {x}Pg and {x}mag; with engine 'numpy' they keep the raw {x}e, {x}psh,
+    {x}psm, {x}stmod and {x}mag (see MEASURED).
+    """
+    if engine == 'numpy':
+        return "lc +all '{0}e = %e' '{0}psh = %psh' '{0}psm = %psm' ".format(x) + \
+               "'{0}stmod = %stmod' '{0}mag = %mag'".format(x)
+    return "lc +all " + LC_PG + " " + LC_E + " | "                                    + \
+           "lc +all '{0}e = %e' '{0}Pg = %Pg' '{0}mag = %mag'".format(x)
+
+
+def photometry_commands(icat,ocat,fitsfile=None,parfile=None):
+    """Return the photometry of the objects of icat (apphot, with -f fitsfile if given).
+
+    With parfile the psf model is evaluated too (gen2Dpolymodel).
+    """
+    commands = "apphot -z 30 -M 30" + (" -f " + fitsfile if fitsfile else "") + " < " + icat
+    if parfile is not None:
+        commands += " | gen2Dpolymodel " + parfile
+    return commands + " > " + ocat
+
+
+def forced_shapes(x,cat,image,engine='imcat'):
+    """Measure the shapes of the objects of cat on image and store them as image x.
+
+    This is ``getshapes -f`` followed by correct_commands, in-process: the
+    shapes come from shapes.getshapes at the positions of cat and the psf
+    model is the stmod of cat.
+
+    Args:
+      x (str): prefix of the image, 'c9', 'm' or 'm9'
+      cat (catalog.Catalog): photometry of the objects on the image.
+      image (array): the image, e.g. a memory map from peaks.map_image.
+      engine (str): 'imcat' or 'numpy', see correct_commands.
+
+    Returns:
+      catalog.Catalog: cat with the plain items of getshapes (and of the psf
+      correction) and the {x} items of MEASURED[engine].
+
+    """
+    cat = shapes.getshapes(cat,image)
+    if engine == 'numpy':
+        for item in ['e','psh','psm','stmod','mag']:
+            cat[x + item] = cat[item]
+        return cat
+    cat['Pg'], cat['e'] = psf_correction.correct(cat['psh'],cat['psm'],cat['e'],cat['stmod'])
+    for item in ['e','Pg','mag']:
+        cat[x + item] = cat[item]
+    return cat
+
+
+def forced_measure(ccat,images,ofile,engine='imcat',threads=None):
+    """Measure the objects of ccat on the companion images concurrently.
+
+    Every image is measured in its own thread, all reading ccat: apphot -f
+    (photometry_commands) does the photometry, then forced_shapes measures the
+    shapes in-process on a memory map of the image (peaks.map_image), so
+    only the pixels of the stamps are read. The psf model is the stmod of
+    ccat, the par file of lsst (cparfile) being the one of the monochromatic
+    images (mparfile).
+
+    The outputs keep the rows of ccat, so they are merged column by column:
+    the catalog of the last image, which holds the plain items (e, mag, ...)
+    of the last measurement like the serial pipeline, gets the {x} items of
+    the other images.
+
+    Args:
+      ccat (str): catalog measured on the detection image.
+      images (list): (x, fitsfile) of the companion images, in the order of
+        the serial pipeline e.g. c9, m, m9.
+      ofile (str): merged catalog.
+      engine (str): 'imcat' or 'numpy', see correct_commands.
+      threads (int): number of images measured at a time (default all).
+
+    Returns:
+      list: runner.StageResult of the apphot runs of all the images.
+
+    Raises:
+      runner.PipelineError: apphot failed.
+      ValueError: an image has not the same objects as ccat.
+
+    """
+    outs = ['{}.{}'.format(ccat,x) for x, fitsfile in images]
+
+    def measure(k):
+        x, fitsfile = images[k]
+        timings = runner.run_command(photometry_commands(ccat,outs[k],fitsfile))
+        cat = catalog.read_cat(outs[k], mmap=False)
+        return timings, forced_shapes(x,cat,peaks.map_image(fitsfile),engine)
+
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=threads or len(images)) as pool:
+            results = list(pool.map(measure, range(len(images))))
+    finally:
+        for out in outs:
+            if os.path.isfile(out):
+                os.remove(out)
+
+    timings = sum([t for t, cat in results], [])
+    cats = [cat for t, cat in results]
+    merged = cats[-1]
+    for (x, fitsfile), cat in zip(images[:-1], cats[:-1]):
+        if len(cat) != len(merged):
+            raise ValueError('forced measurement of {} has {} objects instead of {}'.format(
+                             x,len(cat),len(merged)))
+        for item in MEASURED[engine]:
+            merged[x + item] = cat[x + item]
+    catalog.write_cat(ofile, merged)
+    return timings
+
+
+def imcat_commands(cfile,c9file,mfile,m9file,cparfile,mparfile,ofile,engine='imcat',
+                   detfile=None,refined=None,forced=False):
+    """Return the imcat commands that create the catalog of one galaxy index.
+
+    Args:
+      cfile, c9file, mfile, m9file (str): lsst, lsst90, lsst_mono and
+        lsst_mono90 fitsfiles.
+      cparfile, mparfile (str): psf par files e.g. psf/psf10.par
+      ofile (str): output catalog file.
+      engine (str): 'imcat' does the psf correction with lc. 'numpy' keeps
+        the raw psh, psm, e and stmod of every image (e.g. cpsh, cpsm, ce,
+        cstmod) so that psf_correction.correct_catalog can do it afterwards.
+      detfile (str): catalog of peaks of cfile written by peaks.detect. When
+        given, it replaces ``hfindpeaks cfile -r 0.5 20``.
+      refined (str): catalog with the centroids already refined (see
+        shapes.refine_centroids). When given, the commands start from it
+        instead of detecting the objects and refining the centroids three
+        times.
+      forced (bool): stop after the measurement of cfile, the other images
+        are measured by forced_measure.
+
+    """
+    correct = lambda x: correct_commands(x,engine)
+
+    # detection and a fixed three step centroid refinement
+    if refined is None:
+        commands = detection_commands(cfile,detfile) + " |  "                           + \
+        "apphot -z 30 -M 30 | "                                                         + \
+        "getshapes | "                                                                  + \
+        "lc +all 'x = %x %d vadd' |  "                                                  + \
+        "apphot -z 30 -M 30 | "                                                         + \
+        "getshapes | "                                                                  + \
+        "lc +all 'x = %x %d vadd' |  "                                                  + \
+        "apphot -z 30 -M 30 | "
+    else:
+        commands = "apphot -z 30 -M 30 < " + refined + " | "
+
+    # commands to run
+    commands = commands                                                                 + \
+    "getshapes | "                                                                      + \
+    "lc +all 'dx = %x %ox vsub' | "                                                     + \
+    "gen2Dpolymodel " + cparfile + " | "                                                + \
+    correct('c')
+
+    if forced:
+        return commands + " > " + ofile
+
+    commands = commands + " | "                                                         + \
+    "apphot -z 30 -M 30 -f " + c9file + " | "                                           + \
+    "getshapes -f  "+ c9file + " | "                                                    + \
+    correct('c9') + " | "                                                               + \
+    "apphot -z 30 -M 30 -f " + mfile + " | "                                            + \
+    "getshapes -f "+ mfile + " | "                                                      + \
+    "gen2Dpolymodel " + mparfile + " | "                                                + \
+    correct('m') + " | "                                                                + \
+    "apphot -z 30 -M 30 -f " + m9file + "| "                                            + \
+    "getshapes -f " + m9file + " | "                                                    + \
+    correct('m9') + " > "                                                               + \
+    ofile
+
+    return commands
+
+
+def galaxy_fitsfiles(z,i,indir):
+    """Return the lsst, lsst90, lsst_mono and lsst_mono90 fitsfiles of galaxy index i."""
+    # /Users/poudel/Rsh_out/jedisim_v2_outputs/z0.5/lsst/lsst_z0.5_0.fits
+    return [indir + "/z{}/".format(z) + "{0}/{0}_z{1}_{2:d}.fits".format(folder,z,i)
+            for folder in ['lsst','lsst90','lsst_mono','lsst_mono90']]
+
+
+def galshear_cat(z,i,indir,outdir,engine='imcat',store=False,stored_fp=None,cats=True,
+                 detect='hfindpeaks',refine='imcat',tol=shapes.TOL,maxiter=shapes.MAXITER,
+                 forced='serial',measure='imcat'):
+    """Create the catalog file for one galaxy index.
+
+    The catalog is first written to a temporary ``.part`` file and only renamed
+    to ``galshear_z{z}_{i}.cat`` when the pipeline succeeds, so an interrupted
+    or failed run never leaves a truncated catalog behind. An existing catalog
+    is reused only if the build cache of outdir holds the same fingerprint for
+    it (same fitsfiles, par files, engine, imcat tools and code).
+
+    Args:
+      z (float): redshift e.g. 0.5, 0.7, 1.0, 1.5
+      i (int): galaxy file index e.g. 0
+      indir (str): jedisim output directory containing the folder z0.7 (or so)
+      outdir (str): output directory e.g. galshear/galshear_cat_z0.7
+      engine (str): 'imcat' or 'numpy', how the psf correction is done.
+      store (bool): return the catalog, to be appended to the store.
+      stored_fp (str): fingerprint of the block of galaxy file i in the store.
+      cats (bool): keep the catalog as galshear_z{z}_{i}.cat
+      detect (str): 'hfindpeaks' or 'numpy' (peaks.detect) to find the objects.
+      refine (str): 'imcat' refines the centroids with three fixed getshapes
+        steps, 'numpy' with shapes.refine_centroids until convergence.
+      tol, maxiter: convergence tolerance (pixels) and maximum number of
+        steps of refine 'numpy'.
+      forced (str): 'serial' measures lsst90, lsst_mono and lsst_mono90 one
+        after another in the imcat pipe, 'parallel' at the same time with
+        forced_measure.
+      measure (str): 'imcat' measures the shapes after the detection with
+        getshapes, 'numpy' with shapes.py on memory maps of the images: the
+        centroids are refined with shapes.refine_catalog (three fixed steps
+        with refine 'imcat'), lsst is measured by forced_shapes and the
+        other images by forced_measure (one at a time with forced 'serial').
+        Only apphot and gen2Dpolymodel are left after cleancat.
+
+    Returns:
+      tuple: (i, ofile, error, fp, cached, cat, timings) where error is None
+      on success, otherwise a short message describing the failure, fp is
+      the fingerprint of the catalog, cached is True if it was up to date,
+      cat is the new Catalog with store=True (None otherwise) and timings
+      the runner.StageResult of every imcat program that was run.
+
+    """
+    # output catalog file.
+    ofile    = outdir + '/galshear_z{}_{:d}.cat'.format(z,i)
+    tfile    = ofile + '.part'
+
+    # chromatic and monochromatic files
+    cfile, c9file, mfile, m9file = galaxy_fitsfiles(z,i,indir)
+    cparfile = 'psf/psf10.par' # psf10.par
+    mparfile = 'psf/psf10.par'
+
+    # Error check for four files, lsst,lsst90,lsst_mono,lsst_mono90
+    for f in [cfile,c9file,mfile,m9file]:
+        if not os.path.isfile(f):
+            return i, ofile, 'FILE NOT FOUND {}'.format(f), None, False, None, []
+
+    # Do not recreate catalogs that are up to date.
+    code = [__file__, psf_correction.__file__, peaks.__file__, shapes.__file__]
+    params = {'engine': engine, 'detect': detect, 'refine': refine, 'forced': forced,
+              'measure': measure}
+    if refine == 'numpy':
+        params.update(tol=tol, maxiter=maxiter)
+    fp = buildcache.fingerprint(inputs=[cfile,c9file,mfile,m9file,cparfile,mparfile],
+                                params=params, tools=TOOLS, code=code)
+    fresh = not store or stored_fp == fp
+    if cats:
+        fresh = fresh and buildcache.BuildCache.for_outputs([ofile]).is_fresh([ofile], fp)
+    if fresh:
+        return i, ofile, None, fp, True, None, []
+
+    # temporary catalogs of the in-process steps
+    base    = outdir + '/galshear_z{}_{:d}'.format(z,i)
+    detfile = base + '_peaks.cat' if detect == 'numpy' else None
+    refined = base + '_refined.cat' if 'numpy' in (refine, measure) else None
+    ccat    = base + '_c.cat'
+    temps   = [f for f in [detfile, refined, base + '_clean.cat', ccat] if f is not None]
+
+    timings = []
+    try:
+        # Find the objects in-process.
+        if detect == 'numpy':
+            try:
+                peaks.detect(cfile, detfile)
+            except Exception as exc:
+                return i, ofile, 'peak finding failed: {}'.format(exc), fp, False, None, timings
+
+        # Refine the centroids in-process, each object until it converges
+        # (or with the three fixed steps of imcat_commands).
+        if refined is not None:
+            timings += runner.run_command(detection_commands(cfile,detfile) + " > "
+                                          + base + '_clean.cat')
+            cat = catalog.read_cat(base + '_clean.cat', mmap=False)
+            if refine == 'numpy':
+                cat = shapes.refine_catalog(cat, peaks.map_image(cfile), tol, maxiter)
+            else:
+                cat = shapes.refine_catalog(cat, peaks.map_image(cfile), 0.0, 3)
+                for k in ['niter','converged']:
+                    del cat.columns[k]
+            catalog.write_cat(refined, cat)
+
+        # Measure all the shapes in-process, the photometry with apphot.
+        images = [('c9',c9file), ('m',mfile), ('m9',m9file)]
+        if measure == 'numpy':
+            timings += runner.run_command(photometry_commands(refined,ccat,parfile=cparfile))
+            cat = forced_shapes('c',catalog.read_cat(ccat, mmap=False),
+                                peaks.map_image(cfile),engine)
+            cat['dx'] = cat['x'] - cat['ox']
+            catalog.write_cat(ccat, cat)
+            timings += forced_measure(ccat,images,tfile,engine,
+                                      threads=None if forced == 'parallel' else 1)
+
+        # Measure the detection image, then the companion images concurrently.
+        elif forced == 'parallel':
+            commands = imcat_commands(cfile,c9file,mfile,m9file,cparfile,mparfile,ccat,engine,
+                                      detfile,refined,forced=True)
+            timings += runner.run_command(commands)
+            timings += forced_measure(ccat,images,tfile,engine)
+
+        # After error check, run the imcat programs.
+        else:
+            commands = imcat_commands(cfile,c9file,mfile,m9file,cparfile,mparfile,tfile,engine,
+                                      detfile,refined)
+
+            # run the program
+            timings += runner.run_command(commands)
+    except (runner.PipelineError, ValueError) as exc:
+        if os.path.isfile(tfile):
+            os.remove(tfile)
+        return i, ofile, 'imcat pipeline failed: {}'.format(exc), fp, False, None, timings
+    finally:
+        for f in temps:
+            if os.path.isfile(f):
+                os.remove(f)
+
+    if not os.path.isfile(tfile) or os.path.getsize(tfile) == 0:
+        if os.path.isfile(tfile):
+            os.remove(tfile)
+        return i, ofile, 'imcat pipeline wrote no objects', fp, False, None, timings
+
+    cat = None
+    if engine == 'numpy' or store:
+        cat = catalog.read_cat(tfile, mmap=False)
+
+    # Vectorized psf correction for all objects at once.
+    if engine == 'numpy':
+        psf_correction.correct_catalog(cat)
+        if cats:
+            catalog.write_cat(tfile, cat)
+
+    if cats:
+        os.rename(tfile, ofile)
+    else:
+        os.remove(tfile)
+    return i, ofile, None, fp, False, (cat if store else None), timings
+
+
+def _galshear_cat_star(args):
+    """Unpack the arguments of galshear_cat for Pool.imap_unordered."""
+    return galshear_cat(*args)
+
+
+def galshear_cats(z,start,end,indir,jobs=1,engine='imcat',resume=False,store=False,cats=True,
+                  detect='hfindpeaks',refine='imcat',tol=shapes.TOL,maxiter=shapes.MAXITER,
+                  forced='serial',measure='imcat'):
     """This program will create galaxy catalog files.
-    
+
     It will create output folders if they do not exists previously.
-    
+
+    Args:
+      z (float): redshift e.g. 0.5, 0.7, 1.0, 1.5
+      start (int): first galaxy file index (inclusive)
+      end (int): last galaxy file index (inclusive)
+      indir (str): jedisim output directory containing the folder z0.7 (or so)
+      jobs (int): number of worker processes. With jobs=1 the galaxy files
+        are processed one after another in this process.
+      engine (str): 'imcat' does the psf correction with lc, 'numpy' with
+        psf_correction.correct_catalog.
+      resume (bool): allow an existing output folder, rebuilding only the
+        catalogs that are missing or out of date.
+      store (bool): append the catalogs to catstore.store_path(z). Only this
+        process writes to the store, the workers return their catalogs.
+      cats (bool): keep the per galaxy galshear_z{z}_{i}.cat files. Must be
+        True without store.
+      detect (str): 'hfindpeaks' or 'numpy' (peaks.py) to find the objects.
+      refine (str): 'imcat' (three fixed steps) or 'numpy' (until convergence).
+      tol, maxiter: convergence of refine 'numpy', see shapes.refine_centroids.
+      forced (str): 'serial' or 'parallel' measurement of the companion
+        images, see forced_measure.
+      measure (str): 'imcat' (getshapes) or 'numpy' (shapes.py) measurement
+        of the shapes, see galshear_cat.
+
+    Returns:
+      list: (i, error) for every galaxy index that failed.
+
     """
-    
+
     # Strip Last '/' char in indir
     if indir[-1] == '/':
         indir = indir[0:-1]
-    
-    
+
+
     # Error check (file existence of psf10.par)
     if not os.path.isfile('psf/psf10.par'):
         print('Error: FILE NOT FOUND psf/psf10.par ')
-        sys.exit(1)        
-        
+        sys.exit(1)
+
     # output catalog file
     outdir   = 'galshear/galshear_cat_z{}'.format(z)
-    
+
     # Do not overwrite outdir
-    if os.path.isdir(outdir):
+    if os.path.isdir(outdir) and not resume:
         print('ERROR: Output folder exists already.')
         print(outdir)
         sys.exit(1)
-    
+
     # create outdir if not exist.
     if not os.path.isdir(outdir):
             os.makedirs(outdir)
-           
-        
-    for i in range(start,end+1):
-
-        # output catalog file.
-        ofile    = outdir + '/galshear_z{}_{:d}.cat'.format(z,i)
-
-        # chromatic files
-        # /Users/poudel/Rsh_out/jedisim_v2_outputs/z0.5/lsst/lsst_z0.5_0.fits
-        cfile    = indir + "/z{}/".format(z) + "lsst/lsst_z{}_{:d}.fits".format(z,i)
-        c9file   = indir + "/z{}/".format(z) + "lsst90/lsst90_z{}_{:d}.fits".format(z,i)
-        cparfile = 'psf/psf10.par' # psf10.par
-
-        # monochromatic files
-        mfile    = indir + "/z{}/".format(z) + "lsst_mono/lsst_mono_z{}_{:d}.fits".format(z,i)
-        m9file   = indir + "/z{}/".format(z) + "lsst_mono90/lsst_mono90_z{}_{:d}.fits".format(z,i)
-        mparfile = 'psf/psf10.par'
-
-        # Error check for four files, lsst,lsst90,lsst_mono,lsst_mono90
-        for f in [cfile,c9file,mfile,m9file]:
-            if not os.path.isfile(f):
-                print('Error: FILE NOT FOUND {} '.format(f))
-                sys.exit(1)
-                
-        # After error check, run the bash commands.            
-        # commands to run
-        commands = "hfindpeaks " + cfile + " -r 0.5 20 | "                                  + \
-        "getsky -Z rg 3 | "                                                                 + \
-        "apphot -z 30 -M 30 | "                                                             + \
-        "getshapes | "                                                                      + \
-        "lc +all 'ox = %x' | "                                                              + \
-        "cleancat 5 |  "                                                                    + \
-        "apphot -z 30 -M 30 | "                                                             + \
-        "getshapes | "                                                                      + \
-        "lc +all 'x = %x %d vadd' |  "                                                      + \
-        "apphot -z 30 -M 30 | "                                                             + \
-        "getshapes | "                                                                      + \
-        "lc +all 'x = %x %d vadd' |  "                                                      + \
-        "apphot -z 30 -M 30 | "                                                             + \
-        "getshapes | "                                                                      + \
-        "lc +all 'dx = %x %ox vsub' | "                                                     + \
-        "gen2Dpolymodel " + cparfile + " | "                                                + \
-        "lc +all 'Pg = %psh %psm %stmod[0] %stmod[1] 2 vector "                             + \
-                          "%stmod[2] %stmod[3] 2 vector 2 vector "                          + \
-                          "%stmod[4] %stmod[5] 2 vector %stmod[6] "                         + \
-                          "%stmod[7] 2 vector 2 vector inverse dot "                        + \
-                          "dot msub' 'e = %e %psm %stmod[4] "                               + \
-        "%stmod[5] 2 vector %stmod[6] "                                                     + \
-        "%stmod[7] 2 vector 2 vector inverse dot "                                          + \
-        "%stmod[8] %stmod[9] 2 vector dot vsub' | "                                         + \
-        "lc +all 'ce = %e' 'cPg = %Pg' 'cmag = %mag' | "                                    + \
-        "apphot -z 30 -M 30 -f " + c9file + " | "                                           + \
-        "getshapes -f  "+ c9file + " | "                                                    + \
-        "lc +all 'Pg = %psh %psm %stmod[0] %stmod[1] 2 vector %stmod[2] "                   + \
-                          "%stmod[3] 2 vector 2 vector %stmod[4] "                          + \
-                          "%stmod[5] 2 vector %stmod[6] "                                   + \
-                          "%stmod[7] 2 vector 2 vector inverse dot dot "                    + \
-                          "msub' 'e = %e %psm %stmod[4] %stmod[5] 2 vector "                + \
-                          "%stmod[6] %stmod[7] 2 vector 2 vector inverse dot "              + \
-                          "%stmod[8] %stmod[9] 2 vector dot vsub' | "                       + \
-        "lc +all 'c9e = %e' 'c9Pg = %Pg' 'c9mag = %mag' | "                                 + \
-        "apphot -z 30 -M 30 -f " + mfile + " | "                                            + \
-        "getshapes -f "+ mfile + " | "                                                      + \
-        "gen2Dpolymodel " + mparfile + " | "                                                + \
-        "lc +all 'Pg = %psh %psm %stmod[0] %stmod[1] 2 vector %stmod[2] "                   + \
-                          "%stmod[3] 2 vector 2 vector %stmod[4] "                          + \
-                          "%stmod[5] 2 vector %stmod[6] "                                   + \
-                          "%stmod[7] 2 vector 2 vector inverse dot dot msub' 'e = %e %psm " + \
-                          "%stmod[4] %stmod[5] 2 vector %stmod[6] "                         + \
-                          "%stmod[7] 2 vector 2 vector inverse dot %stmod[8] "              + \
-                          "%stmod[9] 2 vector dot vsub' | "                                 + \
-        "lc +all 'me = %e' 'mPg = %Pg' 'mmag = %mag' | "                                    + \
-        "apphot -z 30 -M 30 -f " + m9file + "| "                                            + \
-        "getshapes -f " + m9file + " | "                                                    + \
-        "lc +all 'Pg = %psh %psm %stmod[0] %stmod[1] 2 vector %stmod[2] "                   + \
-                          "%stmod[3] 2 vector 2 vector %stmod[4] "                          + \
-                          "%stmod[5] 2 vector %stmod[6] "                                   + \
-                          "%stmod[7] 2 vector 2 vector inverse dot dot msub' 'e = %e %psm " + \
-                          "%stmod[4] %stmod[5] 2 vector %stmod[6] "                         + \
-                          "%stmod[7] 2 vector 2 vector inverse dot %stmod[8] "              + \
-                          "%stmod[9] 2 vector dot vsub' | "                                 + \
-        "lc +all 'm9e = %e' 'm9Pg = %Pg' 'm9mag = %mag' > "                                 + \
-        ofile
-
-        # run the program
-        if not os.path.isfile(ofile):
-            print('\nCreating the cat file :', ofile)
-            os.system(commands)
+
+    if not store:
+        cats = True
+    cstore = catstore.CatStore(catstore.store_path(z)) if store else None
+    stored = cstore.fingerprints() if store else {}
+
+    # Each galaxy index is independent of the others.
+    tasks = [(z,i,indir,outdir,engine,store,stored.get(i),cats,detect,refine,tol,maxiter,
+              forced,measure) for i in range(start,end+1)]
+    ntasks = len(tasks)
+
+    if jobs > 1:
+        pool = multiprocessing.Pool(processes=jobs)
+        results = pool.imap_unordered(_galshear_cat_star, tasks)
+    else:
+        pool = None
+        results = (_galshear_cat_star(t) for t in tasks)
+
+    # Only this process writes the build cache.
+    cache = buildcache.BuildCache(os.path.join(outdir,buildcache.CACHE_NAME))
+    failures = []
+    timings = []
+    tele = telemetry.current()
+    try:
+        for ndone, (i, ofile, error, fp, cached, cat, stages) in enumerate(results, 1):
+            timings += stages
+            if cached:
+                print('[{}/{}] Up to date : {}'.format(ndone,ntasks,
+                      ofile if cats else 'galaxy file {:d} of {}'.format(i,cstore.path)))
+            elif error is None:
+                tele.add_input(galaxy_fitsfiles(z,i,indir))
+                tele.add_output(ofile if cats else (), objects=len(cat) if cat is not None else None)
+                if store:
+                    cstore.append(cat, i, fp)
+                    print('[{}/{}] Stored galaxy file {:d} : {}'.format(ndone,ntasks,i,cstore.path))
+                if cats:
+                    print('[{}/{}] Created the cat file : {}'.format(ndone,ntasks,ofile))
+                    cache.record([ofile], fp, save=False)
+            else:
+                print('[{}/{}] Error: {} : {}'.format(ndone,ntasks,ofile,error))
+                cache.forget([ofile], save=False)
+                failures.append((i, error))
+    finally:
+        cache.save()
+        if store:
+            cstore.compact()
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    # Where the time went, summed over the galaxy files.
+    if timings:
+        print('\nimcat programs for redshift {}:'.format(z))
+        print(runner.format_results(runner.summarize(timings),'runs'))
+
+    if failures:
+        print('\nFailed galaxy files for redshift {}: {} of {}'.format(z,len(failures),ntasks))
+        for i, error in sorted(failures):
+            print('  {:d}: {}'.format(i,error))
+
+    return failures
+
+def stable_indices(z,indices,indir,seen):
+    """Return the galaxy indices whose four fitsfiles are complete.
+
+    The four files must exist with the same size and modification time as
+    at the previous call (recorded in the dict seen), so that files still
+    being written by jedisim are not read.
+    """
+    ready = []
+    for i in indices:
+        try:
+            state = tuple((os.path.getsize(f), os.path.getmtime(f))
+                          for f in galaxy_fitsfiles(z,i,indir))
+        except OSError:
+            seen.pop(i, None)
+            continue
+        if seen.get(i) == state:
+            ready.append(i)
+        else:
+            seen[i] = state
+    return ready
+
+
+def watch(z,start,end,indir,jobs=1,engine='imcat',poll=30.0,idle=None,
+          detect='hfindpeaks',refine='imcat',tol=shapes.TOL,maxiter=shapes.MAXITER,
+          forced='serial',measure='imcat'):
+    """Build the galaxy catalogs as jedisim writes them and stack their profiles.
+
+    The four folders lsst, lsst90, lsst_mono and lsst_mono90 are polled
+    every poll seconds. As soon as the four images of an index are complete
+    its catalog is built (jobs at a time) and folded into the sums of
+    galstats.GalaxySums. After every poll the four *_galshear_*_running.dat
+    files of a05 and the sums (galshear_sums.npz, to continue after a
+    restart, and for galstats.py) are written in the output folder.
+    Catalogs that are already up to date are only folded in.
+
+    The running ellip profiles are those a05 will make; the running shear
+    profiles use the P_gamma models fitted to the files so far (see
+    galstats for the estimator).
+
+    Args:
+      z, start, end, indir, jobs, engine, detect, refine, tol, maxiter,
+        forced, measure: see galshear_cats.
+      poll (float): seconds between two looks at the folders.
+      idle (float): stop after this many seconds without new images
+        (default: wait until every index from start to end is done).
+
+    Returns:
+      list: (i, error) for every galaxy index that failed.
+
+    """
+    import a05_etprofile_cm_shear_ellip as a05
+    import galstats
+
+    if indir[-1] == '/':
+        indir = indir[0:-1]
+    if not os.path.isfile('psf/psf10.par'):
+        print('Error: FILE NOT FOUND psf/psf10.par ')
+        sys.exit(1)
+    outdir = 'galshear/galshear_cat_z{}'.format(z)
+    if not os.path.isdir(outdir):
+        os.makedirs(outdir)
+
+    state = os.path.join(outdir,galstats.SUMS_NAME)
+    sums = galstats.open_sums(state,converged=(refine == 'numpy'))
+    pending = [i for i in range(start,end+1) if i not in sums.files]
+    print('Watching {}/z{} for {} galaxy indices ({} already in the profiles)'.format(
+          indir,z,len(pending),len(sums.files)))
+
+    pool = multiprocessing.Pool(processes=jobs) if jobs > 1 else None
+    cache = buildcache.BuildCache(os.path.join(outdir,buildcache.CACHE_NAME))
+    tele = telemetry.current()
+    failures, seen = [], {}
+    last_new = time.time()
+    try:
+        while pending:
+            ready = stable_indices(z,pending,indir,seen)
+            if not ready:
+                if idle is not None and time.time() - last_new > idle:
+                    print('No new images for {:.0f} s, stopping'.format(idle))
+                    break
+                time.sleep(poll)
+                continue
+
+            last_new = time.time()
+            tasks = [(z,i,indir,outdir,engine,False,None,True,detect,refine,tol,maxiter,forced,
+                      measure) for i in ready]
+            if pool is not None:
+                results = pool.imap_unordered(_galshear_cat_star, tasks)
+            else:
+                results = (_galshear_cat_star(t) for t in tasks)
+            for i, ofile, error, fp, cached, cat, stages in results:
+                pending.remove(i)
+                if error is not None:
+                    print('Error: {} : {}'.format(ofile,error))
+                    cache.forget([ofile], save=False)
+                    failures.append((i, error))
+                    continue
+                if not cached:
+                    cache.record([ofile], fp, save=False)
+                    tele.add_input(galaxy_fitsfiles(z,i,indir))
+                    tele.add_output(ofile)
+                st = os.stat(ofile)
+                sums.add(i, catalog.read_cat(ofile), (st.st_size, st.st_mtime_ns))
+                print('{} galaxy file {:d} : {:.0f} objects added ({} files in the profiles, {} to go)'.format(
+                      'Up to date' if cached else 'Created', i, sums.files[i]['nfit'],
+                      len(sums.files), len(pending)))
+
+            cache.save()
+            sums.save(state)
+            try:
+                profiles = sums.profiles()
+            except (ValueError, np.linalg.LinAlgError) as exc:
+                print('No running profiles yet: {}'.format(exc))
+                continue
+            for ofile, ename in a05.PROFILES:
+                etprofile.write_profile(os.path.join(outdir,galstats.running_name(ofile)),
+                                        profiles[ename])
+    except KeyboardInterrupt:
+        print('\nStopped, {} galaxy files in the profiles'.format(len(sums.files)))
+    finally:
+        cache.save()
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    if failures:
+        print('\nFailed galaxy files for redshift {}: {}'.format(z,len(failures)))
+        for i, error in sorted(failures):
+            print('  {:d}: {}'.format(i,error))
+    return failures
+
 
 ##=============================================================================    
 def main():
     """Run main function."""
-    z = float(sys.argv[1])
-    
-    # Need: 
+    # Need:
     #     1. indir/z0.7/lsst/lsst_z0.7_0.fits
     #     2. indir/z0.7/lsst90/lsst_z0.7_0.fits
     #     3. indir/z0.7/lsst_mono/lsst_mono_z0.7_0.fits
     #     4. indir/z0.7/lsst_mono90/lsst_mono90_z0.7_0.fits
-    
-    
+
+
     # Input directory should have folder z0.7 (or so)
-    # indir  = '/Users/poudel/Rsh_out/jedisim_v3_outputs'  # XXX change    
+    # indir  = '/Users/poudel/Rsh_out/jedisim_v3_outputs'  # XXX change
     # indir = '/Volumes/BPWD1/jedisim_v3_outputs/jout_z0.7_2018_Feb02_12_14/' # XXX
-    
+
     indir = '/Users/poudel/Research/a4_jedisim/jedisim/jedisim_output/jout_z0.7_2018_Feb02_18_08' + '/' # XXX
     start,end = 0,295 # inclusive # XXX change
-    
+
+    parser = argparse.ArgumentParser(description='Create galaxy catalogs for one redshift.')
+    parser.add_argument('z', type=float, help='redshift e.g. 0.7')
+    parser.add_argument('--indir', default=indir, help='jedisim output directory')
+    parser.add_argument('--start', type=int, default=start, help='first galaxy index')
+    parser.add_argument('--end', type=int, default=end, help='last galaxy index (inclusive)')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='number of galaxy files processed in parallel')
+    parser.add_argument('--engine', choices=['imcat','numpy'], default='imcat',
+                        help='do the psf anisotropy correction with lc or numpy')
+    parser.add_argument('--resume', action='store_true',
+                        help='reuse an existing output folder, rebuilding only '
+                             'missing or out of date catalogs')
+    parser.add_argument('--store', action='store_true',
+                        help='also append the catalogs to galshear_z{z}.store')
+    parser.add_argument('--no-cats', dest='cats', action='store_false',
+                        help='with --store, do not keep the galshear_z{z}_{i}.cat files')
+    parser.add_argument('--detect', choices=['hfindpeaks','numpy'], default='hfindpeaks',
+                        help='find the objects with hfindpeaks or peaks.py')
+    parser.add_argument('--refine', choices=['imcat','numpy'], default='imcat',
+                        help='refine the centroids three times with getshapes, or '
+                             'until convergence with shapes.py')
+    parser.add_argument('--tol', type=float, default=shapes.TOL,
+                        help='with --refine numpy, centroid step (pixels) of convergence')
+    parser.add_argument('--maxiter', type=int, default=shapes.MAXITER,
+                        help='with --refine numpy, maximum number of centroid steps')
+    parser.add_argument('--forced', choices=['serial','parallel'], default='serial',
+                        help='measure lsst90, lsst_mono and lsst_mono90 one after another '
+                             'or at the same time')
+    parser.add_argument('--measure', choices=['imcat','numpy'], default='imcat',
+                        help='measure the shapes with getshapes or in-process with shapes.py')
+    parser.add_argument('--watch', action='store_true',
+                        help='build the catalogs as the images appear and keep running '
+                             'profiles (implies --resume)')
+    parser.add_argument('--poll', type=float, default=30.0,
+                        help='with --watch, seconds between two looks at the folders')
+    parser.add_argument('--idle', type=float, default=None,
+                        help='with --watch, stop after this many seconds without new images')
+    args = parser.parse_args()
+
+    if args.watch:
+        if args.store:
+            parser.error('--watch does not write the catalog store')
+        with telemetry.stage('a02', args.z, echo=True, engine=args.engine, jobs=args.jobs,
+                             watch=True):
+            failures = watch(args.z,args.start,args.end,args.indir,jobs=args.jobs,
+                             engine=args.engine,poll=args.poll,idle=args.idle,
+                             detect=args.detect,refine=args.refine,tol=args.tol,
+                             maxiter=args.maxiter,forced=args.forced,measure=args.measure)
+        if failures:
+            sys.exit(1)
+        return
+
     # After changing above parameters, run this.
-    galshear_cats(z,start,end,indir)
+    with telemetry.stage('a02', args.z, echo=True, engine=args.engine, jobs=args.jobs):
+        failures = galshear_cats(args.z,args.start,args.end,args.indir,jobs=args.jobs,
+                                 engine=args.engine,resume=args.resume,
+                                 store=args.store,cats=args.cats,detect=args.detect,
+                                 refine=args.refine,tol=args.tol,maxiter=args.maxiter,
+                                 forced=args.forced,measure=args.measure)
+    if failures:
+        sys.exit(1)
 
 if __name__ == "__main__":
     import time
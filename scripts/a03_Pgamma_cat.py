@@ -38,11 +38,43 @@
 
 :Runtime: 2 mins (redshift 1.0 and 216 files)
 
+:Usage: ``--engine numpy`` streams the galaxy catalogs through the cut
+  in-process and writes only galshear_cut.cat (add ``--big`` to also write
+  galshear_big.cat). The eight P_gamma models are then fitted in-process
+  with polymodel.fit::
+
+    python a03_Pgamma_cat.py 0.7 --engine numpy
+
+  ``--store`` reads the galaxy catalogs from the store written by
+  ``a02_galshear_cats.py --store`` and writes the cut to galshear_cut.store
+  instead of galshear_cut.cat (a04 ``--store`` reads it)::
+
+    python a03_Pgamma_cat.py 0.7 --engine numpy --store
+
 """
 # Imports
+import argparse
+import glob
 import os,sys
+import re
 import time
 
+import numpy as np
+
+import catalog
+import catstore
+import polymodel
+import pipeline
+import runner
+import telemetry
+
+# cuts applied to galshear_big.cat to get galshear_cut.cat
+RG_MIN   = 2.9
+X_MIN    = 20
+X_MAX    = 3376
+DX_MAX   = 0.078
+MAG_MAX  = 3
+
 
 def bigcat_cutcat(z):
     """Create big cat file and also create modified cut of it.
@@ -58,17 +90,145 @@ def bigcat_cutcat(z):
     # Variables
     pwd = "galshear/galshear_cat_z{0}".format(z)
 
-    # Commands to Run
-    commands= """
-    cd {0}
-    catcats galshear_z{1}_[0123456789].cat galshear_z{2}_[123456789].cat galshear_z{3}_[0123456789].cat > galshear_big.cat
-    lc -c < galshear_big.cat
-    lc -i '%rg 2.9 > %ce %ce dot 1 < and %me %me dot 1 < and %c9e %c9e dot 1 < and %m9e %m9e dot 1 < and %x[0] 20 > %x[0] 3376 < and %x[1] 20 > and %x[1] 3376 < and and %dx %dx dot sqrt 0.078 < and %mag 3 < and' < galshear_big.cat > galshear_cut.cat
-    """.format(pwd,z,z,z)
+    # Commands to Run (in pwd), catcats gets the galaxy files in order of galaxy index
+    cats = [os.path.basename(f) for i, f in galshear_files(pwd,z)]
+    commands = [
+    "lc -c < galshear_big.cat",
+    "lc -i '%rg 2.9 > %ce %ce dot 1 < and %me %me dot 1 < and %c9e %c9e dot 1 < and %m9e %m9e dot 1 < and %x[0] 20 > %x[0] 3376 < and %x[1] 20 > and %x[1] 3376 < and and %dx %dx dot sqrt 0.078 < and %mag 3 < and' < galshear_big.cat > galshear_cut.cat"
+    ]
 
     print("\nRunning catcats to get big cat file for redshift {} :\n".format(z))
-    print(commands)
-    os.system(commands)
+    print('catcats galshear_z{}_*.cat ({} files) > galshear_big.cat'.format(z,len(cats)))
+    runner.run([['catcats'] + cats], stdout='galshear_big.cat', cwd=pwd)
+    for cmd in commands:
+        print(cmd)
+        runner.run_command(cmd, cwd=pwd)
+
+
+def galshear_files(pwd,z):
+    """Return the galaxy catalog files of a redshift sorted by galaxy index.
+
+    Returns:
+      list: (i, path) for every galshear_z{z}_{i}.cat inside pwd.
+
+    """
+    pattern = re.compile(r'galshear_z{}_(\d+)\.cat$'.format(re.escape(str(z))))
+    files = []
+    for f in glob.glob(os.path.join(pwd,'galshear_z{}_*.cat'.format(z))):
+        match = pattern.search(f)
+        if match:
+            files.append((int(match.group(1)), f))
+    return sorted(files)
+
+
+def cut_mask(cat,converged=False):
+    """Return the boolean mask of the objects that pass the galshear_cut.cat cut.
+
+    This is the same cut as the lc expression in bigcat_cutcat::
+
+      %rg 2.9 > %ce %ce dot 1 < and %me %me dot 1 < and %c9e %c9e dot 1 < and
+      %m9e %m9e dot 1 < and %x[0] 20 > %x[0] 3376 < and %x[1] 20 > and
+      %x[1] 3376 < and and %dx %dx dot sqrt 0.078 < and %mag 3 < and
+
+    With converged=True the dx cut, a proxy for a stable centroid, is
+    replaced by the converged flag written by ``a02_galshear_cats.py
+    --refine numpy``.
+
+    """
+    x = cat['x']
+    mask = cat['rg'] > RG_MIN
+    for e in ['ce','me','c9e','m9e']:
+        mask &= np.einsum('ni,ni->n', cat[e], cat[e]) < 1
+    mask &= (x[:,0] > X_MIN) & (x[:,0] < X_MAX) & (x[:,1] > X_MIN) & (x[:,1] < X_MAX)
+    if converged:
+        if 'converged' not in cat:
+            raise ValueError('no converged column, run a02 with --refine numpy')
+        mask &= cat['converged'] > 0
+    else:
+        mask &= np.sqrt(np.einsum('ni,ni->n', cat['dx'], cat['dx'])) < DX_MAX
+    mask &= cat['mag'] < MAG_MAX
+    return mask
+
+
+def bigcat_cutcat_stream(z,big=False,chunksize=100000,store=False,converged=False):
+    """Create the cut cat file in-process, streaming over the galaxy catalogs.
+
+    Every galaxy catalog is read in chunks of at most chunksize objects and
+    the cut of cut_mask is applied to each chunk, so the memory used does not
+    depend on the number of galaxy files. Each object gets the column gfile,
+    the index i of the catalog galshear_z{z}_{i}.cat it comes from.
+
+    Args:
+      z (float): redshift e.g. 0.5, 0.7, 1.0, 1.5
+      big (bool): also write galshear_big.cat
+      chunksize (int): number of objects read at a time.
+      store (bool): read the galaxy catalogs from the store of a02 and write
+        the cut, one block per galaxy file, to galshear_cut.store
+      converged (bool): cut on the converged flag instead of dx, see cut_mask.
+
+    :Inputs: All cat files for the given redshift. e.g. galshear_z0.5_0.cat,
+      or galshear_z0.5.store
+
+    :Outputs: galshear_cut.cat (or galshear_cut.store) and optionally
+      galshear_big.cat
+
+    """
+    pwd = "galshear/galshear_cat_z{0}".format(z)
+    if store:
+        source = catstore.CatStore(catstore.store_path(z))
+        files  = sorted(source.gfiles())
+    else:
+        files  = galshear_files(pwd,z)
+    print("\nConcatenating and cutting {} cat files for redshift {} :\n".format(len(files),z))
+    if not files:
+        print('Error: no galshear_z{}_*.cat files or store in {}'.format(z,pwd))
+        sys.exit(1)
+
+    def chunks():
+        """Yield the galaxy catalogs with their gfile column."""
+        if store:
+            for cat in source.chunks():
+                yield cat
+            return
+        for i, f in files:
+            for cat in catalog.iter_cat(f, chunksize):
+                cat['gfile'] = np.full(len(cat), i, dtype=float)
+                yield cat
+
+    writers = []
+    if store:
+        cut_path = catstore.store_path(z,'galshear_cut')
+        cut = catstore.CatStore.create(cut_path + '.part')
+    else:
+        writers.append(catalog.CatalogWriter(os.path.join(pwd,'galshear_cut.cat')))
+    if big:
+        writers.append(catalog.CatalogWriter(os.path.join(pwd,'galshear_big.cat')))
+
+    ncut = 0
+    try:
+        for cat in chunks():
+            if big:
+                writers[-1].write(cat)
+            cat = cat.select(cut_mask(cat,converged))
+            if store:
+                if len(cat):
+                    cut.append(cat, int(cat['gfile'][0]))
+                ncut += len(cat)
+            else:
+                writers[0].write(cat)
+    except BaseException:
+        for w in writers:
+            w.abort()
+        if store:
+            os.remove(cut.path)
+        raise
+
+    if store:
+        os.rename(cut.path, cut_path)
+        print('Created : {} ({} objects)'.format(cut_path, ncut))
+    for w in writers:
+        w.close()
+        print('Created : {} ({} objects)'.format(w.path, w.nrows))
 
 
 
@@ -93,48 +253,110 @@ def Pgamma(z,x):
     # Variables
     pwd = "galshear/galshear_cat_z{0}".format(z)
 
-    # Commands to run
-    commands = """
-    cd {0}
-    lc +all 'x = %rg %{1}e[0] 2 vector' '{1}Pg0 = %{1}Pg[0][0]' < galshear_cut.cat | fit2Dpolymodel2 x 4 1 {1}Pg0 > galshear_{1}pg0.par
-    lc +all 'x = %rg %{1}e[1] 2 vector' '{1}Pg1 = %{1}Pg[1][1]' < galshear_cut.cat | fit2Dpolymodel2 x 4 1 {1}Pg1 > galshear_{1}pg1.par
-    """.format(pwd,x)
+    # Commands to run (in pwd)
+    commands = [
+    "lc +all 'x = %rg %{0}e[0] 2 vector' '{0}Pg0 = %{0}Pg[0][0]' < galshear_cut.cat | fit2Dpolymodel2 x 4 1 {0}Pg0 > galshear_{0}pg0.par".format(x),
+    "lc +all 'x = %rg %{0}e[1] 2 vector' '{0}Pg1 = %{0}Pg[1][1]' < galshear_cut.cat | fit2Dpolymodel2 x 4 1 {0}Pg1 > galshear_{0}pg1.par".format(x)
+    ]
 
     print("\nCreating Pgamma par files for {0}pg0 and {0}pg1 for redshift {1}:\n".format(x,z))
-    print(commands)
-    os.system(commands)
+    for cmd in commands:
+        print(cmd)
+        runner.run_command(cmd, cwd=pwd)
 
 def create_pars(z):
     for x in ['c','c9','m','m9']:
         Pgamma(z,x)
 
-def main():
-    """Run main function."""
+
+def create_pars_numpy(z,l0=4,l1=1,store=False):
+    """Fit all eight P_gamma models in-process and write their par files.
+
+    galshear_cut.cat is read once. The model {x}pg{k} fits {x}Pg[k][k] as a
+    polynomial of order l0 in rg and l1 in {x}e[k], like
+    ``fit2Dpolymodel2 x 4 1``. The eight fits share the powers of rg and are
+    solved with a single batched call of polymodel.fit.
+
+    Args:
+      z (float): redshift e.g. 0.5, 0.7, 1.0, 1.5
+      l0, l1 (int): polynomial orders in rg and e.
+      store (bool): read galshear_cut.store instead of galshear_cut.cat
+
+    :Inputs: galshear_cut.cat (or galshear_cut.store)
+
+    :Outputs: The same 8 par files as Pgamma e.g. galshear_cpg0.par
+
+    """
+    pwd = "galshear/galshear_cat_z{0}".format(z)
+    if store:
+        cat = catstore.CatStore(catstore.store_path(z,'galshear_cut')).read()
+    else:
+        cat = catalog.read_cat(os.path.join(pwd,'galshear_cut.cat'))
+    print("\nFitting 8 Pgamma models for redshift {} ({} objects):\n".format(z,len(cat)))
+
+    models = [(x,k) for k in [0,1] for x in ['c','c9','m','m9']]
+    x1 = np.array([cat[x+'e'][:,k] for x,k in models])
+    y  = np.array([cat[x+'Pg'][:,k,k] for x,k in models])
+    a, rms = polymodel.fit(cat['rg'],x1,y,l0,l1)
+
+    for (x,k), ak, rk in zip(models,a,rms):
+        ofile = os.path.join(pwd,'galshear_{}pg{}.par'.format(x,k))
+        polymodel.write_par(ofile,ak,l0,l1,'{}Pg{}'.format(x,k),
+                            rms=rk,nobjects=len(cat))
+        print('Created : {}  (rms {:.4g})'.format(ofile,rk))
+
+def run(z,engine='imcat',big=False,chunksize=100000,store=False,converged=False):
+    """Create galshear_cut.cat and the 8 Pgamma par files for one redshift.
+
+    Args:
+      z (float): redshift e.g. 0.5, 0.7, 1.0, 1.5
+      engine (str): 'imcat' runs catcats, lc and fit2Dpolymodel2, 'numpy'
+        does the cut and the fits in-process.
+      big (bool): with engine 'numpy', also write galshear_big.cat
+      chunksize (int): objects read at a time with engine 'numpy'.
+      store (bool): with engine 'numpy', read the store of a02 and write
+        galshear_cut.store
+      converged (bool): with engine 'numpy', cut on the converged flag of
+        the centroids instead of dx.
+
+    """
+    if (store or converged) and engine != 'numpy':
+        raise ValueError('the catalog store and the converged cut need engine numpy')
+
     # First create big_cat and cut_cat
-    z = float(sys.argv[1])
-    bigcat_cutcat(z)
+    if engine == 'numpy':
+        bigcat_cutcat_stream(z,big=big,chunksize=chunksize,store=store,converged=converged)
+    else:
+        bigcat_cutcat(z)
 
     # Then create Pgamma par files.
-    create_pars(z)
+    if engine == 'numpy':
+        create_pars_numpy(z,store=store)
+    else:
+        create_pars(z)
 
-if __name__ == "__main__":
-    import time
 
-    # Beginning time
-    program_begin_time = time.time()
-    begin_ctime        = time.ctime()
+def main():
+    """Run main function."""
+    parser = argparse.ArgumentParser(description='Create P_gamma par files for one redshift.')
+    parser.add_argument('z', type=float, help='redshift e.g. 0.7')
+    parser.add_argument('--engine', choices=['imcat','numpy'], default='imcat',
+                        help='run catcats, lc and fit2Dpolymodel2 or do it in-process')
+    parser.add_argument('--big', action='store_true',
+                        help='with --engine numpy, also write galshear_big.cat')
+    parser.add_argument('--chunksize', type=int, default=100000,
+                        help='objects read at a time with --engine numpy')
+    parser.add_argument('--store', action='store_true',
+                        help='with --engine numpy, read galshear_z{z}.store and '
+                             'write galshear_cut.store')
+    parser.add_argument('--converged', action='store_true',
+                        help='with --engine numpy, cut on the converged flag of '
+                             'a02 --refine numpy instead of dx < {}'.format(DX_MAX))
+    args = parser.parse_args()
+    with telemetry.stage('a03', args.z, echo=True, engine=args.engine):
+        run(args.z,args.engine,args.big,args.chunksize,args.store,args.converged)
+        pipeline.report_files(pipeline.stage_spec('a03',args.z,args.engine,args.store,
+                                                  args.converged))
 
-    #  Run the main program
+if __name__ == "__main__":
     main()
-
-    # # Print the time taken
-    # program_end_time = time.time()
-    # end_ctime        = time.ctime()
-    # seconds          = program_end_time - program_begin_time
-    # m, s             = divmod(seconds, 60)
-    # h, m             = divmod(m, 60)
-    # d, h             = divmod(h, 24)
-    # print("\nBegin time: ", begin_ctime)
-    # print("End   time: ", end_ctime, "\n")
-    # print("Time taken: {0: .0f} days, {1: .0f} hours, \
-    #   {2: .0f} minutes, {3: f} seconds.".format(d, h, m, s))
@@ -30,11 +30,33 @@
 
 
 :Runtime:  2.5 mins (for 4 redshifts and 100 files)
+
+:Usage: ``--engine numpy`` evaluates the par files written by
+  ``a03_Pgamma_cat.py --engine numpy`` and writes galshear_shear.cat in one
+  pass (add ``--fpg`` to also write galshear_fpg.cat)::
+
+    python a04_fitted_Pgamma.py 0.7 --engine numpy
+
+  ``--store`` reads galshear_cut.store written by ``a03_Pgamma_cat.py --store``.
 """
 # Imports
+import argparse
 import os,sys
 import time
 
+import numpy as np
+
+import catalog
+import catstore
+import polymodel
+import pipeline
+import runner
+import telemetry
+
+# cut applied to the shear catalog
+DX_MAX  = 0.078
+MAG_MAX = 3
+
 
 def fitted_Pgamma(z):
     """Create fitted Pgamma cat file for given redshift.
@@ -63,13 +85,12 @@ def fitted_Pgamma(z):
 
     # Commands to run
     commands = """
-    cd {0}
     lc +all 'ox = %x' 'x = %rg %e[0] 2 vector' < galshear_cut.cat | gen2Dpolymodel galshear_mpg0.par | gen2Dpolymodel galshear_m9pg0.par | gen2Dpolymodel galshear_cpg0.par | gen2Dpolymodel galshear_c9pg0.par | lc +all 'x = %rg %e[1] 2 vector' | gen2Dpolymodel galshear_mpg1.par | gen2Dpolymodel galshear_m9pg1.par | gen2Dpolymodel galshear_cpg1.par | gen2Dpolymodel galshear_c9pg1.par | lc +all 'x = %ox' > galshear_fpg.cat
-    """.format(pwd)
+    """
 
     print("\nCreating fitted Pgamma cat file galshear_fpg.cat for redshift {0}:\n".format(z))
     print(commands)
-    os.system(commands)
+    print(runner.format_results(runner.run_command(commands, cwd=pwd)))
 
 
 
@@ -92,41 +113,111 @@ def shear(z):
 
     # Commands to run
     commands = """
-    cd {0}
     lc +all 'mg = %me[0] %mPg0mod / %me[1] %mPg1mod / 2 vector' 'm9g = %m9e[0] %m9Pg0mod / %m9e[1] %m9Pg1mod / 2 vector' 'cg = %ce[0] %cPg0mod / %ce[1] %cPg1mod / 2 vector' 'c9g = %c9e[0] %c9Pg0mod / %c9e[1] %c9Pg1mod / 2 vector' < galshear_fpg.cat | lc +all 'mg_avg = %mg %m9g vadd 0.5 vscale' 'cg_avg = %cg %c9g vadd 0.5 vscale' | lc -i '%dx %dx dot sqrt 0.078 < %mag 3 < and' > galshear_shear.cat
-    """.format(pwd)
+    """
 
     print("\nCreating fitted Pgamma cat file galshear_shear.cat for redshift {0}:\n".format(z))
     print(commands)
-    os.system(commands)
+    print(runner.format_results(runner.run_command(commands, cwd=pwd)))
+
+
+
+def fitted_shear_numpy(z,fpg=False,ename='e',store=False):
+    """Create the shear cat file in-process from galshear_cut.cat and 8 par files.
+
+    The eight P_gamma models are evaluated on the whole column arrays in one
+    pass (the four models of each component share their design matrix), then
+    the shear columns of shear() are computed and the same cut is applied.
+    Like the gen2Dpolymodel pipeline, x = (rg, e[k]) uses the column e.
+
+    Args:
+      z (float): redshift e.g. 0.5, 0.7, 1.0, 1.5
+      fpg (bool): also write galshear_fpg.cat
+      ename (str): ellipticity column used as second component of x.
+      store (bool): read galshear_cut.store instead of galshear_cut.cat
+
+    :Inputs: galshear_cut.cat (or galshear_cut.store) and the 8 Pgamma par files.
+
+    :Outputs: galshear_shear.cat (and galshear_fpg.cat with fpg=True)
+
+    """
+    pwd = "galshear/galshear_cat_z{0}".format(z)
+    if store:
+        cat = catstore.CatStore(catstore.store_path(z,'galshear_cut')).read()
+    else:
+        cat = catalog.read_cat(os.path.join(pwd,'galshear_cut.cat')).copy()
+    print("\nEvaluating 8 Pgamma models for redshift {} ({} objects):\n".format(z,len(cat)))
+
+    xs = ['m','m9','c','c9']
+    for k in [0,1]:
+        pars = [polymodel.read_par(os.path.join(pwd,'galshear_{}pg{}.par'.format(x,k)))
+                for x in xs]
+        orders = set((p['l0'],p['l1']) for p in pars)
+        if len(orders) != 1:
+            raise ValueError('Pgamma models of component {} have different orders'.format(k))
+        l0, l1 = orders.pop()
+        a = np.array([p['a'] for p in pars])
+        mod = polymodel.evaluate(a,cat['rg'],cat[ename][:,k],l0,l1)
+        for x, m in zip(xs,mod):
+            cat['{}Pg{}mod'.format(x,k)] = m
+
+    if fpg:
+        ofile = os.path.join(pwd,'galshear_fpg.cat')
+        catalog.write_cat(ofile,cat)
+        print('Created : {}'.format(ofile))
+
+    # lc +all 'mg = %me[0] %mPg0mod / %me[1] %mPg1mod / 2 vector' ...
+    for x in xs:
+        cat[x+'g'] = np.stack([cat[x+'e'][:,0] / cat[x+'Pg0mod'],
+                               cat[x+'e'][:,1] / cat[x+'Pg1mod']], axis=1)
+    cat['mg_avg'] = 0.5 * (cat['mg'] + cat['m9g'])
+    cat['cg_avg'] = 0.5 * (cat['cg'] + cat['c9g'])
+
+    # lc -i '%dx %dx dot sqrt 0.078 < %mag 3 < and'
+    dx   = np.sqrt(np.einsum('ni,ni->n', cat['dx'], cat['dx']))
+    mask = (dx < DX_MAX) & (cat['mag'] < MAG_MAX)
+
+    ofile = os.path.join(pwd,'galshear_shear.cat')
+    catalog.write_cat(ofile,cat.select(mask))
+    print('Created : {} ({} objects)'.format(ofile,int(mask.sum())))
+
+
+def run(z,engine='imcat',fpg=False,store=False):
+    """Create the shear cat file for one redshift.
+
+    Args:
+      z (float): redshift e.g. 0.5, 0.7, 1.0, 1.5
+      engine (str): 'imcat' runs gen2Dpolymodel and lc, 'numpy' evaluates
+        the models in-process.
+      fpg (bool): with engine 'numpy', also write galshear_fpg.cat
+      store (bool): with engine 'numpy', read galshear_cut.store
+
+    """
+    if store and engine != 'numpy':
+        raise ValueError('the catalog store needs engine numpy')
 
+    if engine == 'numpy':
+        fitted_shear_numpy(z,fpg=fpg,store=store)
+    else:
+        fitted_Pgamma(z)
+        shear(z)
 
 
 def main():
     """Run main function."""
-    z = float(sys.argv[1])
-    fitted_Pgamma(z)
-    shear(z)
+    parser = argparse.ArgumentParser(description='Create the shear catalog for one redshift.')
+    parser.add_argument('z', type=float, help='redshift e.g. 0.7')
+    parser.add_argument('--engine', choices=['imcat','numpy'], default='imcat',
+                        help='run gen2Dpolymodel and lc or evaluate the models in-process')
+    parser.add_argument('--fpg', action='store_true',
+                        help='with --engine numpy, also write galshear_fpg.cat')
+    parser.add_argument('--store', action='store_true',
+                        help='with --engine numpy, read galshear_cut.store')
+    args = parser.parse_args()
+    with telemetry.stage('a04', args.z, echo=True, engine=args.engine):
+        run(args.z,args.engine,args.fpg,args.store)
+        pipeline.report_files(pipeline.stage_spec('a04',args.z,args.engine,args.store))
 
 
 if __name__ == "__main__":
-    import time
-
-    # Beginning time
-    program_begin_time = time.time()
-    begin_ctime        = time.ctime()
-
-    #  Run the main program
     main()
-
-    # # Print the time taken
-    # program_end_time = time.time()
-    # end_ctime        = time.ctime()
-    # seconds          = program_end_time - program_begin_time
-    # m, s             = divmod(seconds, 60)
-    # h, m             = divmod(m, 60)
-    # d, h             = divmod(h, 24)
-    # print("\nBegin time: ", begin_ctime)
-    # print("End   time: ", end_ctime, "\n")
-    # print("Time taken: {0: .0f} days, {1: .0f} hours, \
-    #   {2: .0f} minutes, {3: f} seconds.".format(d, h, m, s))
@@ -35,11 +35,23 @@
 
 :Runtime: 1 minutes for redshift 1.0 and 216 files.
 
+:Usage: ``--engine numpy`` computes the four profiles in one pass with the
+  etprofile module::
+
+    python a05_etprofile_cm_shear_ellip.py 0.7 --engine numpy
+
 """
 # Imports
+import argparse
 import os,sys
 import time
 
+import catalog
+import etprofile
+import pipeline
+import runner
+import telemetry
+
 def etprofile_(z):
     """Run etprofile on combined shear cat file and create FOUR dat files for c/m ellp/shr.
 
@@ -59,14 +71,12 @@ def etprofile_(z):
     pwd = "galshear/galshear_cat_z{0}".format(z)
 
     # Commands to run
-    commands = """
-    cd {0}
-    etprofile -o 1700 1700 -d 0.2 -r 100 1200 -e cg_avg < galshear_shear.cat | lc -O > color_galshear_shear.dat ;
-    etprofile -o 1700 1700 -d 0.2 -r 100 1200 -e mg_avg < galshear_shear.cat | lc -O > mono_galshear_shear.dat ;
-    lc +all 'ce_avg = %ce %c9e vadd 0.5 vscale' < galshear_shear.cat | etprofile -o 1700 1700 -d 0.2 -r 100 1200 -e ce_avg | lc -O > color_galshear_ellip.dat   ;
-    lc +all 'me_avg = %me %m9e vadd 0.5 vscale' < galshear_shear.cat | etprofile -o 1700 1700 -d 0.2 -r 100 1200 -e me_avg | lc -O > mono_galshear_ellip.dat
-    cd -
-    """.format(pwd)
+    commands = [
+    "etprofile -o 1700 1700 -d 0.2 -r 100 1200 -e cg_avg < galshear_shear.cat | lc -O > color_galshear_shear.dat",
+    "etprofile -o 1700 1700 -d 0.2 -r 100 1200 -e mg_avg < galshear_shear.cat | lc -O > mono_galshear_shear.dat",
+    "lc +all 'ce_avg = %ce %c9e vadd 0.5 vscale' < galshear_shear.cat | etprofile -o 1700 1700 -d 0.2 -r 100 1200 -e ce_avg | lc -O > color_galshear_ellip.dat",
+    "lc +all 'me_avg = %me %m9e vadd 0.5 vscale' < galshear_shear.cat | etprofile -o 1700 1700 -d 0.2 -r 100 1200 -e me_avg | lc -O > mono_galshear_ellip.dat"
+    ]
 
     print("\nPwd: {} ".format(pwd))
     print("""Creating:
@@ -76,33 +86,66 @@ def etprofile_(z):
     mono_galshear_ellip.dat """)
 
     # print(commands)
-    os.system(commands)
+    for cmd in commands:
+        runner.run_command(cmd, cwd=pwd)
+
+# output dat file -> ellipticity vector used for the profile
+PROFILES = [('color_galshear_shear.dat', 'cg_avg'),
+            ('mono_galshear_shear.dat',  'mg_avg'),
+            ('color_galshear_ellip.dat', 'ce_avg'),
+            ('mono_galshear_ellip.dat',  'me_avg')]
+
+
+def etprofile_numpy(z):
+    """Create the FOUR dat files for c/m ellp/shr in a single pass.
+
+    galshear_shear.cat is read once, ce_avg and me_avg are computed from
+    ce, c9e, me and m9e, and all four profiles are binned together with
+    etprofile.etprofiles using the same options as etprofile_.
+
+    Args:
+      z (float): redshift e.g. 0.5, 0.7, 1.0, 1.5
+
+    :Inputs: galshear_shear.cat
+
+    :Outputs: The same four dat files as etprofile_.
+
+    """
+    pwd = "galshear/galshear_cat_z{0}".format(z)
+    cat = catalog.read_cat(os.path.join(pwd,'galshear_shear.cat'))
+
+    es = {'cg_avg': cat['cg_avg'],
+          'mg_avg': cat['mg_avg'],
+          'ce_avg': 0.5 * (cat['ce'] + cat['c9e']),
+          'me_avg': 0.5 * (cat['me'] + cat['m9e'])}
+    profiles = etprofile.etprofiles(cat['x'],es)
+
+    print("\nPwd: {} ".format(pwd))
+    for ofile, ename in PROFILES:
+        etprofile.write_profile(os.path.join(pwd,ofile),profiles[ename])
+        print('Created : {}'.format(ofile))
+
+
+def run(z,engine='imcat'):
+    """Create the FOUR dat files for c/m ellp/shr with etprofile or in-process."""
+    if engine == 'numpy':
+        etprofile_numpy(z)
+    else:
+        etprofile_(z)
+
 
 def main():
     """Run main function."""
-    z = float(sys.argv[1])
-    etprofile_(z)
+    parser = argparse.ArgumentParser(description='Create the c/m shear and ellip profiles.')
+    parser.add_argument('z', type=float, help='redshift e.g. 0.7')
+    parser.add_argument('--engine', choices=['imcat','numpy'], default='imcat',
+                        help='run etprofile four times or bin all profiles in-process')
+    args = parser.parse_args()
+    with telemetry.stage('a05', args.z, echo=True, engine=args.engine):
+        run(args.z,args.engine)
+        pipeline.report_files(pipeline.stage_spec('a05',args.z,args.engine))
 
 
 
 if __name__ == "__main__":
-    import time
-
-    # Beginning time
-    program_begin_time = time.time()
-    begin_ctime        = time.ctime()
-
-    #  Run the main program
     main()
-
-    # # Print the time taken
-    # program_end_time = time.time()
-    # end_ctime        = time.ctime()
-    # seconds          = program_end_time - program_begin_time
-    # m, s             = divmod(seconds, 60)
-    # h, m             = divmod(m, 60)
-    # d, h             = divmod(h, 24)
-    # print("\nBegin time: ", begin_ctime)
-    # print("End   time: ", end_ctime, "\n")
-    # print("Time taken: {0: .0f} days, {1: .0f} hours, \
-    #   {2: .0f} minutes, {3: f} seconds.".format(d, h, m, s))
@@ -7,10 +7,15 @@
 """
 .. note::
 
-   This program creates a new dat file with variables
-   shear and ellipticity
-   by reading only some columns from two input files for
-   chromatic and monochromatic cases.
+   This program merges the color and mono profiles of a05 into one file
+   with the variables shear and ellipticity, for chromatic and
+   monochromatic cases.
+
+   Every profile is read once with np.loadtxt and the merged columns are
+   written both as a dat file and as an IMCAT catalog (the cat file that
+   a07 used to make with ``lc -C``; a07 now only checks them), without
+   any loop over the rows and without running lc. Several redshifts can
+   be merged in one call.
 
 :Depends: This program depends on following:
     color_galshear_shear.dat
@@ -20,129 +25,118 @@
 
 :Outputs: The outputs are in the folder galshear/galshear_cat_z0.5/:
     color_mono_galshear_shear.dat
+    color_mono_galshear_shear.cat
     color_mono_galshear_ellip.dat
+    color_mono_galshear_ellip.cat
+
+  The columns are those read by a08::
+
+    shear:  r  rkappa  ngals  gm  gmerr  gc  gcerr
+    ellip:  r  rkappa  ngals  em  emerr  ec  ecerr
 
 :Runtime: 0.3 seconds.
 
+:Usage: Typical use::
+
+    python a06_cm_galshear_shear_ellip_dat.py 0.5 0.7 1.0 1.5
+
 """
 # Imports
+import argparse
 import numpy as np
-import subprocess
 import os
 import sys
-import shutil
 
-def cm_shear(z):
-    """Create cm shear file with variables:
-      r       rkappa     ngals   etmono eterrormono etcolor  eterrorcolor
+import catalog
+import etprofile
+import pipeline
+import telemetry
 
-    Args:
-      z (float): redshift e.g. 0.5, 0.7, 1.0, 1.5
+# kind -> names of the mono and color et and eterror columns
+CM_COLUMNS = {'shear': ['gm','gmerr','gc','gcerr'],
+              'ellip': ['em','emerr','ec','ecerr']}
 
-    :Inputs: color_galshear_shear.dat and mono_galshear_shear.dat
 
-    :Outputs:
-	  color_mono_galshear_shear.dat
-	  color_mono_galshear_shear.cat
+def cm_columns(kind):
+    """Return the column names of the merged file of kind 'shear' or 'ellip'."""
+    return ['r','rkappa','ngals'] + CM_COLUMNS[kind]
 
-    """
-    # bin   r   ngals   et  eterror   rkappa   kappa  kappaerror  nu
-    # 0     1   2       3   4         5        6      7           8
-    infile1 = 'galshear/galshear_cat_z{0}/color_galshear_shear.dat'.format(z)
-    infile2 = 'galshear/galshear_cat_z{0}/mono_galshear_shear.dat'.format(z)
-    r,rkappa,ngals,etmono ,eterrormono  = np.genfromtxt(infile1,delimiter=None,usecols=(1,5,2,3,4),dtype=float,unpack=True)
-    r,rkappa,ngals,etcolor,eterrorcolor = np.genfromtxt(infile2,delimiter=None,usecols=(1,5,2,3,4),dtype=float,unpack=True)
 
-    # write to a file
-    outfile = 'galshear/galshear_cat_z{0}/color_mono_galshear_shear.dat'.format(z)
-    print('Creating : ', outfile)
-    with open(outfile,'w') as f:
-        # write header
-        header = '# r       rkappa     ngals   etmono eterrormono etcolor  eterrorcolor '
-        print(header,file=f)
+def read_profile(path):
+    """Return the columns r, rkappa, ngals, et and eterror of an etprofile dat file."""
+    data = np.loadtxt(path, ndmin=2)
+    cols = [etprofile.COLUMNS.index(k) for k in ['r','rkappa','ngals','et','eterror']]
+    return data[:,cols]
 
-        # write data
-        for i in range(len(r)):
-            print(r[i],rkappa[i],ngals[i],etmono[i],eterrormono[i],etcolor[i],eterrorcolor[i],sep='   ', file=f)
 
+def write_cm(base, cat, kind):
+    """Write a merged catalog as base.dat and base.cat."""
+    names = cm_columns(kind)
+    data  = np.column_stack([cat[k] for k in names])
+    np.savetxt(base + '.dat', data, fmt='%.10g', header='  '.join(names))
+    catalog.write_cat(base + '.cat', cat)
 
-    # convert dat to cat
-    outfile = 'galshear/galshear_cat_z{0}/color_mono_galshear_shear.cat'.format(z)
-    cmd = 'lc -C -n r -n rkappa -n ngals -n etmono -n eterrormono -n etcolor -n eterrorcolor < galshear/galshear_cat_z{0}/color_mono_galshear_shear.dat > galshear/galshear_cat_z{0}/color_mono_galshear_shear.cat'.format(z)
-    print('Creating : ', outfile)
-    subprocess.call(cmd, shell=True)
 
+def cm_merge(z, kind):
+    """Create the cm dat and cat files of shear or ellip for one redshift.
 
-def cm_ellip(z):
-    """Create cm ellip file with variables:
-      r       rkappa     ngals   etmono eterrormono etcolor  eterrorcolor
+    The color profile gives gc, gcerr (ec, ecerr) and the mono profile
+    gives gm, gmerr (em, emerr).
 
     Args:
       z (float): redshift e.g. 0.5, 0.7, 1.0, 1.5
+      kind (str): 'shear' or 'ellip'
 
-    :Inputs: color_galshear_ellip.dat and mono_galshear_ellip.dat
+    :Inputs: color_galshear_{kind}.dat and mono_galshear_{kind}.dat
 
     :Outputs:
-	  color_mono_galshear_ellip.dat
-	  color_mono_galshear_ellip.cat
-
-    :Commands: The command used is::
-
-      lc -C -n r -n rkappa -n ngals -n etmono -n eterrormono -n etcolor -n eterrorcolor < galshear/galshear_cat_z{0}/color_mono_galshear_ellip.dat > galshear/galshear_cat_z{0}/color_mono_galshear_ellip.cat
+	  color_mono_galshear_{kind}.dat
+	  color_mono_galshear_{kind}.cat
 
     """
-    infile1 = 'galshear/galshear_cat_z{0}/color_galshear_ellip.dat'.format(z)
-    infile2 = 'galshear/galshear_cat_z{0}/mono_galshear_ellip.dat'.format(z)
-    r,rkappa,ngals,etmono,eterrormono = np.genfromtxt(infile1,delimiter=None,usecols=(1,5,2,3,4),dtype=float,unpack=True)
-    r,rkappa,ngals,etcolor,eterrorcolor = np.genfromtxt(infile2,delimiter=None,usecols=(1,5,2,3,4),dtype=float,unpack=True)
+    pwd   = 'galshear/galshear_cat_z{0}'.format(z)
+    color = read_profile('{}/color_galshear_{}.dat'.format(pwd,kind))
+    mono  = read_profile('{}/mono_galshear_{}.dat'.format(pwd,kind))
+    if color.shape != mono.shape or not np.allclose(color[:,0], mono[:,0]):
+        raise ValueError('color and mono {} profiles of redshift {} have different bins'.format(
+                         kind,z))
+
+    # r, rkappa, ngals of the color profile, then mono and color et, eterror
+    cat = catalog.Catalog(zip(cm_columns(kind),
+                              np.column_stack([color[:,:3], mono[:,3:], color[:,3:]]).T))
+    base = '{}/color_mono_galshear_{}'.format(pwd,kind)
+    print('Creating : ', base + '.dat')
+    print('Creating : ', base + '.cat')
+    write_cm(base, cat, kind)
 
 
+def cm_shear(z):
+    """Create color_mono_galshear_shear.dat and .cat, see cm_merge."""
+    cm_merge(z,'shear')
 
-    # write to a file
-    outfile = 'galshear/galshear_cat_z{0}/color_mono_galshear_ellip.dat'.format(z)
-    print('Creating : ', outfile)
-    with open(outfile,'w') as f:
 
-        # write header
-        header = '# r       rkappa     ngals   etmono eterrormono etcolor  eterrorcolor '
-        print(header,file=f)
+def cm_ellip(z):
+    """Create color_mono_galshear_ellip.dat and .cat, see cm_merge."""
+    cm_merge(z,'ellip')
 
-        # write data
-        for i in range(len(r)):
-            print(r[i],rkappa[i],ngals[i],etmono[i],eterrormono[i],etcolor[i],eterrorcolor[i],sep='   ', file=f)
 
+def run(redshifts):
+    """Create the cm shear and ellip files for all the redshifts."""
+    for z in redshifts:
+        for kind in ['shear','ellip']:
+            cm_merge(z,kind)
 
-    # convert dat to cat
-    outfile = 'galshear/galshear_cat_z{0}/color_mono_galshear_shear.cat'.format(z)
-    print('Creating : ', outfile)
-    cmd = 'lc -C -n r -n rkappa -n ngals -n etmono -n eterrormono -n etcolor -n eterrorcolor < galshear/galshear_cat_z{0}/color_mono_galshear_ellip.dat > galshear/galshear_cat_z{0}/color_mono_galshear_ellip.cat'.format(z)
-    subprocess.call(cmd, shell=True)
 
 def main():
     """Run main function."""
-    z = float(sys.argv[1])
-    cm_shear(z)
-    cm_ellip(z)
+    parser = argparse.ArgumentParser(description='Merge the color and mono profiles.')
+    parser.add_argument('z', type=float, nargs='+', help='redshifts e.g. 0.5 0.7 1.0 1.5')
+    args = parser.parse_args()
+    for z in args.z:
+        with telemetry.stage('a06', z, echo=True):
+            run([z])
+            pipeline.report_files(pipeline.stage_spec('a06',z))
 
 
 if __name__ == "__main__":
-    import time
-
-    # Beginning time
-    program_begin_time = time.time()
-    begin_ctime        = time.ctime()
-
-    #  Run the main program
     main()
-
-    # # Print the time taken
-    # program_end_time = time.time()
-    # end_ctime        = time.ctime()
-    # seconds          = program_end_time - program_begin_time
-    # m, s             = divmod(seconds, 60)
-    # h, m             = divmod(m, 60)
-    # d, h             = divmod(h, 24)
-    # print("\nBegin time: ", begin_ctime)
-    # print("End   time: ", end_ctime, "\n")
-    # print("Time taken: {0: .0f} days, {1: .0f} hours, \
-    #   {2: .0f} minutes, {3: f} seconds.".format(d, h, m, s))
@@ -7,81 +7,73 @@
 """
 .. note::
 
-   This program creates the shear and ellip cat files from dat files.
+   This program used to create the shear and ellip cat files from the dat
+   files with ``lc -C``.
+
+   a06 now writes both forms, so this program only checks that the cat
+   and dat files of a06 are there and does not write anything. It is kept
+   so that the a07 stage of pipeline.py and the scripts that run it still
+   work.
 
 :Depends: This program depends on following:
     color_mono_galshear_shear.dat
     color_mono_galshear_ellip.dat
-
-:Outputs: The outputs are in the folder galshear/galshear_cat_z0.5/:
     color_mono_galshear_shear.cat
     color_mono_galshear_ellip.cat
 
+:Outputs: None.
+
 :Runtime: 0.1 seconds.
 
 """
 # Imports
+import argparse
 import os,sys
 import time
 
+import telemetry
+
+CM_FILES = ['color_mono_galshear_{}.{}'.format(kind,ext)
+            for kind in ['shear','ellip'] for ext in ['dat','cat']]
+
 
 def cm_shear_ellip(z):
-    """Create TWO color-mono cat files for shear and ellip from dat files.
+    """Check that a06 created the color-mono dat and cat files.
 
     Args:
       z (float): redshift e.g. 0.5, 0.7, 1.0, 1.5
 
-    :Inputs: The outputs are following:
+    :Inputs: The cat and dat files of a06:
       color_mono_galshear_shear.dat
       color_mono_galshear_ellip.dat
-
-
-    :Outputs: The outputs are following:
       color_mono_galshear_shear.cat
       color_mono_galshear_ellip.cat
 
+    Raises:
+      RuntimeError: some of the files are missing.
+
     """
     # Variables
     pwd = "galshear/galshear_cat_z{0}".format(z)
 
-    # Commands to run
-    commands = """
-    cd {0}
-    lc -C -n r -n rkappa -n ngals -n gm -n gmerr -n gc -n gcerr < color_mono_galshear_shear.dat > color_mono_galshear_shear.cat ;
-    lc -C -n r -n rkappa -n ngals -n em -n emerr -n ec -n ecerr < color_mono_galshear_ellip.dat > color_mono_galshear_ellip.cat
-    """.format(pwd)
-
-    print("\nCreating galshear/color_mono_galshear_shear.cat for redshift {} ".format(z))
-    print("Creating galshear/color_mono_galshear_ellip.cat for redshift {} ".format(z))
-
-    # print(commands)
-    os.system(commands)
+    paths = [os.path.join(pwd,f) for f in CM_FILES]
+    missing = [f for f in paths if not os.path.isfile(f)]
+    if missing:
+        raise RuntimeError('missing {}, run a06_cm_galshear_shear_ellip_dat.py {}'.format(
+                           ', '.join(missing),z))
+    telemetry.current().add_input(paths)
+    print("\nThe color-mono cat files of redshift {} were created by a06".format(z))
 
 
 def main():
     """Run main function."""
-    z = float(sys.argv[1])
-    cm_shear_ellip(z)
+    parser = argparse.ArgumentParser(description='Check the color-mono cat files of a06.')
+    parser.add_argument('z', type=float, nargs='+', help='redshifts e.g. 0.5 0.7 1.0 1.5')
+    args = parser.parse_args()
+    for z in args.z:
+        with telemetry.stage('a07', z, echo=True):
+            cm_shear_ellip(z)
 
 
 if __name__ == "__main__":
-    import time
-
-    # Beginning time
-    program_begin_time = time.time()
-    begin_ctime        = time.ctime()
-
-    #  Run the main program
     main()
-
-    # # Print the time taken
-    # program_end_time = time.time()
-    # end_ctime        = time.ctime()
-    # seconds          = program_end_time - program_begin_time
-    # m, s             = divmod(seconds, 60)
-    # h, m             = divmod(m, 60)
-    # d, h             = divmod(h, 24)
-    # print("\nBegin time: ", begin_ctime)
-    # print("End   time: ", end_ctime, "\n")
-    # print("Time taken: {0: .0f} days, {1: .0f} hours, \
-    #   {2: .0f} minutes, {3: f} seconds.".format(d, h, m, s))
@@ -36,13 +36,43 @@
     plotcat r gm -w 3  -T 'shear analysis for default'  -d 'r_gm_shear.ps/ps'  <  color_mono_galshear_shear.cat
     ps2pdf r_gm_shear.ps r_gm_shear.pdf
 
+:Usage: ``--engine numpy`` draws the same eight panels in-process with
+  matplotlib. The two cat files are read once and a vector pdf with one
+  page per panel is written directly (no ps files, no montage in a09).
+  Several redshifts are rendered in parallel processes::
+
+    python a08_create_plots.py 0.5 0.7 1.0 1.5 --engine numpy --jobs 4
+
+  The pdf is plots/galshear_plots_z0.7/shear_z0_7.pdf, the output of a09,
+  and a09 does nothing when it is newer than the ps files. There is one
+  pdf per redshift (see a09).
+
 
 """
 
 # Imports
+import argparse
+import multiprocessing
 import time
 import os,sys
 
+import numpy as np
+
+import catalog
+import pipeline
+import runner
+import telemetry
+
+# name of the panel, cat file, label, function of the cat giving (y, yerr)
+PANELS = [('gm_shear',       'shear', 'gm',                lambda c: (c['gm'], c['gmerr'])),
+          ('gc_shear',       'shear', 'gc',                lambda c: (c['gc'], c['gcerr'])),
+          ('grat_shear',     'shear', 'gc / gm',           lambda c: (c['gc'] / c['gm'], None)),
+          ('grat_sheardiff', 'shear', '(gc - gm) / gm',    lambda c: ((c['gc'] - c['gm']) / c['gm'], None)),
+          ('em_ellip',       'ellip', 'em',                lambda c: (c['em'], c['emerr'])),
+          ('ec_ellip',       'ellip', 'ec',                lambda c: (c['ec'], c['ecerr'])),
+          ('erat_ellip',     'ellip', 'ec / em',           lambda c: (c['ec'] / c['em'], None)),
+          ('erat_ellipdiff', 'ellip', '(ec - em) / em',    lambda c: ((c['ec'] - c['em']) / c['em'], None))]
+
 
 def plots(z):
     """Create the final pdf of plots for shear analysis of given redshift.
@@ -95,34 +125,103 @@ def plots(z):
     # cmds to plot
     commands = [cmd1, cmd2, cmd3, cmd4, cmd5, cmd6,cmd7,cmd8]
     for cmd in commands:
-        os.system(cmd)
+        runner.run_command(cmd)
 
     print('\nOutput directory: {}'.format(plot_path))
 
+
+def pdf_path(z):
+    """Return the pdf of all the plots of a redshift e.g. plots/galshear_plots_z0.7/shear_z0_7.pdf."""
+    z0, z1 = str(z).split('.')
+    return 'plots/galshear_plots_z{}/shear_z{}_{}.pdf'.format(z,z0,z1)
+
+
+def _draw(ax, cat, panel, z):
+    """Draw one panel on the axes ax."""
+    name, kind, label, func = panel
+    with np.errstate(divide='ignore', invalid='ignore'):
+        y, yerr = func(cat)
+    ax.errorbar(cat['r'], y, yerr=yerr, fmt='o-', lw=1.5, ms=3, capsize=2)
+    ax.set_xlabel('r (pixels)')
+    ax.set_ylabel(label)
+    ax.set_title('{} at redshift {}: {}'.format('shear' if kind == 'shear' else 'ellipticity',
+                                                z, label), fontsize=9)
+    ax.grid(alpha=0.3)
+
+
+def plots_numpy(z):
+    """Create the multipage pdf of the eight plots of a redshift with matplotlib.
+
+    Args:
+      z (float): redshift e.g. 0.5, 0.7, 1.0, 1.5
+
+    :Inputs: color_mono_galshear_shear.cat and color_mono_galshear_ellip.cat
+
+    :Outputs: plots/galshear_plots_z0.7/shear_z0_7.pdf
+
+    """
+    # Figure objects rather than pyplot, which is not thread safe (pipeline.py)
+    from matplotlib.backends.backend_pdf import PdfPages
+    from matplotlib.figure import Figure
+
+    pwd  = "galshear/galshear_cat_z{}".format(z)
+    cats = dict((kind, catalog.read_cat('{}/color_mono_galshear_{}.cat'.format(pwd,kind)))
+                for kind in ['shear','ellip'])
+
+    ofile = pdf_path(z)
+    if not os.path.isdir(os.path.dirname(ofile)):
+        os.makedirs(os.path.dirname(ofile))
+
+    # written next to ofile and renamed when complete
+    tmp = ofile + '.part'
+    with PdfPages(tmp) as pdf:
+        for panel in PANELS:
+            fig = Figure(figsize=(8, 6))
+            _draw(fig.subplots(), cats[panel[1]], panel, z)
+            pdf.savefig(fig)
+        pdf.infodict()['Title'] = 'ellipticity and shear for z = {}'.format(z)
+    os.rename(tmp, ofile)
+    print('Created : {}'.format(ofile))
+
+
+def run(z,engine='imcat'):
+    """Create the plots of a redshift with plotcat or in-process."""
+    if engine == 'numpy':
+        plots_numpy(z)
+    else:
+        plots(z)
+
+
+def run_all(redshifts,engine='imcat',jobs=1):
+    """Create the plots of several redshifts, jobs redshifts at a time with engine numpy."""
+    if engine == 'numpy' and jobs > 1 and len(redshifts) > 1:
+        pool = multiprocessing.Pool(processes=min(jobs,len(redshifts)))
+        try:
+            pool.map(plots_numpy, redshifts)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        for z in redshifts:
+            run(z,engine)
+
+
 def main():
     """Run main function."""
-    z = float(sys.argv[1])
-    plots(z)
+    parser = argparse.ArgumentParser(description='Create the plots of the shear analysis.')
+    parser.add_argument('z', type=float, nargs='+', help='redshifts e.g. 0.5 0.7 1.0 1.5')
+    parser.add_argument('--engine', choices=['imcat','numpy'], default='imcat',
+                        help='run plotcat or draw a multipage pdf with matplotlib')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='number of redshifts rendered in parallel with --engine numpy')
+    args = parser.parse_args()
+    z = args.z[0] if len(args.z) == 1 else None
+    with telemetry.stage('a08', z, echo=True, engine=args.engine, jobs=args.jobs,
+                         redshifts=args.z):
+        run_all(args.z,args.engine,args.jobs)
+        for z in args.z:
+            pipeline.report_files(pipeline.stage_spec('a08',z,args.engine))
 
 
 if __name__ == "__main__":
-    import time
-
-    # Beginning time
-    program_begin_time = time.time()
-    begin_ctime        = time.ctime()
-
-    #  Run the main program
     main()
-
-    # # Print the time taken
-    # program_end_time = time.time()
-    # end_ctime        = time.ctime()
-    # seconds          = program_end_time - program_begin_time
-    # m, s             = divmod(seconds, 60)
-    # h, m             = divmod(m, 60)
-    # d, h             = divmod(h, 24)
-    # print("\nBegin time: ", begin_ctime)
-    # print("End   time: ", end_ctime, "\n")
-    # print("Time taken: {0: .0f} days, {1: .0f} hours, \
-    #   {2: .0f} minutes, {3: f} seconds.".format(d, h, m, s))
@@ -9,6 +9,16 @@
 
    This program creates the plots for final shear analysis.
 
+   When the pdf was written by ``a08_create_plots.py --engine numpy`` (it
+   exists and is newer than every ps file) there is nothing to do and
+   montage is not run.
+
+   There is one pdf per redshift, with the eight panels as its pages, and
+   not one pdf of all the redshifts: every redshift is a node of
+   pipeline.py with its own pdf in the build cache, so a redshift can be
+   rerun alone, and shear_z0_7.pdf stays the output of a09 for both
+   engines. a08 renders several redshifts in parallel processes.
+
 :Depends: This program depends on following:
     imageMagick command montage
     
@@ -20,36 +30,48 @@
 :Runtime: 2 sec
 
 """
+import glob
 import os,sys
+import shutil
+
+import pipeline
+import runner
+import telemetry
 
 
 def create_pdf(z):
     z0,z1 = str(z).split('.')
-    montage = r'montage *.ps -tile 2x4 -rotate 90 -geometry 1000x1000+20+20  \
-    -title "ellipticity and shear for z = {}"  shear.pdf;'.format(z)
-    
-    command = """
-# cd to plot directory containing ps files
-cd plots/galshear_plots_z{z0:.0f}.{z1:.0f}
+    pwd   = 'plots/galshear_plots_z{:.0f}.{:.0f}'.format(float(z0),float(z1))
+    ofile = 'shear_z{:.0f}_{:.0f}.pdf'.format(float(z0),float(z1))
 
-# convert ps images to pdf
-{montage:s}
+    # convert ps images to pdf (the ps files sorted like the shell glob *.ps)
+    psfiles = sorted(os.path.basename(f) for f in glob.glob(os.path.join(pwd,'*.ps')))
 
-# rename pdf file
-mv shear.pdf shear_z{z0:.0f}_{z1:.0f}.pdf
+    # the multipage pdf of a08 --engine numpy needs no montage
+    pdf = os.path.join(pwd,ofile)
+    if os.path.isfile(pdf) and all(os.path.getmtime(os.path.join(pwd,f)) <= os.path.getmtime(pdf)
+                                   for f in psfiles):
+        print('Up to date : {}'.format(pdf))
+        return
+    montage = ['montage'] + psfiles + ['-tile','2x4','-rotate','90',
+               '-geometry','1000x1000+20+20',
+               '-title','ellipticity and shear for z = {}'.format(z),'shear.pdf']
+    runner.run([montage], cwd=pwd)
 
-# open final pdf file
-open shear_z{z0:.0f}_{z1:.0f}.pdf
-    """.format(z0=float(z0),z1=float(z1),montage=montage)
+    # rename pdf file
+    os.rename(os.path.join(pwd,'shear.pdf'), os.path.join(pwd,ofile))
 
-    cmd = command.strip()
-    os.system(cmd)
+    # open final pdf file
+    if shutil.which('open'):
+        runner.run([['open',ofile]], cwd=pwd)
 
 
 def main():
     """Run main function."""
     z = float(sys.argv[1])
-    create_pdf(z)
+    with telemetry.stage('a09', z, echo=True):
+        create_pdf(z)
+        pipeline.report_files(pipeline.stage_spec('a09',z))
 
 if __name__ == "__main__":
     main()
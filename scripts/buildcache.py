@@ -0,0 +1,180 @@
+#!python
+# -*- coding: utf-8 -*-
+#
+# Date        : Oct 18, 2026
+"""
+.. note::
+
+    This module decides whether a pipeline stage has to run again.
+
+    For every output file it records a fingerprint of what produced it: the
+    sha1 of the input files, the parameters of the stage (cuts, etprofile
+    origin and bins, psrat, engine ...), the imcat tools it runs (path, size
+    and modification time of the binaries, imcat has no version option) and
+    the source file of the stage. It also records the sha1 of the output
+    itself, so outputs that were truncated or edited are not reused.
+
+    The records are kept in a ``.buildcache.json`` file next to the outputs,
+    e.g. galshear/galshear_cat_z0.7/.buildcache.json. Several processes may
+    use the same file (pipeline nodes, a02 --watch, a stage run by hand):
+    save() holds an fcntl lock on ``.buildcache.json.lock`` and applies its
+    changes to the records on disk, so the records of the others are kept.
+
+:Usage: Typical use::
+
+    import buildcache
+    fp = buildcache.fingerprint(inputs=['galshear_cut.cat'], params={'l0': 4},
+                                tools=['fit2Dpolymodel2'], code=__file__)
+    cache = buildcache.BuildCache('galshear/galshear_cat_z0.7/.buildcache.json')
+    if not cache.is_fresh(outputs, fp):
+        ...  # run the stage
+        cache.record(outputs, fp)
+
+"""
+# Imports
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import sys
+import threading
+
+import numpy as np
+
+CACHE_NAME = '.buildcache.json'
+
+_lock = threading.Lock()
+_hashes = {}
+
+
+def file_hash(path):
+    """Return the sha1 of a file, remembered while its size and mtime do not change."""
+    st = os.stat(path)
+    key = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+    with _lock:
+        if key in _hashes:
+            return _hashes[key]
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    digest = h.hexdigest()
+    with _lock:
+        _hashes[key] = digest
+    return digest
+
+
+def tool_versions(tools):
+    """Return tool -> 'path size mtime' of the executables found on the PATH."""
+    versions = {}
+    for tool in tools:
+        path = shutil.which(tool)
+        if path is None:
+            versions[tool] = None
+        else:
+            st = os.stat(path)
+            versions[tool] = '{} {} {}'.format(path, st.st_size, int(st.st_mtime))
+    return versions
+
+
+def fingerprint(inputs=(),params=None,tools=(),code=()):
+    """Return the fingerprint of a stage output.
+
+    Args:
+      inputs (list): input files.
+      params (dict): parameters of the stage, must be JSON serializable.
+      tools (list): external programs run by the stage e.g. ['lc','etprofile']
+      code (list): source files of the stage e.g. [a03_Pgamma_cat.__file__]
+
+    Returns:
+      str: sha1 of all of the above.
+
+    """
+    if isinstance(code, str):
+        code = [code]
+    record = {'inputs': sorted((os.path.normpath(f), file_hash(f)) for f in inputs),
+              'params': params or {},
+              'tools': tool_versions(tools),
+              'code': sorted((os.path.basename(f), file_hash(f)) for f in code),
+              'python': sys.version.split()[0],
+              'numpy': np.__version__}
+    text = json.dumps(record, sort_keys=True, default=str)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+class BuildCache(object):
+    """Fingerprints of the outputs of one directory.
+
+    Args:
+      path (str): the json file e.g. galshear/galshear_cat_z0.7/.buildcache.json
+
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.records = self._load()
+        # records changed since the last save, None for forgotten ones
+        self.changes = {}
+
+    def _load(self):
+        """Return the records of the file, {} if it does not exist."""
+        if not os.path.isfile(self.path):
+            return {}
+        with open(self.path) as f:
+            return json.load(f)
+
+    @classmethod
+    def for_outputs(cls, outputs):
+        """Return the cache kept next to the first output."""
+        return cls(os.path.join(os.path.dirname(outputs[0]) or '.', CACHE_NAME))
+
+    def is_fresh(self, outputs, fp):
+        """Return True if every output exists, unchanged, with fingerprint fp."""
+        for out in outputs:
+            rec = self.records.get(os.path.normpath(out))
+            if rec is None or rec['fingerprint'] != fp or not os.path.isfile(out):
+                return False
+            if file_hash(out) != rec['sha1']:
+                return False
+        return True
+
+    def record(self, outputs, fp, save=True):
+        """Record the fingerprint of freshly written outputs and save the cache."""
+        for out in outputs:
+            key = os.path.normpath(out)
+            self.records[key] = self.changes[key] = {'fingerprint': fp,
+                                                     'sha1': file_hash(out)}
+        if save:
+            self.save()
+
+    def forget(self, outputs, save=True):
+        """Remove the records of outputs, e.g. after a failed run."""
+        for out in outputs:
+            key = os.path.normpath(out)
+            self.records.pop(key, None)
+            self.changes[key] = None
+        if save:
+            self.save()
+
+    def save(self):
+        """Apply the changes to the records on disk and write the cache atomically."""
+        with _lock:
+            # the directory of the outputs may not exist yet (e.g. the plots)
+            dirname = os.path.dirname(self.path)
+            if dirname and not os.path.isdir(dirname):
+                os.makedirs(dirname, exist_ok=True)
+            with open(self.path + '.lock', 'a') as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                records = self._load()
+                for key, rec in self.changes.items():
+                    if rec is None:
+                        records.pop(key, None)
+                    else:
+                        records[key] = rec
+                tmp = self.path + '.part'
+                with open(tmp, 'w') as f:
+                    json.dump(records, f, indent=1, sort_keys=True)
+                os.rename(tmp, self.path)
+            self.records = records
+            self.changes = {}
@@ -0,0 +1,420 @@
+#!python
+# -*- coding: utf-8 -*-
+#
+# Date        : Oct 18, 2026
+"""
+.. note::
+
+    This module reads and writes IMCAT catalogs (.cat files) without running
+    ``lc``. Object items are exposed as NumPy arrays, so later stages can
+    filter and combine catalogs in-process.
+
+    An IMCAT catalog has a text header where every line starts with ``#``.
+    The header holds the file format, history lines, header items and, as the
+    last line, the names of the object items. Vector and matrix items are
+    spread over several columns whose names carry the indices::
+
+        # text       1        1 history: hfindpeaks lsst_z0.7_0.fits -r 0.5 20
+        # number     1        1 psrat 0.3
+        #         x[0]         x[1]           rg         e[0]         e[1]
+               123.5        456.2         1.73        0.012       -0.041
+
+    ``x[2]`` is read as an array of shape (nobjects, 2), ``Pg[2][2]`` as an
+    array of shape (nobjects, 2, 2) and so on.
+
+    Binary catalogs (``lc -b``) have the same text header followed by the
+    object items as native float64 rows; the first number of the format
+    line of the header is 1 for them and 0 for ascii catalogs. They are memory mapped, and the
+    columns are views into the mapping, so nothing is copied until it is used.
+
+:Usage: Typical use::
+
+    import catalog
+    cat = catalog.read_cat('galshear_cut.cat')
+    good = cat['rg'] > 2.9
+    catalog.write_cat('galshear_big_rg.cat', cat.select(good))
+
+"""
+# Imports
+import collections
+import itertools
+import os
+import re
+
+import numpy as np
+
+ASCII, BINARY = 0, 1
+
+# object item name with optional indices, e.g. x[0], Pg[1][0]
+_ITEM_RE = re.compile(r'^([^\[\]]+)((?:\[\d+\])*)$')
+
+
+class Catalog(object):
+    """Object items, header items and history of an IMCAT catalog.
+
+    Args:
+      columns (dict): object item name -> array of shape (nobjects,) + dims.
+      header (dict): header item name -> value (numbers are stored as arrays,
+        text items as strings).
+      history (list): history lines, without the leading ``history:``.
+
+    """
+
+    def __init__(self, columns=None, header=None, history=None):
+        self.columns = collections.OrderedDict(columns or [])
+        self.header  = collections.OrderedDict(header or [])
+        self.history = list(history or [])
+
+    def __len__(self):
+        for col in self.columns.values():
+            return len(col)
+        return 0
+
+    def __contains__(self, name):
+        return name in self.columns
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def __setitem__(self, name, value):
+        value = np.asarray(value, dtype=float)
+        if self.columns and len(value) != len(self):
+            raise ValueError('Column {} has {} rows, catalog has {}'.format(
+                             name, len(value), len(self)))
+        self.columns[name] = value
+
+    def keys(self):
+        return list(self.columns.keys())
+
+    def select(self, mask):
+        """Return a new catalog with the objects where mask is True (or the
+        objects at the given indices)."""
+        columns = [(k, v[mask]) for k, v in self.columns.items()]
+        return Catalog(columns, self.header, self.history)
+
+    def copy(self):
+        """Return a copy of the catalog with its columns loaded in memory."""
+        columns = [(k, np.array(v)) for k, v in self.columns.items()]
+        return Catalog(columns, self.header, self.history)
+
+
+def _column_layout(names):
+    """Group the column names of the header into object items.
+
+    Returns:
+      list: (name, shape, first column, number of columns) for every item.
+
+    """
+    items = collections.OrderedDict()
+    for icol, label in enumerate(names):
+        match = _ITEM_RE.match(label)
+        if match is None:
+            raise ValueError('Bad object item name in catalog header: {}'.format(label))
+        name, index = match.group(1), match.group(2)
+        index = tuple(int(k) for k in re.findall(r'\d+', index))
+        if name not in items:
+            items[name] = [icol, 0, index]
+        else:
+            first = items[name]
+            if first[0] + first[1] != icol or len(index) != len(first[2]):
+                raise ValueError('Columns of object item {} are not contiguous'.format(name))
+            first[2] = tuple(max(a, b) for a, b in zip(first[2], index))
+        items[name][1] += 1
+
+    layout = []
+    for name, (icol, ncols, index) in items.items():
+        shape = tuple(k + 1 for k in index)
+        if int(np.prod(shape)) != ncols:
+            raise ValueError('Object item {} has {} columns for shape {}'.format(
+                             name, ncols, shape))
+        layout.append((name, shape, icol, ncols))
+    return layout
+
+
+def _column_names(name, shape):
+    """Return the header names x[0], x[1], ... for an item of given shape."""
+    if not shape:
+        return [name]
+    return [name + ''.join('[{}]'.format(k) for k in index)
+            for index in np.ndindex(*shape)]
+
+
+def _parse_header_line(line, cat):
+    """Store one header line (without the leading #) in cat.
+
+    Returns:
+      int: the file type (ASCII or BINARY) of a format line, None otherwise.
+
+    """
+    tokens = line.split()
+    if not tokens:
+        return
+    if tokens[-1] == 'format':
+        return BINARY if int(tokens[0]) else ASCII
+    if tokens[0] not in ('text', 'number'):
+        return
+    ndim = int(tokens[1])
+    name = tokens[2 + ndim].rstrip(':')
+    if tokens[0] == 'text':
+        value = line.split(tokens[2 + ndim], 1)[1].strip()
+        if name == 'history':
+            cat.history.append(value)
+        else:
+            cat.header[name] = value
+    else:
+        dims = tuple(int(d) for d in tokens[2:2 + ndim])
+        values = np.array([float(v) for v in tokens[3 + ndim:]])
+        cat.header[name] = values.reshape(dims) if values.size > 1 else values
+
+
+def read_header(path):
+    """Read the header of an IMCAT catalog.
+
+    Args:
+      path (str): catalog file e.g. galshear/galshear_cat_z0.7/galshear_cut.cat
+
+    Returns:
+      tuple: (cat, layout, offset, filetype) where cat is an empty Catalog
+      holding the header items and history, layout is the list of object
+      items from _column_layout, offset is the byte offset of the data and
+      filetype is ASCII or BINARY, from the format line of the header
+      (ASCII without one).
+
+    """
+    cat = Catalog()
+    names = None
+    offset = 0
+    filetype = ASCII
+    with open(path, 'rb') as f:
+        while True:
+            line = f.readline()
+            if not line.startswith(b'#'):
+                break
+            offset += len(line)
+            text = line[1:].decode('ascii', 'replace').rstrip('\r\n')
+            if names is not None:
+                kind = _parse_header_line(names, cat)
+                if kind is not None:
+                    filetype = kind
+            names = text
+
+    if names is None:
+        raise ValueError('{} is not an IMCAT catalog (no header)'.format(path))
+    layout = _column_layout(names.split())
+    return cat, layout, offset, filetype
+
+
+def _has_data(path, offset):
+    """Return True if the ascii catalog has data after the header."""
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        for block in iter(lambda: f.read(1 << 16), b''):
+            if block.strip():
+                return True
+    return False
+
+
+def _split_columns(cat, layout, data):
+    """Store the object items of the 2-D array data as columns of cat."""
+    nrows = data.shape[0]
+    for name, shape, icol, ncols in layout:
+        if shape:
+            cat.columns[name] = data[:, icol:icol + ncols].reshape((nrows,) + shape)
+        else:
+            cat.columns[name] = data[:, icol]
+    return cat
+
+
+def read_cat(path, mmap=True):
+    """Read an IMCAT catalog.
+
+    Args:
+      path (str): catalog file e.g. galshear/galshear_cat_z0.7/galshear_cut.cat
+      mmap (bool): memory map binary catalogs instead of reading them.
+
+    Returns:
+      Catalog: the catalog with every object item as a NumPy array.
+
+    """
+    cat, layout, offset, filetype = read_header(path)
+    ncols = sum(item[3] for item in layout)
+
+    if filetype == BINARY:
+        nrows = (os.path.getsize(path) - offset) // (8 * ncols)
+        if mmap and nrows > 0:
+            data = np.memmap(path, dtype=np.float64, mode='r', offset=offset,
+                             shape=(nrows, ncols))
+        else:
+            with open(path, 'rb') as f:
+                f.seek(offset)
+                data = np.fromfile(f, dtype=np.float64, count=nrows * ncols)
+            data = data.reshape(nrows, ncols)
+    elif not _has_data(path, offset):
+        data = np.empty((0, ncols))
+    else:
+        data = np.loadtxt(path, comments='#', ndmin=2)
+        if data.shape[1] != ncols:
+            raise ValueError('{} has {} data columns, header names {}'.format(
+                             path, data.shape[1], ncols))
+
+    return _split_columns(cat, layout, data)
+
+
+def iter_cat(path, chunksize=100000):
+    """Read an IMCAT catalog in chunks of at most chunksize objects.
+
+    Only one chunk is held in memory at a time, whatever the size of the file.
+
+    Args:
+      path (str): catalog file.
+      chunksize (int): number of objects per chunk.
+
+    Yields:
+      Catalog: consecutive chunks of the catalog.
+
+    """
+    cat, layout, offset, filetype = read_header(path)
+    ncols = sum(item[3] for item in layout)
+
+    def chunk(data):
+        return _split_columns(Catalog(header=cat.header, history=cat.history),
+                              layout, data)
+
+    if filetype == BINARY:
+        nrows = (os.path.getsize(path) - offset) // (8 * ncols)
+        if nrows == 0:
+            return
+        data = np.memmap(path, dtype=np.float64, mode='r', offset=offset,
+                         shape=(nrows, ncols))
+        for start in range(0, nrows, chunksize):
+            yield chunk(data[start:start + chunksize])
+        return
+
+    with open(path) as f:
+        lines = (line for line in f if not line.startswith('#') and line.strip())
+        while True:
+            block = list(itertools.islice(lines, chunksize))
+            if not block:
+                break
+            yield chunk(np.loadtxt(block, ndmin=2).reshape(len(block), ncols))
+
+
+def _header_lines(cat, layout, filetype):
+    """Return the header lines of cat as a list of strings."""
+    lines = ['# {:>10d} {:>10d} format'.format(filetype, len(layout))]
+    for h in cat.history:
+        lines.append('# text {:>6d} {:>8d} history: {}'.format(1, 1, h))
+    for name, value in cat.header.items():
+        if isinstance(value, str):
+            lines.append('# text {:>6d} {:>8d} {}: {}'.format(1, 1, name, value))
+        else:
+            value = np.atleast_1d(np.asarray(value, dtype=float))
+            dims = ' '.join('{:>8d}'.format(d) for d in value.shape)
+            vals = ' '.join(repr(float(v)) for v in value.ravel())
+            lines.append('# number {:>4d} {} {} {}'.format(value.ndim, dims, name, vals))
+    names = []
+    for name, shape, icol, ncols in layout:
+        names.extend(_column_names(name, shape))
+    lines.append('#' + ' '.join('{:>16s}'.format(n) for n in names))
+    return lines
+
+
+def _flatten(cat):
+    """Return the layout and the 2-D data array of the object items of cat."""
+    nrows = len(cat)
+    layout, blocks, icol = [], [], 0
+    for name, value in cat.columns.items():
+        value = np.asarray(value, dtype=float)
+        shape = value.shape[1:]
+        ncols = int(np.prod(shape)) if shape else 1
+        layout.append((name, shape, icol, ncols))
+        blocks.append(value.reshape(nrows, ncols))
+        icol += ncols
+    data = np.hstack(blocks) if blocks else np.empty((0, 0))
+    return layout, data
+
+
+def write_cat(path, cat, binary=False, fmt='%16.10g'):
+    """Write an IMCAT catalog.
+
+    The file is written next to path and renamed when complete, so readers
+    never see a partial catalog.
+
+    Args:
+      path (str): output catalog file.
+      cat (Catalog): catalog to write.
+      binary (bool): write float64 rows (like ``lc -b``) instead of text.
+      fmt (str): number format for ascii catalogs.
+
+    """
+    writer = CatalogWriter(path, binary=binary, fmt=fmt)
+    writer.write(cat)
+    writer.close()
+
+
+class CatalogWriter(object):
+    """Write an IMCAT catalog chunk by chunk.
+
+    The header is taken from the first chunk, the following chunks must have
+    the same object items. The file is renamed to path by close().
+
+    Args:
+      path (str): output catalog file.
+      binary (bool): write float64 rows (like ``lc -b``) instead of text.
+      fmt (str): number format for ascii catalogs.
+
+    """
+
+    def __init__(self, path, binary=False, fmt='%16.10g'):
+        self.path   = path
+        self.binary = binary
+        self.fmt    = fmt
+        self.nrows  = 0
+        self._names = None
+        self._file  = open(path + '.part', 'wb')
+
+    def write(self, cat):
+        """Append the objects of cat to the catalog."""
+        layout, data = _flatten(cat)
+        if self._names is None:
+            self._names = [item[:2] for item in layout]
+            filetype = BINARY if self.binary else ASCII
+            header = '\n'.join(_header_lines(cat, layout, filetype)) + '\n'
+            self._file.write(header.encode('ascii'))
+        elif [item[:2] for item in layout] != self._names:
+            raise ValueError('Object items of {} do not match the first chunk'.format(self.path))
+
+        if self.binary:
+            np.ascontiguousarray(data, dtype=np.float64).tofile(self._file)
+        elif len(data):
+            np.savetxt(self._file, data, fmt=self.fmt, delimiter=' ')
+        self.nrows += len(data)
+
+    def close(self):
+        """Finish the catalog and move it to its final name."""
+        self._file.close()
+        os.rename(self.path + '.part', self.path)
+
+    def abort(self):
+        """Remove the partial catalog."""
+        self._file.close()
+        os.remove(self.path + '.part')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def concat(cats):
+    """Concatenate catalogs with the same object items (like catcats)."""
+    cats = list(cats)
+    if not cats:
+        return Catalog()
+    columns = [(k, np.concatenate([c[k] for c in cats]))
+               for k in cats[0].keys()]
+    return Catalog(columns, cats[0].header, cats[0].history)
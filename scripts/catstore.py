@@ -0,0 +1,200 @@
+#!python
+# -*- coding: utf-8 -*-
+#
+# Date        : Oct 18, 2026
+"""
+.. note::
+
+    This module keeps all the galaxy catalogs of a redshift in one columnar
+    file, instead of one galshear_z{z}_{i}.cat file per galaxy file.
+
+    The store is a sequence of blocks, one per galaxy file. Each block is a
+    small JSON header (galaxy file index, number of objects, object items
+    with their shapes, fingerprint) followed by the object items one after
+    the other as float64 arrays. The store is only ever appended to: a block
+    for a galaxy file that is already in the store supersedes the old one,
+    and an incomplete block at the end (an interrupted run) is ignored and
+    overwritten by the next append.
+
+    Reading memory maps the file, so the columns of a block are views that
+    are only read from disk when used.
+
+    Layout::
+
+        GSTORE1\\n
+        <8 byte little endian header length> <json header> <column data>
+        <8 byte little endian header length> <json header> <column data>
+        ...
+
+:Usage: Typical use::
+
+    import catstore
+    store = catstore.CatStore('galshear/galshear_cat_z0.7/galshear_z0.7.store')
+    store.append(cat, gfile=3)
+    for cat in store.chunks():        # one catalog per galaxy file
+        ...
+    cat = store.read(['x','rg'])      # all galaxy files at once
+
+"""
+# Imports
+import json
+import os
+import struct
+import threading
+
+import numpy as np
+
+import catalog
+
+MAGIC = b'GSTORE1\n'
+_LEN  = struct.Struct('<Q')
+
+
+def store_path(z,name=None):
+    """Return the store of the galaxy catalogs (or of name e.g. 'galshear_cut')."""
+    pwd = 'galshear/galshear_cat_z{}'.format(z)
+    if name is None:
+        name = 'galshear_z{}'.format(z)
+    return os.path.join(pwd, name + '.store')
+
+
+class CatStore(object):
+    """Columnar store of the catalogs of many galaxy files.
+
+    Args:
+      path (str): store file e.g. galshear/galshear_cat_z0.7/galshear_z0.7.store
+
+    """
+
+    def __init__(self, path):
+        self.path  = path
+        self._lock = threading.Lock()
+        self.blocks = []
+        self._end = len(MAGIC)
+        if os.path.isfile(path):
+            self._scan()
+
+    @classmethod
+    def create(cls, path):
+        """Return a new empty store, replacing path if it exists."""
+        with open(path, 'wb') as f:
+            f.write(MAGIC)
+        return cls(path)
+
+    def _scan(self):
+        """Read the block headers and find the end of the last complete block."""
+        size = os.path.getsize(self.path)
+        with open(self.path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError('{} is not a catalog store'.format(self.path))
+            pos = len(MAGIC)
+            while pos + _LEN.size <= size:
+                f.seek(pos)
+                hlen = _LEN.unpack(f.read(_LEN.size))[0]
+                if pos + _LEN.size + hlen > size:
+                    break
+                header = json.loads(f.read(hlen).decode('utf-8'))
+                data_start = pos + _LEN.size + hlen
+                data_end = data_start + 8 * header['nrows'] * sum(
+                           int(np.prod(shape)) for name, shape in header['columns'])
+                if data_end > size:
+                    break
+                header['offset'] = data_start
+                self.blocks.append(header)
+                pos = data_end
+        self._end = pos
+
+    def gfiles(self):
+        """Return galaxy file index -> header of its current block."""
+        return dict((b['gfile'], b) for b in self.blocks)
+
+    def fingerprints(self):
+        """Return galaxy file index -> fingerprint of its current block."""
+        return dict((g, b.get('fingerprint')) for g, b in self.gfiles().items())
+
+    def append(self, cat, gfile, fingerprint=None):
+        """Append the catalog of galaxy file gfile as a new block.
+
+        A gfile column of cat is not stored, it is rebuilt on reading.
+        """
+        columns, arrays = [], []
+        for name, value in cat.columns.items():
+            if name == 'gfile':
+                continue
+            value = np.ascontiguousarray(value, dtype=np.float64)
+            columns.append([name, list(value.shape[1:])])
+            arrays.append(value)
+        header = {'gfile': int(gfile), 'nrows': len(cat), 'columns': columns,
+                  'history': cat.history, 'fingerprint': fingerprint}
+        text = json.dumps(header).encode('utf-8')
+
+        with self._lock:
+            mode = 'r+b' if os.path.isfile(self.path) else 'wb'
+            with open(self.path, mode) as f:
+                if mode == 'wb':
+                    f.write(MAGIC)
+                f.seek(self._end)
+                f.truncate()
+                f.write(_LEN.pack(len(text)))
+                f.write(text)
+                for a in arrays:
+                    a.tofile(f)
+                f.flush()
+                os.fsync(f.fileno())
+                header['offset'] = self._end + _LEN.size + len(text)
+                self._end = f.tell()
+            self.blocks.append(header)
+
+    def _block_catalog(self, block, mm, names=None):
+        """Return the catalog of one block, its columns are views of mm."""
+        cat = catalog.Catalog(history=block.get('history'))
+        pos = block['offset']
+        n = block['nrows']
+        for name, shape in block['columns']:
+            size = n * int(np.prod(shape))
+            if names is None or name in names:
+                cat.columns[name] = np.ndarray((n,) + tuple(shape), dtype=np.float64,
+                                               buffer=mm, offset=pos)
+            pos += 8 * size
+        cat.columns['gfile'] = np.full(n, block['gfile'], dtype=float)
+        return cat
+
+    def chunks(self, names=None, gfiles=None):
+        """Yield the catalog of every galaxy file, in order of galaxy index.
+
+        Args:
+          names (list): object items to read (default all).
+          gfiles (list): galaxy file indices to read (default all).
+
+        """
+        current = self.gfiles()
+        if not current:
+            return
+        mm = np.memmap(self.path, dtype=np.uint8, mode='r')
+        for g in sorted(current):
+            if gfiles is None or g in gfiles:
+                yield self._block_catalog(current[g], mm, names)
+
+    def read(self, names=None, gfiles=None):
+        """Return all the galaxy files as a single catalog."""
+        return catalog.concat(self.chunks(names, gfiles))
+
+    def export_cat(self, gfile, path):
+        """Write the catalog of one galaxy file as an IMCAT .cat file."""
+        for cat in self.chunks(gfiles=[gfile]):
+            del cat.columns['gfile']
+            catalog.write_cat(path, cat)
+
+    def compact(self):
+        """Rewrite the store without the superseded blocks."""
+        if len(self.blocks) == len(self.gfiles()):
+            return
+        current = self.gfiles()
+        tmp = CatStore.create(self.path + '.part')
+        mm = np.memmap(self.path, dtype=np.uint8, mode='r')
+        for g in sorted(current):
+            # a galaxy file without objects keeps its empty block
+            tmp.append(self._block_catalog(current[g], mm), g, current[g].get('fingerprint'))
+        os.rename(tmp.path, self.path)
+        self.blocks = tmp.blocks
+        self._end = tmp._end
@@ -0,0 +1,249 @@
+#!python
+# -*- coding: utf-8 -*-
+#
+# Date        : Oct 18, 2026
+"""
+.. note::
+
+    This module computes tangential alignment profiles in-process, like the
+    IMCAT program ``etprofile``, for several ellipticity vectors at once.
+
+    The radius and position angle of every object about the origin are
+    computed once. Each requested 2-vector (e.g. cg_avg, mg_avg, ce_avg and
+    me_avg) is rotated to its tangential component::
+
+      et = -(e[0] cos(2 phi) + e[1] sin(2 phi))
+
+    and summed in logarithmic radial bins with ``np.bincount``.
+
+    The output columns are those of etprofile::
+
+      bin   r   ngals   et  eterror   rkappa   kappa  kappaerror  nu
+
+    r is the geometric centre of the bin, eterror is the standard deviation
+    of et over sqrt(ngals). kappa is the mean convergence inside rkappa (the
+    inner edge of the bin) minus that inside rmax, integrated from
+    d kappabar / d ln r = -2 et over the ln r width of the bins (the last
+    bin is cut at rmax), and nu = kappa / kappaerror.
+
+    ProfileAccumulator keeps the bin_sums of several profiles for every
+    galaxy file. A file is folded in or subtracted out at the cost of its
+    own objects, so a stacked profile can be updated while the galaxy files
+    are still being made, or when files are added or removed later (see
+    galstats.py).
+
+:etprofile: The same defaults as a05::
+
+    etprofile -o 1700 1700 -d 0.2 -r 100 1200 -e cg_avg
+
+"""
+# Imports
+import os
+
+import numpy as np
+
+# etprofile options used in a05
+ORIGIN = (1700.0, 1700.0)
+DLNR   = 0.2
+RMIN   = 100.0
+RMAX   = 1200.0
+
+COLUMNS = ['bin','r','ngals','et','eterror','rkappa','kappa','kappaerror','nu']
+
+
+def bin_edges(dlnr=DLNR,rmin=RMIN,rmax=RMAX):
+    """Return the edges of the logarithmic radial bins from rmin to rmax.
+
+    The last bin is cut at rmax when ln(rmax/rmin) is not a multiple of dlnr.
+    """
+    nbins = int(np.ceil(np.log(rmax / rmin) / dlnr - 1e-9))
+    edges = rmin * np.exp(dlnr * np.arange(nbins + 1))
+    edges[-1] = min(edges[-1], rmax)
+    return edges
+
+
+def geometry(x,origin=ORIGIN,dlnr=DLNR,rmin=RMIN,rmax=RMAX):
+    """Return the radial bin and the rotation of every object.
+
+    Args:
+      x (array): positions, shape (n,2).
+      origin (tuple): centre of the profile (io, jo).
+      dlnr (float): log bin size.
+      rmin, rmax (float): min and max radii.
+
+    Returns:
+      tuple: (ibin, cos2phi, sin2phi). ibin is -1 for objects outside
+      [rmin, rmax).
+
+    """
+    dx = x[:,0] - origin[0]
+    dy = x[:,1] - origin[1]
+    r2 = dx*dx + dy*dy
+    r  = np.sqrt(r2)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cos2phi = np.where(r2 > 0, (dx*dx - dy*dy) / r2, 0.0)
+        sin2phi = np.where(r2 > 0, 2*dx*dy / r2, 0.0)
+        ibin = np.floor(np.log(r / rmin) / dlnr)
+
+    nbins = len(bin_edges(dlnr,rmin,rmax)) - 1
+    inside = (r >= rmin) & (r < rmax)
+    ibin = np.where(inside, ibin, -1).astype(int)
+    ibin[ibin >= nbins] = -1
+    return ibin, cos2phi, sin2phi
+
+
+def tangential(e,cos2phi,sin2phi):
+    """Return the tangential component of the ellipticities e of shape (n,2)."""
+    return -(e[:,0]*cos2phi + e[:,1]*sin2phi)
+
+
+def bin_sums(ibin,et,nbins):
+    """Return the per bin count, sum of et and sum of et**2.
+
+    Objects with ibin == -1 are ignored. These sums are sufficient statistics
+    of the profile: sums of disjoint samples add up.
+
+    Returns:
+      array: shape (3, nbins) with rows ngals, sum(et), sum(et**2).
+
+    """
+    good = ibin >= 0
+    b  = ibin[good]
+    et = et[good]
+    return np.array([np.bincount(b, minlength=nbins),
+                     np.bincount(b, weights=et, minlength=nbins),
+                     np.bincount(b, weights=et*et, minlength=nbins)], dtype=float)
+
+
+def profile_from_sums(sums,dlnr=DLNR,rmin=RMIN,rmax=RMAX):
+    """Return the etprofile columns from the output of bin_sums.
+
+    Returns:
+      array: shape (nbins, 9) with the columns of COLUMNS.
+
+    """
+    ngals, s, s2 = sums
+    with np.errstate(divide='ignore', invalid='ignore'):
+        et  = np.where(ngals > 0, s / ngals, 0.0)
+        var = np.where(ngals > 0, np.maximum(s2 / ngals - et*et, 0.0), 0.0)
+        err = np.where(ngals > 0, np.sqrt(var / ngals), 0.0)
+    return profile_columns(ngals,et,err,dlnr,rmin,rmax)
+
+
+def profile_columns(ngals,et,err,dlnr=DLNR,rmin=RMIN,rmax=RMAX):
+    """Return the etprofile columns of the per bin ngals, et and eterror.
+
+    Returns:
+      array: shape (nbins, 9) with the columns of COLUMNS.
+
+    """
+    edges = bin_edges(dlnr,rmin,rmax)
+    nbins = len(edges) - 1
+
+    # width of every bin in ln r, the last one is cut at rmax
+    width = np.diff(np.log(edges))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # kappabar(<rkappa) - kappabar(<rmax) = 2 int et dlnr
+        kappa  = 2 * np.cumsum((width*et)[::-1])[::-1]
+        kerror = 2 * np.sqrt(np.cumsum(((width*err)**2)[::-1])[::-1])
+        nu     = np.where(kerror > 0, kappa / kerror, 0.0)
+
+    r = np.sqrt(edges[:-1] * edges[1:])
+    return np.column_stack([np.arange(nbins), r, ngals, et, err,
+                            edges[:-1], kappa, kerror, nu])
+
+
+def etprofiles(x,es,origin=ORIGIN,dlnr=DLNR,rmin=RMIN,rmax=RMAX):
+    """Compute the tangential profiles of several ellipticity vectors at once.
+
+    Args:
+      x (array): positions, shape (n,2).
+      es (dict): name -> ellipticity 2-vectors of shape (n,2).
+      origin, dlnr, rmin, rmax: etprofile options -o, -d and -r.
+
+    Returns:
+      dict: name -> profile array of shape (nbins, 9), see COLUMNS.
+
+    """
+    ibin, cos2phi, sin2phi = geometry(x,origin,dlnr,rmin,rmax)
+    nbins = len(bin_edges(dlnr,rmin,rmax)) - 1
+    profiles = {}
+    for name, e in es.items():
+        sums = bin_sums(ibin, tangential(e,cos2phi,sin2phi), nbins)
+        profiles[name] = profile_from_sums(sums,dlnr,rmin,rmax)
+    return profiles
+
+
+def write_profile(path,profile):
+    """Write a profile as whitespace separated columns (like ``lc -O``)."""
+    np.savetxt(path, profile, fmt='%.10g', header='  '.join(COLUMNS))
+
+
+class ProfileAccumulator(object):
+    """Running bin_sums of several profiles, kept per galaxy file.
+
+    The sums of every galaxy file are kept apart, so a file can be removed
+    (or removed and added again when it changed) by subtracting its sums,
+    without going back to the objects of the other files.
+
+    Args:
+      names (list): names of the ellipticity vectors e.g. ['cg_avg','ce_avg'].
+      origin, dlnr, rmin, rmax: etprofile options -o, -d and -r.
+
+    """
+
+    def __init__(self,names,origin=ORIGIN,dlnr=DLNR,rmin=RMIN,rmax=RMAX):
+        self.names   = list(names)
+        self.options = (tuple(float(o) for o in origin), float(dlnr), float(rmin), float(rmax))
+        self.nbins   = len(bin_edges(dlnr,rmin,rmax)) - 1
+        self.sums    = dict((name, np.zeros((3,self.nbins))) for name in self.names)
+        self.files   = {}
+
+    def add(self,gfile,x,es):
+        """Fold the objects of galaxy file gfile, at positions x with ellipticities es."""
+        ibin, cos2phi, sin2phi = geometry(x,*self.options)
+        sums = np.array([bin_sums(ibin, tangential(es[name],cos2phi,sin2phi), self.nbins)
+                         for name in self.names])
+        self.add_sums(gfile,sums)
+
+    def remove(self,gfile):
+        """Subtract the sums of galaxy file gfile."""
+        sums = self.files.pop(gfile)
+        for name, s in zip(self.names,sums):
+            self.sums[name] -= s
+
+    def add_sums(self,gfile,sums):
+        """Fold the bin_sums of galaxy file gfile, shape (len(names), 3, nbins)."""
+        if gfile in self.files:
+            raise ValueError('galaxy file {} is already in the profile'.format(gfile))
+        self.files[gfile] = sums
+        for name, s in zip(self.names,sums):
+            self.sums[name] += s
+
+    def profiles(self):
+        """Return name -> profile array of the files added so far, see profile_from_sums."""
+        origin, dlnr, rmin, rmax = self.options
+        return dict((name, profile_from_sums(self.sums[name],dlnr,rmin,rmax))
+                    for name in self.names)
+
+    def save(self,path):
+        """Write the sums of every galaxy file to an npz file (atomically)."""
+        files = sorted(self.files)
+        tmp = path + '.part'
+        with open(tmp, 'wb') as f:
+            np.savez(f, names=np.array(self.names), options=np.hstack(self.options),
+                     files=np.array(files, dtype=int),
+                     sums=np.array([self.files[i] for i in files]).reshape(
+                          len(files), len(self.names), 3, self.nbins))
+        os.rename(tmp, path)
+
+    @classmethod
+    def load(cls,path):
+        """Return the accumulator saved in path."""
+        with np.load(path) as data:
+            o = data['options']
+            acc = cls([str(n) for n in data['names']], o[:2], o[2], o[3], o[4])
+            for i, sums in zip(data['files'], data['sums']):
+                acc.add_sums(int(i), sums.copy())
+        return acc
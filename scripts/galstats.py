@@ -0,0 +1,388 @@
+#!python
+# -*- coding: utf-8 -*-
+#
+# Date        : Oct 18, 2026
+"""
+.. note::
+
+    This module keeps, for every galaxy catalog of a02, the sums that a03,
+    a04 and a05 need, so that adding or removing galaxy files only costs
+    the objects of those files instead of catcats, the cut, the eight fits,
+    the models and the four etprofile passes over the whole sample.
+
+    Every galaxy file is cut like galshear_cut.cat (a03.cut_mask) and gives:
+
+    1. the normal equations of the eight P_gamma fits of a03
+       (polymodel.normal_equations: A^T A, A^T y and y^T y). Their sums over
+       the files give the same coefficients and rms as create_pars_numpy.
+
+    2. the bin_sums of the ellip profiles ce_avg and me_avg of a05, for the
+       objects that also pass the dx and mag cut of a04.
+
+    3. the per bin responsivity moments of the same objects::
+
+         resp[0] = sum cos^2(2 phi) A(rg, e[0])
+         resp[1] = sum sin^2(2 phi) A(rg, e[1])
+
+       where A is the design row of polymodel (x = (rg, e[k]) like a04).
+       For a model with coefficients a the sum of its P_gamma over a bin is
+       resp[0] . a0 + resp[1] . a1, whatever the coefficients are.
+
+    The shear profiles are then the ensemble estimator of every bin::
+
+      gt = sum e_t / sum (P0 cos^2(2 phi) + P1 sin^2(2 phi))
+
+    with e_t and P the averages of x and its rotated twin x9, and P the
+    fitted models of all the files. It follows from e[k] = P[k][k] g[k]
+    for a tangential shear. It is not the mean of the per object
+    e[k] / P[k][k] of a04 and a05, which cannot be updated a file at a time
+    when the models change; the two agree within the errors. The ellip
+    profiles and the par files are the same as those of a03 and a05.
+
+    The sums of every file are kept apart in galshear_sums.npz with the
+    size and modification time of its catalog. A changed catalog is
+    subtracted and added again, a missing one is subtracted.
+
+    Because the shear estimator is not that of a04 and a05, every output
+    has the suffix _running (running_name) and the products of a03 and a05,
+    read by a06 and lensfit.py, are never overwritten.
+
+:Depends: galshear/galshear_cat_z{z}/galshear_z{z}_*.cat
+
+:Outputs: In galshear/galshear_cat_z{z}: galshear_sums.npz, the 8 par files
+  of a03 and the 4 dat files of a05 with the suffix _running e.g.
+  galshear_cpg0_running.par, color_galshear_shear_running.dat
+
+:Usage: Typical use::
+
+    python galstats.py 0.7
+    python galstats.py 0.7 --converged
+    python galstats.py 0.7 --rebuild
+
+"""
+# Imports
+import argparse
+import os
+
+import numpy as np
+
+import a03_Pgamma_cat as a03
+import a04_fitted_Pgamma as a04
+import a05_etprofile_cm_shear_ellip as a05
+import catalog
+import etprofile
+import polymodel
+import telemetry
+
+# P_gamma models of a03, in the order of create_pars_numpy
+MODELS = [(x,k) for k in [0,1] for x in ['c','c9','m','m9']]
+
+# polynomial orders of the P_gamma models in rg and e
+L0 = 4
+L1 = 1
+
+# sums of every galaxy file, next to the galaxy catalogs
+SUMS_NAME = 'galshear_sums.npz'
+
+# profiles summed per file, the shear ones are made from them
+ELLIP = ['ce_avg','me_avg']
+
+FIELDS = ['nfit','AtA','Aty','yty','resp']
+
+# second component of x of the models, as in a04 fitted_shear_numpy
+ENAME = 'e'
+
+# added to the names of the outputs, which differ from those of a03 and a05
+RUNNING_SUFFIX = '_running'
+
+
+def running_name(ofile):
+    """Return the name of the running version of an output e.g. color_galshear_shear_running.dat"""
+    base, ext = os.path.splitext(ofile)
+    return base + RUNNING_SUFFIX + ext
+
+
+def shear_mask(cat):
+    """Return the dx and mag cut of a04 (galshear_shear.cat)."""
+    dx = np.sqrt(np.einsum('ni,ni->n', cat['dx'], cat['dx']))
+    return (dx < a04.DX_MAX) & (cat['mag'] < a04.MAG_MAX)
+
+
+def file_sums(cat,l0=L0,l1=L1,converged=False,options=None):
+    """Return the sums of one galaxy catalog of a02.
+
+    Args:
+      cat (catalog.Catalog): galaxy catalog, before the cut.
+      l0, l1 (int): polynomial orders of the P_gamma models.
+      converged (bool): cut like ``a03_Pgamma_cat.py --converged``.
+      options (tuple): etprofile (origin, dlnr, rmin, rmax).
+
+    Returns:
+      tuple: (stats, profile) where stats has the arrays of FIELDS and
+      profile the bin_sums of ELLIP, shape (2, 3, nbins).
+
+    """
+    origin, dlnr, rmin, rmax = options or (etprofile.ORIGIN, etprofile.DLNR,
+                                           etprofile.RMIN, etprofile.RMAX)
+    nbins = len(etprofile.bin_edges(dlnr,rmin,rmax)) - 1
+    cat = cat.select(a03.cut_mask(cat,converged))
+
+    # a03: the eight fits share the powers of rg
+    powers = polymodel.rg_powers(cat['rg'],l0)
+    x1 = np.array([cat[x+'e'][:,k] for x,k in MODELS]).reshape(len(MODELS),len(cat))
+    y  = np.array([cat[x+'Pg'][:,k,k] for x,k in MODELS]).reshape(len(MODELS),len(cat))
+    AtA, Aty = polymodel.normal_equations(polymodel.design(cat['rg'],x1,l0,l1,powers),y)
+    stats = {'nfit': np.array(float(len(cat))), 'AtA': AtA, 'Aty': Aty,
+             'yty': np.einsum('kn,kn->k', y, y)}
+
+    # a04 and a05: the objects of galshear_shear.cat inside the bins
+    mask = shear_mask(cat)
+    x, rg, e, powers = cat['x'][mask], cat['rg'][mask], cat[ENAME][mask], powers[mask]
+    ibin, cos2phi, sin2phi = etprofile.geometry(x,origin,dlnr,rmin,rmax)
+    profile = np.array([etprofile.bin_sums(ibin, etprofile.tangential(
+                        0.5 * (cat[p+'e'][mask] + cat[p+'9e'][mask]),cos2phi,sin2phi), nbins)
+                        for p in ['c','m']])
+
+    good  = ibin >= 0
+    nt    = (l0 + 1) * (l1 + 1)
+    index = (ibin[good,None] * nt + np.arange(nt)).ravel()
+    resp  = np.zeros((2,nbins,nt))
+    for k, w in enumerate([cos2phi*cos2phi, sin2phi*sin2phi]):
+        A = polymodel.design(rg[good],e[good,k],l0,l1,powers[good])
+        resp[k] = np.bincount(index, weights=(w[good,None] * A).ravel(),
+                              minlength=nbins*nt).reshape(nbins,nt)
+    stats['resp'] = resp
+    return stats, profile
+
+
+class GalaxySums(object):
+    """Sums of a03, a04 and a05 for every galaxy file, see the module notes.
+
+    Args:
+      l0, l1 (int): polynomial orders of the P_gamma models.
+      converged (bool): cut like ``a03_Pgamma_cat.py --converged``.
+      origin, dlnr, rmin, rmax: etprofile options -o, -d and -r.
+
+    """
+
+    def __init__(self,l0=L0,l1=L1,converged=False,origin=etprofile.ORIGIN,
+                 dlnr=etprofile.DLNR,rmin=etprofile.RMIN,rmax=etprofile.RMAX):
+        self.l0, self.l1 = int(l0), int(l1)
+        self.converged   = bool(converged)
+        self.profile = etprofile.ProfileAccumulator(ELLIP,origin,dlnr,rmin,rmax)
+        nt, nbins    = (self.l0 + 1) * (self.l1 + 1), self.profile.nbins
+        self.total   = {'nfit': np.array(0.0), 'AtA': np.zeros((len(MODELS),nt,nt)),
+                        'Aty': np.zeros((len(MODELS),nt)), 'yty': np.zeros(len(MODELS)),
+                        'resp': np.zeros((2,nbins,nt))}
+        self.files   = {}
+        self.stamps  = {}
+
+    @property
+    def options(self):
+        """Return the options the sums depend on."""
+        return (self.l0, self.l1, self.converged) + self.profile.options
+
+    def add(self,gfile,cat,stamp=None):
+        """Fold the galaxy catalog cat of galaxy file gfile (stamp: its (size, mtime))."""
+        if gfile in self.files:
+            raise ValueError('galaxy file {} is already in the sums'.format(gfile))
+        stats, profile = file_sums(cat,self.l0,self.l1,self.converged,self.profile.options)
+        self.add_sums(gfile,stats,profile,stamp)
+
+    def add_sums(self,gfile,stats,profile,stamp=None):
+        """Fold the output of file_sums for galaxy file gfile."""
+        self.profile.add_sums(gfile,profile)
+        self.files[gfile]  = stats
+        self.stamps[gfile] = stamp
+        for k in FIELDS:
+            self.total[k] = self.total[k] + stats[k]
+
+    def remove(self,gfile):
+        """Subtract the sums of galaxy file gfile."""
+        stats = self.files.pop(gfile)
+        self.stamps.pop(gfile)
+        self.profile.remove(gfile)
+        for k in FIELDS:
+            self.total[k] = self.total[k] - stats[k]
+
+    def sync(self,files):
+        """Make the sums those of the catalogs files, a list of (gfile, path).
+
+        Only the catalogs that are new or whose size or modification time
+        changed are read.
+
+        Returns:
+          tuple: (added, changed, removed) lists of galaxy files.
+
+        """
+        added, changed = [], []
+        paths = dict(files)
+        removed = [i for i in self.files if i not in paths]
+        for i in removed:
+            self.remove(i)
+        for i, path in sorted(paths.items()):
+            st = os.stat(path)
+            stamp = (st.st_size, st.st_mtime_ns)
+            if i in self.files:
+                if self.stamps[i] == stamp:
+                    continue
+                self.remove(i)
+                changed.append(i)
+            else:
+                added.append(i)
+            self.add(i,catalog.read_cat(path),stamp)
+        return added, changed, removed
+
+    def fit(self):
+        """Return (a, rms, nobjects) of the eight P_gamma models of MODELS."""
+        n  = float(self.total['nfit'])
+        nt = self.total['Aty'].shape[-1]
+        if n < nt:
+            raise ValueError('{:.0f} objects are too few to fit {} terms'.format(n,nt))
+        AtA, Aty, yty = self.total['AtA'], self.total['Aty'], self.total['yty']
+        a = polymodel.solve_normal(AtA,Aty)
+        # sum (y - A a)^2 = y.y - 2 a.A^T y + a.A^T A.a
+        ss = yty - 2 * np.einsum('ki,ki->k', a, Aty) + np.einsum('ki,kij,kj->k', a, AtA, a)
+        return a, np.sqrt(np.maximum(ss, 0.0) / n), int(n)
+
+    def profiles(self,a=None):
+        """Return the four profiles of a05.PROFILES, the shear ones with the models a.
+
+        Args:
+          a (array): coefficients of MODELS (default: fit()).
+
+        Returns:
+          dict: ename -> profile array of shape (nbins, 9), see etprofile.COLUMNS.
+
+        """
+        if a is None:
+            a = self.fit()[0]
+        coef = dict(zip(MODELS,a))
+        origin, dlnr, rmin, rmax = self.profile.options
+        profiles = self.profile.profiles()
+        for x in ['c','m']:
+            ngals, s, s2 = self.profile.sums[x+'e_avg']
+            # sum of 0.5 (P + P9) over the objects of every bin
+            resp = 0.5 * sum(self.total['resp'][k].dot(coef[(p,k)])
+                             for p in [x,x+'9'] for k in [0,1])
+            with np.errstate(divide='ignore', invalid='ignore'):
+                gt  = np.where(resp > 0, s / resp, 0.0)
+                var = np.where(ngals > 0, np.maximum(s2 / ngals - (s / ngals)**2, 0.0), 0.0)
+                err = np.where(resp > 0, np.sqrt(var * ngals) / resp, 0.0)
+            profiles[x+'g_avg'] = etprofile.profile_columns(ngals,gt,err,dlnr,rmin,rmax)
+        return profiles
+
+    def save(self,path):
+        """Write the sums of every galaxy file to an npz file (atomically)."""
+        files = sorted(self.files)
+        arrays = dict((k, np.array([self.files[i][k] for i in files]).reshape(
+                       (len(files),) + np.shape(self.total[k]))) for k in FIELDS)
+        arrays['profile'] = np.array([self.profile.files[i] for i in files]).reshape(
+                            len(files), len(ELLIP), 3, self.profile.nbins)
+        origin, dlnr, rmin, rmax = self.profile.options
+        tmp = path + '.part'
+        with open(tmp, 'wb') as f:
+            np.savez(f, options=np.hstack([self.l0, self.l1, self.converged, origin,
+                                           dlnr, rmin, rmax]),
+                     files=np.array(files, dtype=int),
+                     stamps=np.array([self.stamps[i] or (-1,-1) for i in files],
+                                     dtype=np.int64).reshape(len(files),2),
+                     **arrays)
+        os.rename(tmp, path)
+
+    @classmethod
+    def load(cls,path):
+        """Return the sums saved in path."""
+        with np.load(path) as data:
+            o = data['options']
+            sums = cls(o[0], o[1], bool(o[2]), o[3:5], o[5], o[6], o[7])
+            for j, i in enumerate(data['files']):
+                stamp = tuple(int(v) for v in data['stamps'][j])
+                sums.add_sums(int(i), dict((k, data[k][j].copy()) for k in FIELDS),
+                              data['profile'][j].copy(), None if stamp == (-1,-1) else stamp)
+        return sums
+
+
+def sums_path(z):
+    """Return the file of the sums of a redshift."""
+    return os.path.join('galshear/galshear_cat_z{}'.format(z), SUMS_NAME)
+
+
+def open_sums(path,rebuild=False,**options):
+    """Return the sums saved in path, or new ones when they are missing or
+    were made with other options."""
+    sums = GalaxySums(**options)
+    if rebuild or not os.path.isfile(path):
+        return sums
+    saved = GalaxySums.load(path)
+    if saved.options != sums.options:
+        print('The sums of {} were made with other options, starting again'.format(path))
+        return sums
+    return saved
+
+
+def write_outputs(pwd,sums):
+    """Write the running versions of the 8 par files of a03 and the 4 dat files of a05.
+
+    Returns:
+      list: the files written.
+
+    """
+    a, rms, nobjects = sums.fit()
+    ofiles = []
+    for (x,k), ak, rk in zip(MODELS,a,rms):
+        ofile = os.path.join(pwd,running_name('galshear_{}pg{}.par'.format(x,k)))
+        polymodel.write_par(ofile,ak,sums.l0,sums.l1,'{}Pg{}'.format(x,k),
+                            rms=rk,nobjects=nobjects)
+        print('Created : {}  (rms {:.4g})'.format(ofile,rk))
+        ofiles.append(ofile)
+    profiles = sums.profiles(a)
+    for ofile, ename in a05.PROFILES:
+        ofile = os.path.join(pwd,running_name(ofile))
+        etprofile.write_profile(ofile,profiles[ename])
+        print('Created : {}'.format(ofile))
+        ofiles.append(ofile)
+    return ofiles
+
+
+def run(z,converged=False,rebuild=False):
+    """Update the sums of a redshift with its galaxy catalogs and write the outputs.
+
+    Args:
+      z (float): redshift e.g. 0.5, 0.7, 1.0, 1.5
+      converged (bool): cut like ``a03_Pgamma_cat.py --converged``.
+      rebuild (bool): forget the saved sums and read every catalog.
+
+    """
+    pwd   = 'galshear/galshear_cat_z{}'.format(z)
+    path  = sums_path(z)
+    files = a03.galshear_files(pwd,z)
+    sums  = open_sums(path,rebuild,converged=converged)
+    added, changed, removed = sums.sync(files)
+    print('\nGalaxy files of redshift {}: {} added, {} changed, {} removed, {} in the sums '
+          '({} objects)'.format(z,len(added),len(changed),len(removed),len(sums.files),
+                                int(sums.total['nfit'])))
+
+    tele = telemetry.current()
+    paths = dict(files)
+    tele.add_input([paths[i] for i in added + changed])
+    sums.save(path)
+    tele.add_output(write_outputs(pwd,sums) + [path])
+
+
+def main():
+    """Run main function."""
+    parser = argparse.ArgumentParser(description='Update the P_gamma fits and the profiles '
+                                                 'with the new galaxy files.')
+    parser.add_argument('z', type=float, help='redshift e.g. 0.7')
+    parser.add_argument('--converged', action='store_true',
+                        help='cut on the converged flag instead of dx, like a03 --converged')
+    parser.add_argument('--rebuild', action='store_true',
+                        help='read every galaxy catalog again')
+    args = parser.parse_args()
+    with telemetry.stage('galstats', args.z, echo=True):
+        run(args.z,args.converged,args.rebuild)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+#!python
+# -*- coding: utf-8 -*-
+#
+# Date        : Oct 18, 2026
+"""
+.. note::
+
+    This module finds objects in an image in-process, as an alternative to
+    the IMCAT program ``hfindpeaks image.fits -r 0.5 20`` at the start of the
+    a02 pipeline.
+
+    The image is smoothed with Gaussians of scale rg from rmin to rmax (in
+    steps of a factor SCALE_STEP) by multiplying its FFT with the transform
+    of the Gaussian, so every scale costs one inverse FFT whatever rg is.
+    Each smoothed image is turned into a significance nu by removing its
+    median and dividing by its robust rms (1.4826 times the median absolute
+    deviation). Every pixel keeps the largest nu over the scales and the
+    scale where it was reached.
+
+    A peak is a pixel of this maximum significance map above nu_min that is
+    larger than its eight neighbours; the comparison is done on shifted
+    slices of the whole map. Its rg is the best scale of that pixel.
+
+    The image is padded with its median before the FFT so objects near an
+    edge are not smoothed with the other side of the image.
+
+    Positions follow the IMCAT convention: pixel [i, j] (row i, column j of
+    the image array) covers x from j to j + 1 and y from i to i + 1, so its
+    centre is at x = (j + 0.5, i + 0.5). A peak at pixel [i, j] is
+    reported there, half a pixel from the array indices.
+
+:Outputs: A catalog with the object items x[2] (column, row), rg and nu and
+  the header item fits_name, which getsky, apphot and getshapes use to find
+  the image::
+
+    python peaks.py lsst_z0.7_0.fits lsst_z0.7_0_peaks.cat
+    getsky -Z rg 3 < lsst_z0.7_0_peaks.cat | apphot -z 30 -M 30 | getshapes ...
+
+"""
+# Imports
+import argparse
+
+import numpy as np
+
+import catalog
+
+# hfindpeaks -r 0.5 20
+RMIN       = 0.5
+RMAX       = 20.0
+SCALE_STEP = 2 ** 0.25
+NU_MIN     = 5.0
+
+# position of the centre of pixel [0, 0] in both axes (IMCAT convention)
+PIXEL_CENTRE = 0.5
+
+
+def read_image(path):
+    """Return the primary image of a fitsfile as a float64 array."""
+    from astropy.io import fits
+    with fits.open(path, memmap=True) as hdul:
+        return np.asarray(hdul[0].data, dtype=np.float64)
+
+
+# numpy types of the fits BITPIX values (fits data are big endian)
+BITPIX = {8: '>u1', 16: '>i2', 32: '>i4', 64: '>i8', -32: '>f4', -64: '>f8'}
+
+
+def map_image(path):
+    """Return the primary image of a fitsfile as a read-only memory map.
+
+    The header is parsed here, so astropy is not needed. Only images stored
+    without scaling (no BSCALE or BZERO) can be mapped, the others are read
+    with read_image.
+    """
+    cards = {}
+    offset = 0
+    with open(path, 'rb') as f:
+        while 'END' not in cards:
+            block = f.read(2880)
+            if len(block) < 2880:
+                raise ValueError('{} is not a fitsfile (no END card)'.format(path))
+            offset += 2880
+            for k in range(0, 2880, 80):
+                card = block[k:k + 80].decode('ascii', 'replace')
+                key = card[:8].strip()
+                if key == 'END':
+                    cards['END'] = None
+                    break
+                if card[8:10] == '= ':
+                    cards.setdefault(key, card[10:].split('/')[0].strip())
+
+    if float(cards.get('BSCALE', 1)) != 1 or float(cards.get('BZERO', 0)) != 0:
+        return read_image(path)
+    if int(cards.get('NAXIS', 0)) != 2:
+        raise ValueError('{} has no 2-D primary image'.format(path))
+    shape = (int(cards['NAXIS2']), int(cards['NAXIS1']))
+    return np.memmap(path, dtype=BITPIX[int(cards['BITPIX'])], mode='r',
+                     offset=offset, shape=shape)
+
+
+def scales(rmin=RMIN,rmax=RMAX,step=SCALE_STEP):
+    """Return the smoothing scales rg from rmin to rmax (both included)."""
+    n = int(np.floor(np.log(rmax / rmin) / np.log(step) + 1e-9))
+    rg = rmin * step ** np.arange(n + 1)
+    if rg[-1] < rmax:
+        rg = np.append(rg, rmax)
+    return rg
+
+
+def robust_rms(a,stride=4):
+    """Return the median and robust rms of a, from every stride-th pixel."""
+    sample = a[::stride, ::stride]
+    med = np.median(sample)
+    return med, 1.4826 * np.median(np.abs(sample - med))
+
+
+def significance(image,rg):
+    """Return the maximum significance over the scales and its scale index.
+
+    Args:
+      image (array): 2-D image.
+      rg (array): smoothing scales in pixels, from scales().
+
+    Returns:
+      tuple: (nu, iscale) both with the shape of image.
+
+    """
+    ny, nx = image.shape
+    pad = int(np.ceil(3 * rg[-1]))
+    padded = np.pad(image, pad, mode='constant', constant_values=np.median(image))
+    F  = np.fft.rfft2(padded)
+    ky = np.fft.fftfreq(padded.shape[0])[:, None]
+    kx = np.fft.rfftfreq(padded.shape[1])[None, :]
+    k2 = kx*kx + ky*ky
+
+    best   = np.full(image.shape, -np.inf)
+    iscale = np.zeros(image.shape, dtype=np.int16)
+    for s, r in enumerate(rg):
+        smooth = np.fft.irfft2(F * np.exp(-2 * np.pi**2 * r*r * k2), s=padded.shape)
+        smooth = smooth[pad:pad + ny, pad:pad + nx]
+        med, rms = robust_rms(smooth)
+        if rms <= 0:
+            continue
+        nu = (smooth - med) / rms
+        better = nu > best
+        best[better]   = nu[better]
+        iscale[better] = s
+    return best, iscale
+
+
+def local_maxima(a,threshold):
+    """Return the (row, column) of the pixels above threshold larger than their 8 neighbours.
+
+    Ties are broken towards the lower row and column so that a flat top
+    gives a single peak.
+    """
+    p = np.pad(a, 1, mode='constant', constant_values=-np.inf)
+    c = p[1:-1, 1:-1]
+    peak = c >= threshold
+    for dy in (-1, 0, 1):
+        for dx in (-1, 0, 1):
+            if dy == 0 and dx == 0:
+                continue
+            n = p[1 + dy:p.shape[0] - 1 + dy, 1 + dx:p.shape[1] - 1 + dx]
+            # strictly larger than the neighbours before, at least as large as those after
+            peak &= (c > n) if (dy, dx) < (0, 0) else (c >= n)
+    return np.nonzero(peak)
+
+
+def find_peaks(image,rmin=RMIN,rmax=RMAX,step=SCALE_STEP,nu_min=NU_MIN):
+    """Find the peaks of an image over a range of smoothing scales.
+
+    Args:
+      image (array): 2-D image.
+      rmin, rmax (float): smallest and largest smoothing scales (-r).
+      step (float): ratio of successive scales.
+      nu_min (float): minimum significance of a peak.
+
+    Returns:
+      Catalog: object items x (column, row) at the pixel centres, see
+      PIXEL_CENTRE, rg and nu, sorted by row.
+
+    """
+    rg = scales(rmin,rmax,step)
+    nu, iscale = significance(image,rg)
+    iy, ix = local_maxima(nu,nu_min)
+
+    cat = catalog.Catalog()
+    cat['x']  = np.column_stack([ix, iy]) + PIXEL_CENTRE
+    cat['rg'] = rg[iscale[iy, ix]]
+    cat['nu'] = nu[iy, ix]
+    return cat
+
+
+def detect(path,ofile=None,rmin=RMIN,rmax=RMAX,step=SCALE_STEP,nu_min=NU_MIN):
+    """Find the peaks of a fitsfile, optionally writing them to ofile.
+
+    Returns:
+      Catalog: the peaks, with the header item fits_name = path.
+
+    """
+    cat = find_peaks(read_image(path),rmin,rmax,step,nu_min)
+    cat.header['fits_name'] = path
+    cat.history.append('peaks.py {} -r {} {}'.format(path,rmin,rmax))
+    if ofile is not None:
+        catalog.write_cat(ofile,cat)
+    return cat
+
+
+def main():
+    """Run main function."""
+    parser = argparse.ArgumentParser(description='Find peaks of a fitsfile (like hfindpeaks).')
+    parser.add_argument('fitsfile', help='image e.g. lsst_z0.7_0.fits')
+    parser.add_argument('ofile', help='output catalog')
+    parser.add_argument('-r', nargs=2, type=float, default=[RMIN,RMAX],
+                        metavar=('RMIN','RMAX'), help='range of smoothing scales')
+    parser.add_argument('--step', type=float, default=SCALE_STEP,
+                        help='ratio of successive smoothing scales')
+    parser.add_argument('--nu-min', type=float, default=NU_MIN,
+                        help='minimum significance of a peak')
+    args = parser.parse_args()
+    cat = detect(args.fitsfile,args.ofile,args.r[0],args.r[1],args.step,args.nu_min)
+    print('Created : {} ({} peaks)'.format(args.ofile,len(cat)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,449 @@
+#!python
+# -*- coding: utf-8 -*-
+#
+# Date        : Oct 18, 2026
+"""
+.. note::
+
+    This program runs the stages a01 to a09 for several redshifts in one
+    process.
+
+    Every (stage, redshift) is a node of a dependency graph: a02 needs a01,
+    and for a given redshift each of a03 ... a09 needs the stage before it.
+    a01 does not depend on the redshift and is run once. Nodes whose
+    dependencies are done run concurrently in a pool of worker threads (the
+    stages spend their time in imcat subprocesses or NumPy). a01 and a02
+    start pools of worker processes, which are forked and can deadlock on a
+    lock held by another thread, so their nodes run alone in the main
+    thread. When a node fails the nodes depending on it are skipped; the
+    other redshifts go on.
+
+    At the end the wall time of every node and the critical path (the chain
+    of dependent nodes with the largest total wall time) are printed. Every
+    node is also recorded by telemetry.py (``python telemetry.py summary``).
+
+    A node is skipped (status 'cached') when the build cache holds, for all
+    its outputs, the fingerprint of its current inputs, parameters, imcat
+    tools and code (see buildcache.py and stage_spec). a01 and a02 check the
+    cache for every psf and galaxy file themselves. ``--force`` runs every node.
+
+:Usage: Run a03 to a09 for four redshifts, at most four nodes at a time::
+
+    python pipeline.py 0.5 0.7 1.0 1.5 --stages a03-a09 --workers 4
+
+  Include a02 (it needs the jedisim outputs)::
+
+    python pipeline.py 0.7 1.0 --stages a02-a09 --indir /path/to/jedisim_output --end 295
+
+  Pass the galaxy catalogs from a02 to a04 through the columnar stores of
+  catstore.py instead of .cat files::
+
+    python pipeline.py 0.7 --stages a02-a09 --engine numpy --store --indir ...
+
+"""
+# Imports
+import argparse
+import concurrent.futures
+import importlib
+import os
+import sys
+import time
+import traceback
+
+import buildcache
+import catstore
+import etprofile
+import telemetry
+
+STAGES = ['a01','a02','a03','a04','a05','a06','a07','a08','a09']
+
+MODULES = {'a01': 'a01_psf10_par',
+           'a02': 'a02_galshear_cats',
+           'a03': 'a03_Pgamma_cat',
+           'a04': 'a04_fitted_Pgamma',
+           'a05': 'a05_etprofile_cm_shear_ellip',
+           'a06': 'a06_cm_galshear_shear_ellip_dat',
+           'a07': 'a07_cm_shear_ellip_cat',
+           'a08': 'a08_create_plots',
+           'a09': 'a09_make_pdf'}
+
+# stages that fork worker processes, run alone in the main thread
+MAIN_THREAD_STAGES = ['a01','a02']
+
+# stages that can run without imcat (engine 'numpy')
+NUMPY_STAGES = ['a02','a03','a04','a05','a08']
+
+# imcat and other external programs run by each stage with engine 'imcat'
+TOOLS = {'a03': ['catcats','lc','fit2Dpolymodel2'],
+         'a04': ['lc','gen2Dpolymodel'],
+         'a05': ['etprofile','lc'],
+         'a08': ['plotcat'],
+         'a09': ['montage']}
+
+
+def stage_spec(stage,z,engine='imcat',store=False,converged=False):
+    """Return the inputs, outputs and parameters of a node for the build cache.
+
+    Args:
+      stage (str): e.g. 'a03'
+      z (float): redshift e.g. 0.7 (None for a01)
+      engine (str): 'imcat' or 'numpy'
+      store (bool): a03 and a04 use the catalog stores of catstore.py
+      converged (bool): a03 cuts on the converged flag instead of dx
+
+    Returns:
+      dict: with keys inputs, outputs, params, tools and code, or None for
+      a01 and a02 which check the cache for every psf and galaxy file
+      themselves, for a07 which only checks the files of a06, and for a09
+      with engine numpy (a08 writes its pdf).
+
+    """
+    if stage in ('a01','a02','a07'):
+        return None
+    if stage == 'a09' and engine == 'numpy':
+        return None
+    module = importlib.import_module(MODULES[stage])
+    pwd    = 'galshear/galshear_cat_z{}'.format(z)
+    plot_path = 'plots/galshear_plots_z{}'.format(z)
+    pars   = ['{}/galshear_{}pg{}.par'.format(pwd,x,k) for x in ['c','c9','m','m9'] for k in [0,1]]
+    dats   = ['{}/{}'.format(pwd,f) for f in ['color_galshear_shear.dat','mono_galshear_shear.dat',
+                                             'color_galshear_ellip.dat','mono_galshear_ellip.dat']]
+    cm_dats = ['{}/color_mono_galshear_{}.dat'.format(pwd,x) for x in ['shear','ellip']]
+    cm_cats = ['{}/color_mono_galshear_{}.cat'.format(pwd,x) for x in ['shear','ellip']]
+    plots  = ['{}/r_{}.ps'.format(plot_path,x) for x in
+              ['gm_shear','gc_shear','grat_shear','grat_sheardiff',
+               'em_ellip','ec_ellip','erat_ellip','erat_ellipdiff']]
+    params = {'engine': engine}
+    cut    = catstore.store_path(z,'galshear_cut') if store else '{}/galshear_cut.cat'.format(pwd)
+
+    if stage == 'a03':
+        if store:
+            inputs = [catstore.store_path(z)]
+        else:
+            inputs = sorted(f for i, f in module.galshear_files(pwd,z))
+        outputs = [cut] + pars
+        params.update(rg_min=module.RG_MIN, x_min=module.X_MIN, x_max=module.X_MAX,
+                      dx_max=module.DX_MAX, mag_max=module.MAG_MAX, converged=converged)
+    elif stage == 'a04':
+        inputs  = [cut] + pars
+        outputs = ['{}/galshear_shear.cat'.format(pwd)]
+        params.update(dx_max=module.DX_MAX, mag_max=module.MAG_MAX)
+    elif stage == 'a05':
+        inputs, outputs = ['{}/galshear_shear.cat'.format(pwd)], dats
+        params.update(origin=etprofile.ORIGIN, dlnr=etprofile.DLNR,
+                      rmin=etprofile.RMIN, rmax=etprofile.RMAX)
+    elif stage == 'a06':
+        inputs, outputs = dats, cm_dats + cm_cats
+    elif stage == 'a08':
+        inputs, outputs = cm_cats, plots
+        if engine == 'numpy':
+            outputs = [module.pdf_path(z)]
+    elif stage == 'a09':
+        z0, z1 = str(z).split('.')
+        inputs  = plots
+        outputs = ['{}/shear_z{}_{}.pdf'.format(plot_path,z0,z1)]
+
+    tools = TOOLS.get(stage, [])
+    code  = [module.__file__]
+    if stage == 'a06':
+        code += [importlib.import_module(m).__file__ for m in ['catalog','etprofile']]
+    if engine == 'numpy' and stage in NUMPY_STAGES:
+        tools = []
+        code += [importlib.import_module(m).__file__
+                 for m in ['catalog','catstore','polymodel','etprofile']]
+    return {'inputs': inputs, 'outputs': outputs, 'params': params,
+            'tools': tools, 'code': code}
+
+
+def cached(stage,func,engine='imcat',force=False,store=False,converged=False):
+    """Wrap the function of a stage so that it is skipped when up to date.
+
+    The wrapped function returns 'cached' when the stage did not run.
+    """
+    def run(z):
+        telemetry.current().extra['engine'] = engine
+        spec = stage_spec(stage,z,engine,store,converged)
+        if spec is None:
+            return func(z)
+        fp = buildcache.fingerprint(spec['inputs'],spec['params'],spec['tools'],spec['code'])
+        cache = buildcache.BuildCache.for_outputs(spec['outputs'])
+        if not force and cache.is_fresh(spec['outputs'],fp):
+            return 'cached'
+
+        cache.forget(spec['outputs'])
+        func(z)
+        missing = [f for f in spec['outputs'] if not os.path.isfile(f)]
+        if missing:
+            raise RuntimeError('{} did not create {}'.format(stage,', '.join(missing)))
+        cache.record(spec['outputs'],fp)
+        report_files(spec)
+    return run
+
+
+def report_files(spec):
+    """Report the inputs and outputs of a stage_spec to the running telemetry stage."""
+    t = telemetry.current()
+    t.add_input(spec['inputs'])
+    t.add_output(spec['outputs'])
+
+
+def stage_functions(engine='imcat',indir=None,start=0,end=0,a02_jobs=1,force=False,
+                    store=False,detect='hfindpeaks',refine='imcat',forced='serial',
+                    measure='imcat'):
+    """Return stage name -> function of the redshift running that stage."""
+    a01 = importlib.import_module(MODULES['a01'])
+    a02 = importlib.import_module(MODULES['a02'])
+    a03 = importlib.import_module(MODULES['a03'])
+    a04 = importlib.import_module(MODULES['a04'])
+    a05 = importlib.import_module(MODULES['a05'])
+    a06 = importlib.import_module(MODULES['a06'])
+    a07 = importlib.import_module(MODULES['a07'])
+    a08 = importlib.import_module(MODULES['a08'])
+    a09 = importlib.import_module(MODULES['a09'])
+
+    # a03 cuts on the convergence of the centroids refined by a02
+    converged = refine == 'numpy' and engine == 'numpy'
+
+    def run_a01(z):
+        failures = a01.run(force=force)
+        if failures:
+            raise RuntimeError('{} psf fits failed'.format(len(failures)))
+
+    def run_a02(z):
+        if indir is None:
+            raise ValueError('a02 needs the jedisim output directory (--indir)')
+        failures = a02.galshear_cats(z,start,end,indir,jobs=a02_jobs,engine=engine,
+                                     resume=True,store=store,detect=detect,refine=refine,
+                                     forced=forced,measure=measure)
+        if failures:
+            raise RuntimeError('{} galaxy files failed'.format(len(failures)))
+
+    funcs = {'a01': run_a01,
+             'a02': run_a02,
+             'a03': lambda z: a03.run(z,engine,store=store,converged=converged),
+             'a04': lambda z: a04.run(z,engine,store=store),
+             'a05': lambda z: a05.run(z,engine),
+             'a06': lambda z: a06.run([z]),
+             'a07': a07.cm_shear_ellip,
+             'a08': lambda z: a08.run(z,engine),
+             'a09': a09.create_pdf}
+    return dict((s, cached(s,f,engine,force,store,converged)) for s, f in funcs.items())
+
+
+def build_graph(stages,redshifts):
+    """Return the nodes (in dependency order) and their dependencies.
+
+    Args:
+      stages (list): stages to run e.g. ['a03', ..., 'a09']
+      redshifts (list): redshifts e.g. [0.5, 0.7, 1.0, 1.5]
+
+    Returns:
+      tuple: (nodes, deps). A node is (stage, z), with z None for a01.
+
+    """
+    stages = [s for s in STAGES if s in stages]
+    nodes, deps = [], {}
+    if 'a01' in stages:
+        nodes.append(('a01',None))
+        deps[('a01',None)] = []
+    for z in redshifts:
+        prev = None
+        for s in stages:
+            if s == 'a01':
+                prev = ('a01',None)
+                continue
+            node = (s,z)
+            nodes.append(node)
+            deps[node] = [prev] if prev is not None else []
+            prev = node
+    return nodes, deps
+
+
+def node_name(node):
+    """Return a printable name of a node e.g. a03(z=0.7)."""
+    stage, z = node
+    return stage if z is None else '{}(z={})'.format(stage,z)
+
+
+def _run_node(func,node):
+    """Run one node and return (status, start, end, error)."""
+    start = time.time()
+    try:
+        with telemetry.stage(node[0], node[1]) as t:
+            status = 'cached' if func(node[1]) == 'cached' else 'done'
+            t.extra['cached'] = status == 'cached'
+        return status, start, time.time(), None
+    except (Exception, SystemExit):
+        return 'failed', start, time.time(), traceback.format_exc()
+
+
+def run_graph(nodes,deps,funcs,workers=1):
+    """Run the nodes, at most workers at a time, respecting the dependencies.
+
+    Args:
+      nodes (list): nodes in dependency order, from build_graph.
+      deps (dict): node -> list of nodes it depends on.
+      funcs (dict): stage -> function of z, from stage_functions.
+      workers (int): maximum number of nodes running at the same time.
+
+    Returns:
+      dict: node -> dict with status ('done', 'cached', 'failed' or
+      'skipped'), start, end, wall and error.
+
+    """
+    results = {}
+    pending = list(nodes)
+    running = {}
+
+    def finish(node, status, start, end, error):
+        results[node] = {'status': status, 'start': start,
+                         'end': end, 'wall': end - start, 'error': error}
+        print('\n==> {} {} in {:.1f} s'.format(
+              {'done': 'Finished', 'cached': 'Up to date', 'failed': 'FAILED'}[status],
+              node_name(node), end - start))
+        if error:
+            print(error)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        while pending or running:
+            # a ready a01 or a02 node waits for the running nodes, and no other
+            # node starts before it
+            exclusive = None
+            for node in list(pending):
+                states = [results[d]['status'] if d in results else None for d in deps[node]]
+                if any(s in ('failed','skipped') for s in states):
+                    results[node] = {'status': 'skipped', 'start': None, 'end': None,
+                                     'wall': 0.0, 'error': None}
+                    pending.remove(node)
+                elif not all(s in ('done','cached') for s in states) or exclusive is not None:
+                    continue
+                elif node[0] in MAIN_THREAD_STAGES:
+                    exclusive = node
+                elif len(running) < workers:
+                    print('\n==> Starting {}'.format(node_name(node)))
+                    future = pool.submit(_run_node, funcs[node[0]], node)
+                    running[future] = node
+                    pending.remove(node)
+
+            if exclusive is not None and not running:
+                print('\n==> Starting {}'.format(node_name(exclusive)))
+                pending.remove(exclusive)
+                finish(exclusive, *_run_node(funcs[exclusive[0]], exclusive))
+                continue
+            if not running:
+                continue
+            done, _ = concurrent.futures.wait(list(running),
+                          return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                finish(running.pop(future), *future.result())
+    return results
+
+
+def critical_path(nodes,deps,results):
+    """Return the chain of dependent nodes with the largest total wall time."""
+    total, pred = {}, {}
+    for node in nodes:
+        best = max(deps[node], key=lambda d: total[d], default=None)
+        pred[node]  = best
+        total[node] = results[node]['wall'] + (total[best] if best is not None else 0.0)
+    if not total:
+        return [], 0.0
+    node = max(total, key=total.get)
+    length = total[node]
+    path = []
+    while node is not None:
+        path.append(node)
+        node = pred[node]
+    return path[::-1], length
+
+
+def report(nodes,deps,results,elapsed):
+    """Print the wall time of every node and the critical path."""
+    t0 = min([r['start'] for r in results.values() if r['start'] is not None] or [0.0])
+    print('\n{:<16s} {:>8s} {:>10s} {:>10s}'.format('node','status','start (s)','wall (s)'))
+    for node in nodes:
+        r = results[node]
+        start = '' if r['start'] is None else '{:.1f}'.format(r['start'] - t0)
+        print('{:<16s} {:>8s} {:>10s} {:>10.1f}'.format(node_name(node),r['status'],start,r['wall']))
+
+    path, length = critical_path(nodes,deps,results)
+    print('\nCritical path ({:.1f} s of {:.1f} s elapsed):'.format(length,elapsed))
+    print('  ' + ' -> '.join(node_name(n) for n in path))
+
+
+def run_pipeline(redshifts,stages,workers=1,**options):
+    """Run the stages for all redshifts and print the report.
+
+    Args:
+      redshifts (list): redshifts e.g. [0.5, 0.7, 1.0, 1.5]
+      stages (list): stages to run e.g. ['a03', ..., 'a09']
+      workers (int): maximum number of nodes running at the same time.
+      options: passed to stage_functions (engine, indir, start, end,
+        a02_jobs, force, store, detect, refine, forced, measure).
+
+    Returns:
+      dict: the results of run_graph.
+
+    """
+    nodes, deps = build_graph(stages,redshifts)
+    funcs = stage_functions(**options)
+    begin = time.time()
+    results = run_graph(nodes,deps,funcs,workers)
+    report(nodes,deps,results,time.time() - begin)
+    return results
+
+
+def parse_stages(text):
+    """Parse a stage list like 'a03-a09' or 'a01,a03,a04'."""
+    stages = []
+    for part in text.split(','):
+        if '-' in part:
+            first, last = part.split('-')
+            stages.extend(STAGES[STAGES.index(first):STAGES.index(last) + 1])
+        else:
+            stages.append(STAGES[STAGES.index(part)])
+    return stages
+
+
+def main():
+    """Run main function."""
+    parser = argparse.ArgumentParser(description='Run the shear analysis for several redshifts.')
+    parser.add_argument('z', type=float, nargs='+', help='redshifts e.g. 0.5 0.7 1.0 1.5')
+    parser.add_argument('--stages', type=parse_stages, default=parse_stages('a03-a09'),
+                        help='stages to run e.g. a03-a09 or a01,a02 (default a03-a09)')
+    parser.add_argument('-w', '--workers', type=int, default=1,
+                        help='maximum number of stages running at the same time')
+    parser.add_argument('--engine', choices=['imcat','numpy'], default='imcat',
+                        help='engine of a02 ... a05 and a08')
+    parser.add_argument('--indir', help='jedisim output directory for a02')
+    parser.add_argument('--start', type=int, default=0, help='first galaxy index for a02')
+    parser.add_argument('--end', type=int, default=0, help='last galaxy index for a02')
+    parser.add_argument('--a02-jobs', type=int, default=1,
+                        help='worker processes of each a02 node')
+    parser.add_argument('--force', action='store_true',
+                        help='run every stage even if its outputs are up to date')
+    parser.add_argument('--store', action='store_true',
+                        help='with --engine numpy, a02 to a04 use the catalog stores')
+    parser.add_argument('--detect', choices=['hfindpeaks','numpy'], default='hfindpeaks',
+                        help='find the objects of a02 with hfindpeaks or peaks.py')
+    parser.add_argument('--refine', choices=['imcat','numpy'], default='imcat',
+                        help='refine the centroids of a02 three times with getshapes, or '
+                             'until convergence with shapes.py (a03 then cuts on convergence)')
+    parser.add_argument('--forced', choices=['serial','parallel'], default='serial',
+                        help='measure the companion images of a02 one after another or '
+                             'at the same time')
+    parser.add_argument('--measure', choices=['imcat','numpy'], default='imcat',
+                        help='measure the shapes of a02 with getshapes or shapes.py')
+    args = parser.parse_args()
+
+    results = run_pipeline(args.z,args.stages,args.workers,engine=args.engine,
+                           indir=args.indir,start=args.start,end=args.end,
+                           a02_jobs=args.a02_jobs,force=args.force,store=args.store,
+                           detect=args.detect,refine=args.refine,forced=args.forced,
+                           measure=args.measure)
+    if any(r['status'] not in ('done','cached') for r in results.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+#!python
+# -*- coding: utf-8 -*-
+#
+# Date        : Oct 18, 2026
+"""
+.. note::
+
+    This module fits the 2D polynomial models of the P_gamma values in-process.
+    It replaces the eight ``fit2Dpolymodel2 x 4 1`` runs of a03.
+
+    A model of orders (l0, l1) in the two components of x = (rg, e) is::
+
+      f(x) = sum_{j=0..l1} sum_{i=0..l0} a[j*(l0+1) + i] * x[0]**i * x[1]**j
+
+    so ``4 1`` is fourth order in rg and linear in e.
+
+    All the models of a03 use the same powers of rg, only the e column and the
+    fitted P_gamma column change from one model to the other. The powers of rg
+    are computed once and the normal equations of all the models are solved
+    together with one batched ``np.linalg.solve``. In the same way evaluate
+    computes several models on whole column arrays at once, replacing the
+    chained ``gen2Dpolymodel`` runs of a04.
+
+    The par files are header-only IMCAT catalogs in the layout of
+    fit2Dpolymodel2, so gen2Dpolymodel reads the par files of either engine
+    and read_par reads those of fit2Dpolymodel2::
+
+      # text       1        1 history: fit2Dpolymodel2 x 4 1 cPg0
+      # text       1        1 xname: x
+      # text       1        1 fname: cPg0
+      # number     1        1 l0 4.0
+      # number     1        1 l1 1.0
+      # number     1        1 nmodes 10.0
+      # number     1       10 l 0.0 1.0 2.0 3.0 4.0 0.0 1.0 2.0 3.0 4.0
+      # number     1       10 m 0.0 0.0 0.0 0.0 0.0 1.0 1.0 1.0 1.0 1.0
+      # number     1       10 a 0.51 -0.032 ...
+
+    Mode k is a[k] * x[0]**l[k] * x[1]**m[k]. read_par puts the modes back in
+    the order of design, whatever their order in the file.
+
+"""
+# Imports
+import numpy as np
+
+import catalog
+
+
+def rg_powers(x0,l0):
+    """Return the powers x0**0 ... x0**l0 of shape (n, l0+1)."""
+    return np.power.outer(np.asarray(x0, dtype=float), np.arange(l0 + 1))
+
+
+def design(x0,x1,l0,l1,powers=None):
+    """Return the design matrix of the model of orders (l0, l1).
+
+    Args:
+      x0 (array): first component of x, shape (n,).
+      x1 (array): second component of x, shape (n,) or (k, n) for k models.
+      l0, l1 (int): polynomial orders in x0 and x1.
+      powers (array): precomputed rg_powers(x0, l0).
+
+    Returns:
+      array: shape (n, nterms) or (k, n, nterms), nterms = (l0+1)*(l1+1).
+
+    """
+    if powers is None:
+        powers = rg_powers(x0,l0)
+    x1 = np.asarray(x1, dtype=float)
+    blocks = [powers * (x1[...,None] ** j) for j in range(l1 + 1)]
+    return np.concatenate(blocks, axis=-1)
+
+
+def normal_equations(A,y):
+    """Return A^T A and A^T y for stacks of design matrices and data."""
+    AtA = np.einsum('...ni,...nj->...ij', A, A)
+    Aty = np.einsum('...ni,...n->...i', A, y)
+    return AtA, Aty
+
+
+def solve_normal(AtA,Aty):
+    """Solve a stack of normal equations after scaling them to unit diagonal."""
+    d = np.sqrt(np.diagonal(AtA, axis1=-2, axis2=-1))
+    d = np.where(d > 0, d, 1.0)
+    scaled = AtA / (d[...,:,None] * d[...,None,:])
+    return np.linalg.solve(scaled, (Aty / d)[...,None])[...,0] / d
+
+
+def fit(x0,x1,y,l0,l1):
+    """Fit k models of orders (l0, l1) sharing the same x0 at once.
+
+    Args:
+      x0 (array): first component of x (rg), shape (n,).
+      x1 (array): second component of x for each model, shape (k, n).
+      y (array): fitted values for each model, shape (k, n).
+      l0, l1 (int): polynomial orders in x0 and x1.
+
+    Returns:
+      tuple: (a, rms) the coefficients of shape (k, nterms) and the rms of
+      the residuals of shape (k,).
+
+    """
+    y = np.asarray(y, dtype=float)
+    A = design(x0,x1,l0,l1)
+    a = solve_normal(*normal_equations(A,y))
+    resid = y - np.einsum('kni,ki->kn', A, a)
+    return a, np.sqrt(np.mean(resid**2, axis=-1))
+
+
+def evaluate(a,x0,x1,l0,l1,powers=None):
+    """Evaluate k models of orders (l0, l1) at once.
+
+    Args:
+      a (array): coefficients, shape (k, nterms).
+      x0 (array): first component of x (rg), shape (n,).
+      x1 (array): second component of x, shape (n,) if all the models share
+        it or (k, n).
+      l0, l1 (int): polynomial orders in x0 and x1.
+      powers (array): precomputed rg_powers(x0, l0).
+
+    Returns:
+      array: model values of shape (k, n).
+
+    """
+    A = design(x0,x1,l0,l1,powers)
+    if A.ndim == 2:
+        return np.einsum('ni,ki->kn', A, a)
+    return np.einsum('kni,ki->kn', A, a)
+
+
+def mode_powers(l0,l1):
+    """Return the powers l of x[0] and m of x[1] of the modes, in the order of design."""
+    m, l = np.divmod(np.arange((l0 + 1) * (l1 + 1)), l0 + 1)
+    return l, m
+
+
+def write_par(path,a,l0,l1,fname,xname='x',**items):
+    """Write the coefficients of one model as a fit2Dpolymodel2 par file.
+
+    Args:
+      path (str): output par file e.g. galshear_cpg0.par
+      a (array): coefficients of shape ((l0+1)*(l1+1),).
+      l0, l1 (int): polynomial orders in x[0] and x[1].
+      fname (str): name of the fitted item e.g. cPg0
+      xname (str): name of the 2-vector x.
+      items: other number header items e.g. rms, nobjects.
+
+    """
+    l, m = mode_powers(l0,l1)
+    cat = catalog.Catalog(history=['fit2Dpolymodel2 {} {:d} {:d} {}'.format(xname,l0,l1,fname)])
+    cat.header['xname'] = xname
+    cat.header['fname'] = fname
+    cat.header['l0'] = np.array([l0], dtype=float)
+    cat.header['l1'] = np.array([l1], dtype=float)
+    cat.header['nmodes'] = np.array([len(l)], dtype=float)
+    cat.header['l'] = l.astype(float)
+    cat.header['m'] = m.astype(float)
+    cat.header['a'] = np.asarray(a, dtype=float)
+    for k, v in items.items():
+        cat.header[k] = np.atleast_1d(np.asarray(v, dtype=float))
+    catalog.write_cat(path, cat)
+
+
+def read_par(path):
+    """Read a par file of fit2Dpolymodel2 or write_par.
+
+    Returns:
+      dict: with keys a (in the order of design), l0, l1, fname and xname.
+
+    Raises:
+      ValueError: if the par file is not a fit2Dpolymodel2 model.
+
+    """
+    header = catalog.read_header(path)[0].header
+    missing = [k for k in ['l0','l1','l','m','a','fname','xname'] if k not in header]
+    if missing:
+        raise ValueError('{} is not a fit2Dpolymodel2 par file (no {})'.format(
+                         path, ', '.join(missing)))
+    l0 = int(np.ravel(header['l0'])[0])
+    l1 = int(np.ravel(header['l1'])[0])
+    l  = np.ravel(header['l']).astype(int)
+    m  = np.ravel(header['m']).astype(int)
+    a  = np.ravel(header['a']).astype(float)
+    if not len(l) == len(m) == len(a) or np.any(l > l0) or np.any(m > l1):
+        raise ValueError('{}: the modes do not match l0 = {} and l1 = {}'.format(path,l0,l1))
+    coef = np.zeros((l0 + 1) * (l1 + 1))
+    coef[m * (l0 + 1) + l] = a
+    return {'a': coef, 'l0': l0, 'l1': l1,
+            'fname': header['fname'], 'xname': header['xname']}
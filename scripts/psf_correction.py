@@ -0,0 +1,105 @@
+#!python
+# -*- coding: utf-8 -*-
+#
+# Date        : Oct 18, 2026
+"""
+.. note::
+
+    This module does the PSF anisotropy correction of a02 with NumPy.
+
+    For every object a02 used to evaluate these two ``lc`` expressions::
+
+      Pg = %psh %psm %stmod[0] %stmod[1] 2 vector %stmod[2] %stmod[3] 2 vector 2 vector
+           %stmod[4] %stmod[5] 2 vector %stmod[6] %stmod[7] 2 vector 2 vector inverse dot dot msub
+      e  = %e %psm %stmod[4] %stmod[5] 2 vector %stmod[6] %stmod[7] 2 vector 2 vector inverse dot
+           %stmod[8] %stmod[9] 2 vector dot vsub
+
+    i.e. with the star shear polarizability Psh* = stmod[0:4], the star smear
+    polarizability Psm* = stmod[4:8] and the star ellipticity e* = stmod[8:10]::
+
+      Pg = psh - psm . Psh* . inverse(Psm*)
+      e  = e - psm . inverse(Psm*) . e*
+
+    Here the same algebra is done for all objects at once on arrays of shape
+    (nobjects, 2, 2), with the 2x2 inverses written out explicitly.
+
+:Usage: Typical use::
+
+    import catalog, psf_correction
+    cat = catalog.read_cat('galshear_z0.7_0.cat.part')
+    psf_correction.correct_catalog(cat)
+
+"""
+# Imports
+import numpy as np
+
+# prefixes of the chromatic, monochromatic and 90 degree rotated measurements
+PREFIXES = ['c','c9','m','m9']
+
+
+def inverse2x2(a):
+    """Return the inverses of a stack of 2x2 matrices of shape (n,2,2)."""
+    det = a[:,0,0]*a[:,1,1] - a[:,0,1]*a[:,1,0]
+    inv = np.empty_like(a)
+    inv[:,0,0] =  a[:,1,1]
+    inv[:,0,1] = -a[:,0,1]
+    inv[:,1,0] = -a[:,1,0]
+    inv[:,1,1] =  a[:,0,0]
+    inv /= det[:,None,None]
+    return inv
+
+
+def correct(psh,psm,e,stmod):
+    """Correct shear polarizability and ellipticity for the PSF anisotropy.
+
+    Args:
+      psh (array): shear polarizability of the objects, shape (n,2,2).
+      psm (array): smear polarizability of the objects, shape (n,2,2).
+      e (array): ellipticity of the objects, shape (n,2).
+      stmod (array): star model from gen2Dpolymodel psf10.par, shape (n,11).
+
+    Returns:
+      tuple: (Pg, e) of shapes (n,2,2) and (n,2).
+
+    """
+    psh   = np.asarray(psh, dtype=float)
+    psm   = np.asarray(psm, dtype=float)
+    e     = np.asarray(e, dtype=float)
+    stmod = np.asarray(stmod, dtype=float)
+
+    n        = len(stmod)
+    st_psh   = stmod[:,0:4].reshape(n,2,2)
+    st_psm_i = inverse2x2(stmod[:,4:8].reshape(n,2,2))
+    st_e     = stmod[:,8:10]
+
+    Pg = psh - np.matmul(psm, np.matmul(st_psh, st_psm_i))
+    e  = e - np.einsum('nij,nj->ni', np.matmul(psm, st_psm_i), st_e)
+    return Pg, e
+
+
+def correct_catalog(cat,prefixes=PREFIXES):
+    """Replace the raw measurements of a02 by the PSF corrected values.
+
+    For every prefix x the catalog must have the columns xe, xpsh, xpsm and
+    xstmod. They are replaced by xe and xPg, the same columns that the ``lc``
+    expressions used to write. Like the ``lc`` pipeline, the plain columns
+    e and Pg end up holding the values of the last prefix.
+
+    Args:
+      cat (catalog.Catalog): catalog created by a02 with ``--engine numpy``.
+      prefixes (list): measurements to correct e.g. ['c','c9','m','m9']
+
+    Returns:
+      catalog.Catalog: the same catalog, modified in place.
+
+    """
+    for x in prefixes:
+        Pg, e = correct(cat[x+'psh'],cat[x+'psm'],cat[x+'e'],cat[x+'stmod'])
+        for col in ['psh','psm','stmod']:
+            del cat.columns[x+col]
+        cat[x+'e']  = e
+        cat[x+'Pg'] = Pg
+
+    cat['e']  = cat[prefixes[-1]+'e']
+    cat['Pg'] = cat[prefixes[-1]+'Pg']
+    return cat
@@ -0,0 +1,241 @@
+#!python
+# -*- coding: utf-8 -*-
+#
+# Date        : Oct 18, 2026
+"""
+.. note::
+
+    This program computes bootstrap and jackknife errors and covariance
+    matrices of the color and mono shear profiles and of their ratio grat,
+    resampling whole galaxy files.
+
+    The objects of galshear_shear.cat are binned once. Their tangential shear
+    is summed per galaxy file and radial bin, giving arrays of shape
+    (nfiles, nbins). A resample is a row of weights over the galaxy files
+    (multinomial counts for the bootstrap, all ones but one zero for the
+    jackknife), so all the resamples are one weight matrix W and the resampled
+    sums are W @ sums. The rows of W are split in blocks that are computed in
+    parallel worker processes.
+
+:Depends: galshear_shear.cat with the column gfile, written by
+  ``a03_Pgamma_cat.py --engine numpy`` and ``a04_fitted_Pgamma.py --engine numpy``.
+
+:Outputs: Next to color_mono_galshear_shear.dat, for method bootstrap and/or
+  jackknife::
+
+    color_mono_galshear_shear_bootstrap.dat       # r gc gcerr gm gmerr grat graterr
+    color_mono_galshear_shear_bootstrap_cov.dat   # covariance of (gc, gm, grat)
+
+:Usage: Typical use::
+
+    python resample.py 0.7 --method both --nboot 1000 --jobs 8
+
+"""
+# Imports
+import argparse
+import multiprocessing
+import os
+import sys
+
+import numpy as np
+
+import catalog
+import etprofile
+
+QUANTITIES = ['gc','gm','grat']
+
+
+def file_bin_sums(ifile,ibin,values,nfiles,nbins):
+    """Return the per galaxy file and per bin counts and sums.
+
+    Args:
+      ifile (array): galaxy file number of every object, 0 ... nfiles-1.
+      ibin (array): radial bin of every object, -1 outside the profile.
+      values (list): per object quantities to sum, each of shape (n,).
+      nfiles, nbins (int): number of galaxy files and of radial bins.
+
+    Returns:
+      array: shape (1+len(values), nfiles, nbins), the counts followed by the
+      sums of every quantity.
+
+    """
+    good = ibin >= 0
+    idx  = ifile[good] * nbins + ibin[good]
+    size = nfiles * nbins
+    sums = [np.bincount(idx, minlength=size)]
+    sums += [np.bincount(idx, weights=v[good], minlength=size) for v in values]
+    return np.array(sums, dtype=float).reshape(-1, nfiles, nbins)
+
+
+def bootstrap_weights(nfiles,nres,rng):
+    """Return nres bootstrap resamples of the galaxy files as counts."""
+    return rng.multinomial(nfiles, np.full(nfiles, 1.0 / nfiles), size=nres).astype(float)
+
+
+def jackknife_weights(nfiles):
+    """Return the nfiles delete-one jackknife resamples of the galaxy files."""
+    return 1.0 - np.eye(nfiles)
+
+
+def resampled_profiles(W,sums):
+    """Return gc, gm and grat of every resample.
+
+    Args:
+      W (array): resample weights, shape (nres, nfiles).
+      sums (array): output of file_bin_sums for the color and mono values.
+
+    Returns:
+      array: shape (nres, 3*nbins), gc, gm and grat side by side.
+
+    """
+    n, sc, sm = np.einsum('rf,qfb->qrb', W, sums)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        gc = sc / n
+        gm = sm / n
+        return np.concatenate([gc, gm, gc / gm], axis=1)
+
+
+def _resampled_block(args):
+    """Worker: apply one block of resample weights."""
+    W, sums = args
+    return resampled_profiles(W, sums)
+
+
+def resample(sums,method='bootstrap',nboot=1000,seed=0,jobs=1):
+    """Compute the profiles of all the resamples of the galaxy files.
+
+    The weights of all the resamples are drawn here, so the result does not
+    depend on jobs.
+
+    Args:
+      sums (array): output of file_bin_sums for the color and mono values.
+      method (str): 'bootstrap' or 'jackknife'
+      nboot (int): number of bootstrap resamples.
+      seed (int): seed of the bootstrap resamples.
+      jobs (int): number of worker processes.
+
+    Returns:
+      array: shape (nres, 3*nbins), gc, gm and grat of every resample.
+
+    """
+    nfiles = sums.shape[1]
+    if method == 'bootstrap':
+        W = bootstrap_weights(nfiles, nboot, np.random.default_rng(seed))
+    else:
+        W = jackknife_weights(nfiles)
+    nblock = max(1, min(jobs, len(W)))
+    tasks  = [(w, sums) for w in np.array_split(W, nblock)]
+
+    if jobs > 1:
+        pool = multiprocessing.Pool(processes=nblock)
+        try:
+            blocks = pool.map(_resampled_block, tasks)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        blocks = [_resampled_block(t) for t in tasks]
+    return np.concatenate(blocks, axis=0)
+
+
+def covariance(samples,method):
+    """Return the covariance matrix of the resampled profiles.
+
+    A bin that is empty in a resample (or gm = 0 for grat) makes that value
+    NaN. Each element of the matrix uses the resamples where both of its
+    values are finite, so one sparse bin does not remove the resamples of
+    the others; the rows and columns of the values with fewer than 2 finite
+    resamples (e.g. a bin empty in every file) are NaN.
+
+    Raises:
+      ValueError: if no value has 2 finite resamples.
+
+    """
+    finite = np.isfinite(samples)
+    m = finite.astype(float)
+    n = m.T.dot(m)
+    if n.max() < 2:
+        raise ValueError('fewer than 2 resamples have a finite profile, '
+                         'the covariance cannot be computed')
+    # centred on the column means first, the covariance does not depend on it
+    x = np.where(finite, samples, 0.0)
+    x -= np.where(finite, x.sum(axis=0) / np.maximum(m.sum(axis=0), 1), 0.0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # means of i over the resamples where i and j are both finite
+        mean = x.T.dot(m) / n
+        dev2 = x.T.dot(x) - n * mean * mean.T
+        if method == 'jackknife':
+            cov = (n - 1.0) / n * dev2
+        else:
+            cov = dev2 / (n - 1.0)
+    return np.where(n >= 2, cov, np.nan)
+
+
+def resample_errors(z,methods=('bootstrap','jackknife'),nboot=1000,seed=0,jobs=1):
+    """Write resampled errors and covariance matrices of the shear profiles.
+
+    Args:
+      z (float): redshift e.g. 0.5, 0.7, 1.0, 1.5
+      methods (list): 'bootstrap' and/or 'jackknife'
+      nboot (int): number of bootstrap resamples.
+      seed (int): seed of the bootstrap resamples.
+      jobs (int): number of worker processes.
+
+    :Inputs: galshear_shear.cat
+
+    :Outputs: color_mono_galshear_shear_{method}.dat and
+      color_mono_galshear_shear_{method}_cov.dat
+
+    """
+    pwd = "galshear/galshear_cat_z{0}".format(z)
+    cat = catalog.read_cat(os.path.join(pwd,'galshear_shear.cat'))
+    if 'gfile' not in cat:
+        print('Error: galshear_shear.cat has no gfile column, run a03 and a04 with --engine numpy')
+        sys.exit(1)
+
+    ibin, cos2phi, sin2phi = etprofile.geometry(cat['x'])
+    edges = etprofile.bin_edges()
+    nbins = len(edges) - 1
+    files, ifile = np.unique(cat['gfile'].astype(int), return_inverse=True)
+    values = [etprofile.tangential(cat['cg_avg'],cos2phi,sin2phi),
+              etprofile.tangential(cat['mg_avg'],cos2phi,sin2phi)]
+    sums = file_bin_sums(ifile,ibin,values,len(files),nbins)
+    r = np.sqrt(edges[:-1] * edges[1:])
+
+    for method in methods:
+        samples = resample(sums,method,nboot,seed,jobs)
+        cov = covariance(samples,method)
+        err = np.sqrt(np.diag(cov)).reshape(len(QUANTITIES), nbins)
+        full = resampled_profiles(np.ones((1,len(files))),sums)[0].reshape(len(QUANTITIES), nbins)
+
+        ofile = os.path.join(pwd,'color_mono_galshear_shear_{}.dat'.format(method))
+        cols  = [r]
+        for q, g, e in zip(QUANTITIES, full, err):
+            cols += [g, e]
+        header = 'r  ' + '  '.join('{0} {0}err'.format(q) for q in QUANTITIES)
+        np.savetxt(ofile, np.column_stack(cols), fmt='%.10g', header=header)
+
+        cfile = os.path.join(pwd,'color_mono_galshear_shear_{}_cov.dat'.format(method))
+        header = '{} covariance of ({}), {} bins each, {} resamples of {} galaxy files'.format(
+                 method, ', '.join(QUANTITIES), nbins, len(samples), len(files))
+        np.savetxt(cfile, cov, fmt='%.10g', header=header)
+        print('Created : {}'.format(ofile))
+        print('Created : {}'.format(cfile))
+
+
+def main():
+    """Run main function."""
+    parser = argparse.ArgumentParser(description='Resampled errors of the shear profiles.')
+    parser.add_argument('z', type=float, help='redshift e.g. 0.7')
+    parser.add_argument('--method', choices=['bootstrap','jackknife','both'], default='both')
+    parser.add_argument('--nboot', type=int, default=1000, help='number of bootstrap resamples')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the bootstrap resamples')
+    parser.add_argument('-j', '--jobs', type=int, default=1, help='number of worker processes')
+    args = parser.parse_args()
+
+    methods = ['bootstrap','jackknife'] if args.method == 'both' else [args.method]
+    resample_errors(args.z,methods,args.nboot,args.seed,args.jobs)
+
+
+if __name__ == "__main__":
+    main()
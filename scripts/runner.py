@@ -0,0 +1,309 @@
+#!python
+# -*- coding: utf-8 -*-
+#
+# Date        : Oct 18, 2026
+"""
+.. note::
+
+    This module runs the imcat command chains without a shell.
+
+    A chain is a list of argv lists. Every program is started with
+    subprocess.Popen and the output of each one is copied to the input of
+    the next by a pump thread, which counts the bytes going through. Each
+    program is reaped with os.wait4, which gives its exit status and its
+    resource usage, so for every stage we know the wall time, the user and
+    system CPU time, the peak RSS and the number of bytes it wrote.
+
+    When a program fails the other programs of the chain are killed and
+    PipelineError names the failed program and shows the end of its
+    stderr. The stderr of all programs is still copied to our stderr.
+
+    parse() turns a one line shell pipeline like the ones of a02 into a
+    chain, with ``< file`` on the first program and ``> file`` on the last
+    one. Quotes are handled like the shell does; there is no globbing,
+    ``;``, ``&&`` or ``cd`` (use several calls and the cwd argument).
+
+:Usage: Typical use::
+
+    import runner
+    results = runner.run([['lc','+all','x = %rg %e[0] 2 vector'],
+                          ['fit2Dpolymodel2','x','4','1','cPg0']],
+                         stdin='galshear_cut.cat', stdout='galshear_cpg0.par')
+    results = runner.run_command("etprofile -e cg_avg < galshear_shear.cat | lc -O > c.dat")
+    print(runner.format_results(results))
+
+"""
+# Imports
+import collections
+import os
+import queue
+import shlex
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+BUFSIZE = 1 << 16
+
+StageResult = collections.namedtuple('StageResult',
+              ['name','argv','status','wall','user','sys','maxrss','bytes_out'])
+StageResult.__doc__ = """Resources used by one program of a chain.
+
+status is the exit status (negative for a signal), wall the seconds from
+the start of the chain to the exit of the program, user and sys the CPU
+seconds, maxrss the peak resident set size in kB and bytes_out the number
+of bytes written to stdout.
+"""
+
+
+class PipelineError(RuntimeError):
+    """A program of a chain failed."""
+
+    def __init__(self, result, stderr=''):
+        self.result = result
+        self.stderr = stderr
+        msg = '{} failed with exit status {}'.format(result.name, result.status)
+        if stderr.strip():
+            msg += ': ' + stderr.strip().splitlines()[-1]
+        super(PipelineError, self).__init__(msg)
+
+
+def parse(cmdline):
+    """Split a shell pipeline into argv lists and its input and output files.
+
+    Returns:
+      tuple: (stages, stdin, stdout), stdin and stdout are None without
+      redirection.
+
+    """
+    lexer = shlex.shlex(cmdline, posix=True, punctuation_chars='|<>;&')
+    lexer.whitespace_split = True
+    stages, argv = [], []
+    stdin = stdout = None
+    tokens = list(lexer)
+    k = 0
+    while k < len(tokens):
+        tok = tokens[k]
+        if tok == '|':
+            if not argv:
+                raise ValueError('empty program in {!r}'.format(cmdline))
+            stages.append(argv)
+            argv = []
+        elif tok in ('<', '>'):
+            if k + 1 >= len(tokens):
+                raise ValueError('missing file after {} in {!r}'.format(tok, cmdline))
+            if tok == '<':
+                if stages:
+                    raise ValueError('< only allowed on the first program: {!r}'.format(cmdline))
+                stdin = tokens[k + 1]
+            else:
+                stdout = tokens[k + 1]
+            k += 1
+        elif set(tok) <= set('|<>;&'):
+            raise ValueError('unsupported shell syntax {!r} in {!r}'.format(tok, cmdline))
+        else:
+            if stdout is not None:
+                raise ValueError('> only allowed on the last program: {!r}'.format(cmdline))
+            argv.append(tok)
+        k += 1
+    if not argv:
+        raise ValueError('empty program in {!r}'.format(cmdline))
+    stages.append(argv)
+    return stages, stdin, stdout
+
+
+def _pump(src, dst, counts, k, close_dst=True):
+    """Copy src to dst, counting the bytes in counts[k]."""
+    try:
+        while True:
+            block = src.read1(BUFSIZE) if hasattr(src, 'read1') else src.read(BUFSIZE)
+            if not block:
+                break
+            counts[k] += len(block)
+            try:
+                dst.write(block)
+            except (BrokenPipeError, ValueError):
+                break
+    finally:
+        src.close()
+        if close_dst:
+            try:
+                dst.close()
+            except BrokenPipeError:
+                pass
+        else:
+            dst.flush()
+
+
+def _drain_stderr(src, tail):
+    """Copy the stderr of a program to ours, keeping its last lines."""
+    out = getattr(sys.stderr, 'buffer', None)
+    for line in iter(src.readline, b''):
+        tail.append(line.decode('utf-8', 'replace'))
+        if out is not None:
+            out.write(line)
+            out.flush()
+    src.close()
+
+
+def run(stages, stdin=None, stdout=None, cwd=None):
+    """Run a chain of programs connected by pipes.
+
+    Args:
+      stages (list): argv list of every program.
+      stdin (str): file read by the first program (default: our stdin).
+      stdout (str): file written by the last program (default: our stdout).
+      cwd (str): working directory of the programs, also used for relative
+        stdin and stdout paths.
+
+    Returns:
+      list: a StageResult for every program.
+
+    Raises:
+      PipelineError: naming the first program that failed.
+
+    """
+    def path(f):
+        return f if cwd is None else os.path.join(cwd, f)
+
+    def not_run(argv, msg):
+        return PipelineError(StageResult(os.path.basename(argv[0]), list(argv), 127,
+                                         0.0, 0.0, 0.0, 0, 0), msg)
+
+    try:
+        fin = open(path(stdin), 'rb') if stdin is not None else None
+    except OSError as exc:
+        raise not_run(stages[0], str(exc))
+    try:
+        fout = open(path(stdout), 'wb') if stdout is not None else sys.stdout.buffer
+    except OSError as exc:
+        if fin is not None:
+            fin.close()
+        raise not_run(stages[-1], str(exc))
+    n = len(stages)
+    procs, threads, tails = [], [], []
+    counts = [0] * n
+    begin = time.time()
+    try:
+        for k, argv in enumerate(stages):
+            src = fin if k == 0 else subprocess.PIPE
+            p = subprocess.Popen(argv, stdin=src, stdout=subprocess.PIPE,
+                                 stderr=subprocess.PIPE, cwd=cwd)
+            procs.append(p)
+            tails.append(collections.deque(maxlen=20))
+            t = threading.Thread(target=_drain_stderr, args=(p.stderr, tails[k]))
+            t.daemon = True
+            t.start()
+            threads.append(t)
+            if k > 0:
+                t = threading.Thread(target=_pump, args=(procs[k-1].stdout, p.stdin, counts, k-1))
+                t.daemon = True
+                t.start()
+                threads.append(t)
+        t = threading.Thread(target=_pump, args=(procs[-1].stdout, fout, counts, n-1,
+                                                 stdout is not None))
+        t.daemon = True
+        t.start()
+        threads.append(t)
+    except OSError as exc:
+        for p in procs:
+            p.kill()
+            p.wait()
+        if fin is not None:
+            fin.close()
+        if stdout is not None:
+            fout.close()
+        raise not_run(stages[len(procs)], str(exc))
+    if fin is not None:
+        fin.close()
+
+    # Reap the programs in the order they exit and kill the others on failure.
+    exited = queue.Queue()
+    for k, p in enumerate(procs):
+        t = threading.Thread(target=_reap, args=(k, p, begin, exited))
+        t.daemon = True
+        t.start()
+        threads.append(t)
+    done = {}
+    failed = None
+    while len(done) < n:
+        k, code, wall, usage = exited.get()
+        done[k] = (code, wall, usage)
+        if code != 0 and code != -signal.SIGPIPE and failed is None:
+            failed = k
+            for j, p in enumerate(procs):
+                if j not in done and p.returncode is None:
+                    try:
+                        os.kill(p.pid, signal.SIGKILL)
+                    except OSError:
+                        pass
+
+    for t in threads:
+        t.join()
+
+    results = []
+    for k, argv in enumerate(stages):
+        code, wall, usage = done[k]
+        results.append(StageResult(os.path.basename(argv[0]), list(argv), code, wall,
+                                   usage.ru_utime, usage.ru_stime, usage.ru_maxrss, counts[k]))
+    if failed is None:
+        # a program killed by SIGPIPE is only an error if nothing after it failed:
+        # the programs after it exited 0 or were themselves killed by SIGPIPE
+        # (e.g. seq | grep 7 | head -3), and the last one exited 0
+        ok = (0, -signal.SIGPIPE)
+        for k in range(n - 1, -1, -1):
+            if (k < n - 1 and results[k].status == -signal.SIGPIPE and results[-1].status == 0
+                    and all(r.status in ok for r in results[k+1:])):
+                continue
+            if results[k].status != 0:
+                failed = k
+                break
+    if failed is not None:
+        raise PipelineError(results[failed], ''.join(tails[failed]))
+    return results
+
+
+def _reap(k, p, begin, exited):
+    """Wait for program k with os.wait4 and put its status and usage in exited."""
+    pid, status, usage = os.wait4(p.pid, 0)
+    p.returncode = os.waitstatus_to_exitcode(status)
+    exited.put((k, p.returncode, time.time() - begin, usage))
+
+
+def run_command(cmdline, cwd=None):
+    """Parse a one line shell pipeline with parse() and run it with run()."""
+    stages, stdin, stdout = parse(cmdline)
+    return run(stages, stdin, stdout, cwd)
+
+
+def format_results(results,first='status'):
+    """Return a table of StageResults, one line per program.
+
+    first is the title of the status column, 'runs' for summarize().
+    """
+    lines = ['{:<16s} {:>6s} {:>9s} {:>9s} {:>9s} {:>10s} {:>12s}'.format(
+             'program',first,'wall (s)','user (s)','sys (s)','maxrss kB','bytes out')]
+    for r in results:
+        lines.append('{:<16s} {:>6d} {:>9.2f} {:>9.2f} {:>9.2f} {:>10d} {:>12d}'.format(
+                     r.name, r.status, r.wall, r.user, r.sys, r.maxrss, r.bytes_out))
+    return '\n'.join(lines)
+
+
+def summarize(results):
+    """Sum StageResults by program, the most CPU consuming program first.
+
+    wall, user, sys and bytes_out are summed, maxrss is the largest one and
+    status counts the runs of the program.
+    """
+    totals = collections.OrderedDict()
+    for r in results:
+        t = totals.get(r.name)
+        if t is None:
+            totals[r.name] = StageResult(r.name, [], 1, r.wall, r.user, r.sys, r.maxrss,
+                                         r.bytes_out)
+        else:
+            totals[r.name] = StageResult(r.name, [], t.status + 1, t.wall + r.wall,
+                                         t.user + r.user, t.sys + r.sys,
+                                         max(t.maxrss, r.maxrss), t.bytes_out + r.bytes_out)
+    return sorted(totals.values(), key=lambda t: -(t.user + t.sys))
@@ -0,0 +1,298 @@
+#!python
+# -*- coding: utf-8 -*-
+#
+# Date        : Oct 18, 2026
+"""
+.. note::
+
+    This module measures Gaussian weighted shapes of all the objects of a
+    catalog at once, like the IMCAT program ``getshapes``.
+
+    The stamps around the objects are cut out of the image into one array
+    of shape (nobjects, w, w) by indexing the image with the pixel indices of
+    all the stamps at once, and every moment is a sum over the last two axes.
+    Only the stamp pixels are read, so the image may be a memory map.
+    Objects are processed in groups of similar rg (the stamp size grows with
+    rg) and in chunks of at most ``chunk_pixels`` stamp pixels, so that the
+    memory used does not depend on the size of the stamps: a stamp is 257
+    pixels wide for rg near 20.
+
+    With theta the position relative to the object centre, W = exp(-theta^2
+    / 2 rg^2) and f the image minus the sky, the weighted moments are::
+
+      T     = sum W theta^2 f
+      eta   = (theta_1^2 - theta_2^2, 2 theta_1 theta_2)
+      e     = sum W eta f / T
+      d     = sum W theta f / sum W f          (centroid offset)
+
+    The shear and smear polarizabilities of Kaiser, Squires & Broadhurst
+    (1995), in the notation of Hoekstra et al. (1998), with W' and W'' the
+    derivatives of W with respect to theta^2 (W' = -W / 2 rg^2,
+    W'' = W / 4 rg^4)::
+
+      psh[a][b] = sum (2 W theta^2 delta_ab + 2 W' eta_a eta_b) f / T
+                  - e_a sum (2 W + 2 W' theta^2) eta_b f / T
+      psm[a][b] = sum ((W + 2 W' theta^2) delta_ab + W'' eta_a eta_b) f / T
+                  - e_a sum (2 W' + W'' theta^2) eta_b f / T
+
+    psm is normalized for a PSF whose trace free second moments are
+    (p_1, p_2) / 2; only the ratios psm inv(psm*) of psf_correction use it.
+
+    Positions x are (column, row) with the centre of pixel [i, j] at
+    x = (j + 0.5, i + 0.5), the IMCAT convention also used by peaks.py
+    (peaks.PIXEL_CENTRE).
+
+    refine_centroids moves every object by 2 d until the step is below tol
+    or maxiter steps were made. The factor 2 (as for the windowed positions
+    of SExtractor) makes the step exact for a Gaussian object as wide as the
+    weight, which rg of peaks.py matches; with d alone each step only halves
+    the offset. Only the objects that have
+    not converged are measured again at each step, and the number of steps,
+    the total shift dx and a converged flag are kept for every object.
+
+:Usage: Typical use, the shapes of a catalog with x and rg::
+
+    python shapes.py in.cat out.cat              # image from fits_name
+    python shapes.py in.cat out.cat -f lsst90_z0.7_0.fits
+    python shapes.py in.cat out.cat --refine --tol 0.001 --maxiter 10
+
+"""
+# Imports
+import argparse
+
+import numpy as np
+
+import catalog
+import peaks
+
+# stamp half size in units of rg
+NSIGMA  = 4.0
+CHUNK_PIXELS = 1 << 20
+
+# centroid refinement
+TOL     = 1e-3
+MAXITER = 10
+
+
+def stamp_sizes(rg,nsigma=NSIGMA):
+    """Return the stamp half size of every object, rounded up to a power of two."""
+    half = np.maximum(np.ceil(nsigma * np.asarray(rg)), 1)
+    return (2 ** np.ceil(np.log2(half))).astype(int)
+
+
+def extract_stamps(image,x,half):
+    """Cut the stamps of half size half around the positions x.
+
+    Only the pixels of the stamps are read, so image may be a memory map of
+    a fitsfile. Pixels outside the image are zero.
+
+    Args:
+      image (array): 2-D image.
+      x (array): positions (column, row), shape (n,2).
+      half (int): stamp half size, the stamps are (2*half+1) pixels wide.
+
+    Returns:
+      tuple: (stamps, u, v). stamps has shape (n, w, w); u and v, of shape
+      (n, w), are the column and row offsets of the stamp pixels from x.
+
+    """
+    ny, nx = image.shape
+    c  = x - peaks.PIXEL_CENTRE
+    ix = np.rint(c[:,0]).astype(int)
+    iy = np.rint(c[:,1]).astype(int)
+    k  = np.arange(-half, half + 1)
+    rows = iy[:,None] + k
+    cols = ix[:,None] + k
+    stamps = np.asarray(image[np.clip(rows, 0, ny - 1)[:,:,None],
+                              np.clip(cols, 0, nx - 1)[:,None,:]], dtype=np.float64)
+    inside = ((rows >= 0) & (rows < ny))[:,:,None] & ((cols >= 0) & (cols < nx))[:,None,:]
+    stamps[~inside] = 0.0
+    u = (ix - c[:,0])[:,None] + k
+    v = (iy - c[:,1])[:,None] + k
+    return stamps, u, v
+
+
+def moments(stamps,u,v,rg):
+    """Return the weighted shapes of a batch of stamps.
+
+    Args:
+      stamps (array): sky subtracted stamps, shape (n, w, w).
+      u, v (array): column and row offsets of the pixels, shape (n, w).
+      rg (array): Gaussian weight scales, shape (n,).
+
+    Returns:
+      dict: e (n,2), psh (n,2,2), psm (n,2,2), d (n,2) and flux (n,), the
+      weighted flux sum W f.
+
+    """
+    s2 = (np.asarray(rg, dtype=float) ** 2)[:,None,None]
+    uu = u[:,None,:]
+    vv = v[:,:,None]
+    r2 = uu*uu + vv*vv
+    W  = np.exp(-0.5 * r2 / s2)
+    W1 = -W / (2 * s2)
+    W2 = W / (4 * s2 * s2)
+    eta = [uu*uu - vv*vv, 2 * uu * vv]
+
+    def total(a):
+        return np.einsum('nij,nij->n', np.broadcast_to(a, stamps.shape), stamps)
+
+    flux = total(W)
+    T    = total(W * r2)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        e = np.stack([total(W * eta[a]) for a in range(2)], axis=1) / T[:,None]
+        d = np.stack([total(W * uu), total(W * vv)], axis=1) / flux[:,None]
+
+        psh = np.empty((len(T), 2, 2))
+        psm = np.empty((len(T), 2, 2))
+        for b in range(2):
+            esh = total((2 * W + 2 * W1 * r2) * eta[b]) / T
+            esm = total((2 * W1 + W2 * r2) * eta[b]) / T
+            for a in range(2):
+                xsh = total(2 * W1 * eta[a] * eta[b] + (2 * W * r2 if a == b else 0)) / T
+                xsm = total(W2 * eta[a] * eta[b] + (W + 2 * W1 * r2 if a == b else 0)) / T
+                psh[:,a,b] = xsh - e[:,a] * esh
+                psm[:,a,b] = xsm - e[:,a] * esm
+    return {'e': e, 'psh': psh, 'psm': psm, 'd': d, 'flux': flux}
+
+
+def measure(image,x,rg,sky=0.0,nsigma=NSIGMA,chunk_pixels=CHUNK_PIXELS):
+    """Measure the shapes of all the objects of an image.
+
+    Args:
+      image (array): 2-D image (may be a memory map).
+      x (array): positions (column, row), shape (n,2).
+      rg (array): Gaussian weight scales, shape (n,).
+      sky (float or array): sky level, e.g. per object from getsky.
+      nsigma (float): stamp half size in units of rg.
+      chunk_pixels (int): maximum number of stamp pixels measured at a time,
+        at least one object is measured at a time whatever its stamp size.
+
+    Returns:
+      dict: the arrays of moments() for all the objects, in input order.
+
+    """
+    x   = np.asarray(x, dtype=float)
+    rg  = np.asarray(rg, dtype=float)
+    sky = np.broadcast_to(np.asarray(sky, dtype=float), rg.shape)
+    n   = len(rg)
+    out = {'e': np.zeros((n,2)), 'psh': np.zeros((n,2,2)), 'psm': np.zeros((n,2,2)),
+           'd': np.zeros((n,2)), 'flux': np.zeros(n)}
+    if n == 0:
+        return out
+
+    half = stamp_sizes(rg,nsigma)
+    for h in np.unique(half):
+        idx = np.nonzero(half == h)[0]
+        w = 2 * int(h) + 1
+        step = max(1, chunk_pixels // (w * w))
+        for start in range(0, len(idx), step):
+            sel = idx[start:start + step]
+            stamps, u, v = extract_stamps(image,x[sel],int(h))
+            res = moments(stamps - sky[sel,None,None],u,v,rg[sel])
+            for k, val in res.items():
+                out[k][sel] = val
+    return out
+
+
+def refine_centroids(image,x,rg,sky=0.0,tol=TOL,maxiter=MAXITER,nsigma=NSIGMA,
+                     chunk_pixels=CHUNK_PIXELS):
+    """Move the objects to their weighted centroids until they converge.
+
+    Args:
+      image (array): 2-D image.
+      x (array): starting positions (column, row), shape (n,2).
+      rg (array): Gaussian weight scales, shape (n,).
+      sky (float or array): sky level.
+      tol (float): an object has converged when its step |d| < tol pixels.
+      maxiter (int): maximum number of steps.
+
+    Returns:
+      dict: x (refined positions), dx (x minus the starting x), niter (steps
+      made) and converged (1.0 or 0.0). Objects whose centroid can not be
+      measured (no weighted flux) or that leave the image stop where they
+      are, unconverged.
+
+    """
+    x0  = np.asarray(x, dtype=float)
+    x   = x0.copy()
+    rg  = np.asarray(rg, dtype=float)
+    sky = np.broadcast_to(np.asarray(sky, dtype=float), rg.shape)
+    niter     = np.zeros(len(rg))
+    converged = np.zeros(len(rg), dtype=bool)
+
+    ny, nx = np.shape(image)
+    active = np.arange(len(rg))
+    for _ in range(maxiter):
+        xa = x[active]
+        active = active[(xa[:,0] > 0) & (xa[:,0] < nx) & (xa[:,1] > 0) & (xa[:,1] < ny)]
+        if active.size == 0:
+            break
+        d = measure(image,x[active],rg[active],sky[active],nsigma,chunk_pixels)['d']
+        d = 2 * d
+        ok = np.all(np.isfinite(d), axis=1)
+        x[active[ok]] += d[ok]
+        niter[active[ok]] += 1
+        done = ok & (np.hypot(d[:,0], d[:,1]) < tol)
+        converged[active[done]] = True
+        active = active[ok & ~done]
+
+    return {'x': x, 'dx': x - x0, 'niter': niter, 'converged': converged.astype(float)}
+
+
+def refine_catalog(cat,image,tol=TOL,maxiter=MAXITER,nsigma=NSIGMA,chunk_pixels=CHUNK_PIXELS):
+    """Return a copy of cat with refined x and the object items niter and converged.
+
+    The sky is taken from the object item fs (getsky) when cat has it.
+    """
+    sky = cat['fs'] if 'fs' in cat else 0.0
+    res = refine_centroids(image,cat['x'],cat['rg'],sky,tol,maxiter,nsigma,chunk_pixels)
+    out = cat.copy()
+    for k in ['x','niter','converged']:
+        out[k] = res[k]
+    return out
+
+
+def getshapes(cat,image,nsigma=NSIGMA,chunk_pixels=CHUNK_PIXELS):
+    """Return a copy of cat with the object items e, psh, psm and d of image.
+
+    The sky is taken from the object item fs (getsky) when cat has it.
+    """
+    sky = cat['fs'] if 'fs' in cat else 0.0
+    res = measure(image,cat['x'],cat['rg'],sky,nsigma,chunk_pixels)
+    out = cat.copy()
+    for k in ['e','psh','psm','d']:
+        out[k] = res[k]
+    return out
+
+
+def main():
+    """Run main function."""
+    parser = argparse.ArgumentParser(description='Weighted shapes of the objects of a catalog.')
+    parser.add_argument('icat', help='input catalog with x and rg')
+    parser.add_argument('ocat', help='output catalog')
+    parser.add_argument('-f', dest='fitsfile', help='image (default: header item fits_name)')
+    parser.add_argument('--nsigma', type=float, default=NSIGMA,
+                        help='stamp half size in units of rg')
+    parser.add_argument('--refine', action='store_true',
+                        help='refine the centroids before measuring the shapes')
+    parser.add_argument('--tol', type=float, default=TOL,
+                        help='centroid step (pixels) below which an object has converged')
+    parser.add_argument('--maxiter', type=int, default=MAXITER,
+                        help='maximum number of centroid steps')
+    args = parser.parse_args()
+
+    cat = catalog.read_cat(args.icat)
+    fitsfile = args.fitsfile or cat.header['fits_name']
+    image = peaks.read_image(fitsfile)
+    if args.refine:
+        cat = refine_catalog(cat,image,args.tol,args.maxiter,args.nsigma)
+    out = getshapes(cat,image,args.nsigma)
+    out.history.append('shapes.py {} -f {}{}'.format(args.icat,fitsfile,
+                       ' --refine' if args.refine else ''))
+    catalog.write_cat(args.ocat,out)
+    print('Created : {} ({} objects)'.format(args.ocat,len(out)))
+
+
+if __name__ == "__main__":
+    main()
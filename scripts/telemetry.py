@@ -0,0 +1,329 @@
+#!python
+# -*- coding: utf-8 -*-
+#
+# Date        : Oct 18, 2026
+"""
+.. note::
+
+    This module records what every stage of a run costs.
+
+    A stage is run inside ``telemetry.stage(name, z)``. When it ends one JSON
+    line is appended to telemetry/run_{run}.jsonl with the wall time, the
+    user and system CPU time of this process and of its children (the imcat
+    programs and the a02 worker processes), the peak RSS, and the number of
+    objects and bytes the stage read and wrote.
+
+    The stage reports its files with ``telemetry.current().add_input(path)``
+    and ``add_output(path)``. The bytes are the file sizes; the objects are
+    the rows of .cat and .store files and the data lines of .dat files (give
+    ``objects=`` when the count is already known).
+
+    All the stages of one process belong to the same run. Set
+    SHEAR_TELEMETRY_RUN to put several processes in one run, and
+    SHEAR_TELEMETRY_DIR to write somewhere else than ./telemetry.
+
+    CPU time and peak RSS come from resource.getrusage, so they cover the
+    whole process: when stages run at the same time in one process (the
+    worker threads of pipeline.py) they are marked ``"overlap": true`` and
+    their CPU times include each other.
+
+:Usage: Record a stage, then look at the runs::
+
+    with telemetry.stage('a05', z) as t:
+        t.add_input('galshear/galshear_cat_z0.7/galshear_shear.cat')
+        ...
+
+    python telemetry.py list
+    python telemetry.py summary                    # the last run
+    python telemetry.py summary 20261018-101500-4242
+    python telemetry.py compare OLD_RUN NEW_RUN
+
+"""
+# Imports
+import argparse
+import contextlib
+import glob
+import json
+import os
+import resource
+import socket
+import sys
+import threading
+import time
+
+TELEMETRY_DIR = os.environ.get('SHEAR_TELEMETRY_DIR', 'telemetry')
+RUN_ID = os.environ.get('SHEAR_TELEMETRY_RUN') or '{}-{}'.format(
+         time.strftime('%Y%m%d-%H%M%S'), os.getpid())
+
+_lock   = threading.Lock()
+_local  = threading.local()
+_active = set()
+
+
+def count_objects(path):
+    """Return the number of objects of a .cat, .dat or .store file (None otherwise).
+
+    The rows of a binary catalog are counted from its size and the number of
+    columns of its header, the data lines of the text files one by one.
+    """
+    if path.endswith('.store'):
+        import catstore
+        return sum(b['nrows'] for b in catstore.CatStore(path).gfiles().values())
+    if not path.endswith(('.cat', '.dat')):
+        return None
+    offset = 0
+    if path.endswith('.cat'):
+        import catalog
+        try:
+            _, layout, offset, filetype = catalog.read_header(path)
+        except ValueError:
+            # not an IMCAT catalog, count its lines
+            offset, filetype = 0, catalog.ASCII
+        if filetype == catalog.BINARY:
+            ncols = sum(item[3] for item in layout)
+            return (os.path.getsize(path) - offset) // (8 * ncols) if ncols else 0
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        return sum(1 for line in f if line.strip() and not line.startswith(b'#'))
+
+
+class Stage(object):
+    """Resources used by one stage, see stage()."""
+
+    def __init__(self, name, z=None, **extra):
+        self.name  = name
+        self.z     = z
+        self.extra = extra
+        self.objects_in = self.objects_out = 0
+        self.bytes_in   = self.bytes_out   = 0
+        self.overlap = False
+
+    def _add(self, paths, objects):
+        if isinstance(paths, str):
+            paths = [paths]
+        nbytes, nobjects = 0, 0
+        for path in paths:
+            if os.path.exists(path):
+                nbytes += os.path.getsize(path)
+                if objects is None:
+                    nobjects += count_objects(path) or 0
+        return nbytes, (nobjects if objects is None else objects)
+
+    def add_input(self, paths=(), objects=None):
+        """Add files read by the stage (objects counted unless given)."""
+        nbytes, nobjects = self._add(paths, objects)
+        self.bytes_in   += nbytes
+        self.objects_in += nobjects
+
+    def add_output(self, paths=(), objects=None):
+        """Add files written by the stage (objects counted unless given)."""
+        nbytes, nobjects = self._add(paths, objects)
+        self.bytes_out   += nbytes
+        self.objects_out += nobjects
+
+
+def current():
+    """Return the innermost running stage of this thread.
+
+    Outside of any stage a Stage that is never recorded is returned, so
+    the stages can always report their files.
+    """
+    stack = getattr(_local, 'stack', None)
+    return stack[-1] if stack else Stage(None)
+
+
+def _usage():
+    """Return (user, sys, maxrss, children maxrss) of this process and its children."""
+    me = resource.getrusage(resource.RUSAGE_SELF)
+    ch = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return (me.ru_utime + ch.ru_utime, me.ru_stime + ch.ru_stime,
+            me.ru_maxrss, ch.ru_maxrss)
+
+
+@contextlib.contextmanager
+def stage(name, z=None, echo=False, **extra):
+    """Record a stage, the extra keywords (e.g. engine) are written with it.
+
+    With echo the record is also printed in one line when the stage ends.
+
+    Yields:
+      Stage: to report the files and objects read and written.
+
+    """
+    t = Stage(name, z, **extra)
+    with _lock:
+        for other in _active:
+            other.overlap = True
+        t.overlap = bool(_active)
+        _active.add(t)
+    if not hasattr(_local, 'stack'):
+        _local.stack = []
+    _local.stack.append(t)
+
+    status = 'failed'
+    start = time.time()
+    user0, sys0, _, _ = _usage()
+    try:
+        yield t
+        status = 'ok'
+    finally:
+        wall = time.time() - start
+        user1, sys1, maxrss, ch_maxrss = _usage()
+        _local.stack.pop()
+        with _lock:
+            _active.discard(t)
+        record = {'run': RUN_ID, 'stage': name, 'z': z, 'status': status,
+                  'start': start, 'wall': wall,
+                  'cpu_user': user1 - user0, 'cpu_sys': sys1 - sys0,
+                  'maxrss_kb': maxrss, 'children_maxrss_kb': ch_maxrss,
+                  'objects_in': t.objects_in, 'objects_out': t.objects_out,
+                  'bytes_in': t.bytes_in, 'bytes_out': t.bytes_out,
+                  'overlap': t.overlap, 'host': socket.gethostname(),
+                  'pid': os.getpid(), 'extra': t.extra}
+        try:
+            write(record)
+        except OSError as exc:
+            print('telemetry: cannot write {}: {}'.format(run_path(), exc))
+        if echo:
+            print('\n{}{}: wall {:.2f} s, cpu {:.2f} s, {} objects in, {} out ({})'.format(
+                  name, ' z={}'.format(z) if z is not None else '', wall,
+                  record['cpu_user'] + record['cpu_sys'], t.objects_in, t.objects_out,
+                  run_path()))
+
+
+def run_path(run=None):
+    """Return the JSON lines file of a run (default this process's run)."""
+    return os.path.join(TELEMETRY_DIR, 'run_{}.jsonl'.format(run or RUN_ID))
+
+
+def write(record):
+    """Append one record to the file of its run."""
+    line = json.dumps(record) + '\n'
+    with _lock:
+        if not os.path.isdir(TELEMETRY_DIR):
+            os.makedirs(TELEMETRY_DIR, exist_ok=True)
+        with open(run_path(record['run']), 'a') as f:
+            f.write(line)
+
+
+def runs():
+    """Return the run ids found in TELEMETRY_DIR, oldest first."""
+    files = glob.glob(os.path.join(TELEMETRY_DIR, 'run_*.jsonl'))
+    files.sort(key=os.path.getmtime)
+    return [os.path.basename(f)[len('run_'):-len('.jsonl')] for f in files]
+
+
+def read(run):
+    """Return the records of a run."""
+    with open(run_path(run)) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def aggregate(records):
+    """Sum the records of a run by (stage, z).
+
+    Returns:
+      dict: (stage, z) -> dict of summed wall, cpu, objects and bytes, the
+      largest RSS, the number of records and of failed records.
+
+    """
+    totals = {}
+    for r in records:
+        key = (r['stage'], r['z'])
+        t = totals.setdefault(key, {'count': 0, 'failed': 0, 'wall': 0.0, 'cpu': 0.0,
+                                    'maxrss_kb': 0, 'objects_in': 0, 'objects_out': 0,
+                                    'bytes_in': 0, 'bytes_out': 0, 'overlap': False})
+        t['count']  += 1
+        t['failed'] += r['status'] != 'ok'
+        t['wall']   += r['wall']
+        t['cpu']    += r['cpu_user'] + r['cpu_sys']
+        t['maxrss_kb'] = max(t['maxrss_kb'], r['maxrss_kb'], r['children_maxrss_kb'])
+        for k in ('objects_in','objects_out','bytes_in','bytes_out'):
+            t[k] += r[k]
+        t['overlap'] = t['overlap'] or r['overlap']
+    return totals
+
+
+def _key(key):
+    """Sort (stage, z) with z None first."""
+    return key[0], -1.0 if key[1] is None else key[1]
+
+
+def _zname(z):
+    return '' if z is None else '{}'.format(z)
+
+
+def summary(run):
+    """Return the table of a run by stage and redshift."""
+    totals = aggregate(read(run))
+    lines = ['run {}'.format(run),
+             '{:<6s} {:>5s} {:>6s} {:>9s} {:>9s} {:>10s} {:>11s} {:>11s} {:>9s} {:>9s} {:>10s}'.format(
+             'stage','z','status','wall (s)','cpu (s)','maxrss MB','objects in','objects out',
+             'MB in','MB out','objects/s')]
+    for key in sorted(totals, key=_key):
+        t = totals[key]
+        status = 'ok' if not t['failed'] else '{} fail'.format(t['failed'])
+        rate = t['objects_in'] / t['wall'] if t['wall'] > 0 else 0.0
+        lines.append('{:<6s} {:>5s} {:>6s} {:>9.2f} {:>9.2f} {:>10.1f} {:>11d} {:>11d} {:>9.1f} {:>9.1f} {:>10.0f}{}'.format(
+                     key[0], _zname(key[1]), status, t['wall'], t['cpu'], t['maxrss_kb'] / 1024.,
+                     t['objects_in'], t['objects_out'], t['bytes_in'] / 1e6, t['bytes_out'] / 1e6,
+                     rate, ' *' if t['overlap'] else ''))
+    if any(t['overlap'] for t in totals.values()):
+        lines.append('* ran at the same time as other stages of the process, cpu includes them')
+    return '\n'.join(lines)
+
+
+def compare(old, new):
+    """Return the table of the wall and cpu times of two runs by stage and redshift."""
+    a, b = aggregate(read(old)), aggregate(read(new))
+    lines = ['{} -> {}'.format(old, new),
+             '{:<6s} {:>5s} {:>10s} {:>10s} {:>7s} {:>10s} {:>10s} {:>7s}'.format(
+             'stage','z','old wall','new wall','ratio','old cpu','new cpu','ratio')]
+
+    def ratio(x, y):
+        return '{:7.2f}'.format(y / x) if x > 0 else '{:>7s}'.format('-')
+
+    def value(t, k):
+        return '{:10.2f}'.format(t[k]) if t is not None else '{:>10s}'.format('-')
+
+    for key in sorted(set(a) | set(b), key=_key):
+        ta, tb = a.get(key), b.get(key)
+        both = ta is not None and tb is not None
+        lines.append('{:<6s} {:>5s} {} {} {} {} {} {}'.format(
+                     key[0], _zname(key[1]), value(ta,'wall'), value(tb,'wall'),
+                     ratio(ta['wall'], tb['wall']) if both else '{:>7s}'.format('-'),
+                     value(ta,'cpu'), value(tb,'cpu'),
+                     ratio(ta['cpu'], tb['cpu']) if both else '{:>7s}'.format('-')))
+    return '\n'.join(lines)
+
+
+def main():
+    """Run main function."""
+    parser = argparse.ArgumentParser(description='Summarize the telemetry of the runs.')
+    sub = parser.add_subparsers(dest='command')
+    sub.add_parser('list', help='list the runs')
+    p = sub.add_parser('summary', help='aggregate a run by stage and redshift')
+    p.add_argument('run', nargs='?', help='run id (default the last run)')
+    p = sub.add_parser('compare', help='compare two runs')
+    p.add_argument('old', help='run id of the reference run')
+    p.add_argument('new', nargs='?', help='run id (default the last run)')
+    args = parser.parse_args()
+
+    ids = runs()
+    if args.command == 'list':
+        for run in ids:
+            records = read(run)
+            print('{}  {:3d} stages  {:.1f} s'.format(run, len(records),
+                  sum(r['wall'] for r in records)))
+        return
+    if not ids:
+        print('No runs in {}'.format(TELEMETRY_DIR))
+        sys.exit(1)
+    if args.command == 'compare':
+        print(compare(args.old, args.new or ids[-1]))
+    else:
+        print(summary(getattr(args, 'run', None) or ids[-1]))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,12 @@
 #!python
 # -*- coding: utf-8 -*-
 """
-Run python scripts from a01 to a07.
+Run python scripts from a03 to a09.
+
+The stages run in this process through pipeline.py. Several redshifts can be
+given, their stages run concurrently with ``--workers``::
+
+    python z_a03_a09.py 0.5 0.7 1.0 1.5 --workers 4
 
 :Author:  Bhishan Poudel; Physics Graduate Student, Ohio University
 
@@ -12,22 +17,30 @@ Run python scripts from a01 to a07.
 """
 # Imports
 from __future__ import print_function, unicode_literals, division, absolute_import,with_statement
+import argparse
 import os,sys,time
 
+import pipeline
+
 # start time
 start_time = time.time()
 start_ctime = time.ctime()
 
 def main():
     """Run main function."""
-    z = float(sys.argv[1])
-    os.system('python a03_Pgamma_cat.py {z:.1f} '.format(z=z)) # 2 min
-    os.system('python a04_fitted_Pgamma.py {z:.1f} '.format(z=z)) # 30 secs
-    os.system('python a05_etprofile_cm_shear_ellip.py {z:.1f} '.format(z=z)) # 1 min.
-    os.system('python a06_cm_galshear_shear_ellip_dat.py {z:.1f} '.format(z=z)) # 1 sec.
-    os.system('python a07_cm_shear_ellip_cat.py {z:.1f} '.format(z=z)) # 1 seconds.
-    os.system('python a08_create_plots.py {z:.1f} '.format(z=z)) # 1 secs.
-    os.system('python a09_make_pdf.py {z:.1f} '.format(z=z)) # 1 secs.
+    parser = argparse.ArgumentParser(description='Run a03 to a09 for one or more redshifts.')
+    parser.add_argument('z', type=float, nargs='+', help='redshifts e.g. 0.7')
+    parser.add_argument('-w', '--workers', type=int, default=1,
+                        help='maximum number of stages running at the same time')
+    parser.add_argument('--engine', choices=['imcat','numpy'], default='imcat',
+                        help='engine of a03 ... a05')
+    args = parser.parse_args()
+
+    # a03: 2 min, a04: 30 secs, a05: 1 min, a06 ... a09: 1 sec each.
+    results = pipeline.run_pipeline(args.z,pipeline.parse_stages('a03-a09'),args.workers,
+                                    engine=args.engine)
+    if any(r['status'] not in ('done','cached') for r in results.values()):
+        sys.exit(1)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,11 @@
+# -*- coding: utf-8 -*-
+"""The modules of scripts/ import each other by bare name, as when they are run
+from that folder."""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for folder in ['scripts', 'radius_to_shear', 'benchmarks']:
+    path = os.path.join(ROOT, folder)
+    if path not in sys.path:
+        sys.path.insert(0, path)
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""Build cache records shared by several writers."""
+import multiprocessing
+import os
+
+import buildcache
+
+
+def write_outputs(path, names):
+    cache = buildcache.BuildCache(path)
+    for name in names:
+        out = os.path.join(os.path.dirname(path), name)
+        with open(out, 'w') as f:
+            f.write(name)
+        cache.record([out], 'fp-' + name)
+
+
+def test_two_caches_keep_both_records(tmp_path):
+    path = str(tmp_path / buildcache.CACHE_NAME)
+    a = buildcache.BuildCache(path)
+    b = buildcache.BuildCache(path)
+    for cache, name in [(a, 'a.cat'), (b, 'b.cat')]:
+        out = str(tmp_path / name)
+        with open(out, 'w') as f:
+            f.write(name)
+        cache.record([out], 'fp')
+    records = buildcache.BuildCache(path).records
+    assert sorted(os.path.basename(k) for k in records) == ['a.cat', 'b.cat']
+
+    b.forget([str(tmp_path / 'a.cat')])
+    assert list(buildcache.BuildCache(path).records) == [os.path.normpath(str(tmp_path / 'b.cat'))]
+
+
+def test_processes_keep_all_records(tmp_path):
+    path = str(tmp_path / buildcache.CACHE_NAME)
+    procs = [multiprocessing.Process(target=write_outputs,
+                                     args=(path, ['{}_{}.cat'.format(p, k) for k in range(20)]))
+             for p in range(4)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+    assert all(p.exitcode == 0 for p in procs)
+    cache = buildcache.BuildCache(path)
+    assert len(cache.records) == 80
+    out = str(tmp_path / '3_19.cat')
+    assert cache.is_fresh([out], 'fp-3_19.cat')
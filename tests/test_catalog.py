@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""Round trips of catalog.write_cat and catalog.read_cat."""
+import warnings
+
+import numpy as np
+import pytest
+
+import catalog
+
+
+def make_catalog(n=50, seed=0):
+    rng = np.random.default_rng(seed)
+    cat = catalog.Catalog()
+    cat['x']  = rng.uniform(0, 3400, (n,2))
+    cat['rg'] = rng.uniform(1, 6, n)
+    cat['Pg'] = rng.normal(0, 1, (n,2,2))
+    cat.header['psrat'] = np.array([0.3])
+    cat.header['fname'] = 'cPg0'
+    cat.history.append('hfindpeaks lsst_z0.7_0.fits -r 0.5 20')
+    return cat
+
+
+@pytest.mark.parametrize('binary', [False, True])
+def test_round_trip(tmp_path, binary):
+    cat = make_catalog()
+    path = str(tmp_path / 'a.cat')
+    catalog.write_cat(path, cat, binary=binary)
+    back = catalog.read_cat(path)
+    assert back.keys() == cat.keys()
+    for k in cat.keys():
+        assert back[k].shape == cat[k].shape
+        np.testing.assert_allclose(back[k], cat[k], rtol=1e-9)
+    assert back.header['fname'] == 'cPg0'
+    np.testing.assert_allclose(back.header['psrat'], [0.3])
+    assert back.history == cat.history
+
+
+def test_full_width_numbers(tmp_path):
+    # '%16.10g' fills all 16 characters with these, the columns must not run together
+    values = np.array([[-1.234567891e-05, -9.876543210e-12, -1.111111111e+30],
+                       [-2.5e-300, 1.0, -3.141592654e-07]])
+    assert all(len('%16.10g' % v) == 16 for v in values[0])
+    cat = catalog.Catalog([('v', values)])
+    path = str(tmp_path / 'wide.cat')
+    catalog.write_cat(path, cat)
+    back = catalog.read_cat(path)
+    assert back['v'].shape == values.shape
+    np.testing.assert_allclose(back['v'], values, rtol=1e-9)
+
+
+@pytest.mark.parametrize('binary', [False, True])
+def test_empty_catalog(tmp_path, binary):
+    cat = catalog.Catalog([('x', np.empty((0,2))), ('rg', np.empty(0))])
+    path = str(tmp_path / 'empty.cat')
+    catalog.write_cat(path, cat, binary=binary)
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        back = catalog.read_cat(path)
+    assert len(back) == 0
+    assert back.keys() == ['x', 'rg']
+
+
+def test_file_type_from_the_format_line(tmp_path):
+    # float64 rows whose bytes are all digits look like text
+    cat = catalog.Catalog([('rg', np.frombuffer(b'12345678' * 3, dtype=np.float64))])
+    path = str(tmp_path / 'digits.cat')
+    catalog.write_cat(path, cat, binary=True)
+    assert catalog.read_header(path)[3] == catalog.BINARY
+    np.testing.assert_array_equal(catalog.read_cat(path)['rg'], cat['rg'])
+
+    catalog.write_cat(path, cat)
+    assert catalog.read_header(path)[3] == catalog.ASCII
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""Columnar catalog stores."""
+import os
+
+import numpy as np
+import pytest
+
+import a03_Pgamma_cat as a03
+import catalog
+import catstore
+
+
+def galaxy_cat(n, seed):
+    rng = np.random.default_rng(seed)
+    return catalog.Catalog([('x', rng.uniform(0, 3400, (n,2))), ('rg', rng.uniform(1, 5, n))])
+
+
+def test_compact_keeps_empty_galaxy_files(tmp_path):
+    store = catstore.CatStore.create(str(tmp_path / 'g.store'))
+    store.append(galaxy_cat(5, 0), 0, 'old')
+    store.append(galaxy_cat(0, 1), 1, 'empty')
+    store.append(galaxy_cat(4, 2), 2, 'two')
+    new = galaxy_cat(3, 3)
+    store.append(new, 0, 'new')
+
+    store.compact()
+    assert len(store.blocks) == 3
+    again = catstore.CatStore(store.path)
+    assert again.fingerprints() == {0: 'new', 1: 'empty', 2: 'two'}
+    assert [b['nrows'] for b in again.blocks] == [3, 0, 4]
+    np.testing.assert_array_equal(next(again.chunks(gfiles=[0]))['x'], new['x'])
+
+
+def test_a03_store_removes_the_partial_cut(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    z = 0.7
+    os.makedirs('galshear/galshear_cat_z{}'.format(z))
+    store = catstore.CatStore(catstore.store_path(z))
+    store.append(galaxy_cat(5, 0), 0)
+    store.append(galaxy_cat(5, 1), 1)
+
+    calls = []
+
+    def cut_mask(cat, converged):
+        calls.append(len(cat))
+        if len(calls) == 2:
+            raise RuntimeError('interrupted')
+        return np.ones(len(cat), dtype=bool)
+
+    monkeypatch.setattr(a03, 'cut_mask', cut_mask)
+    with pytest.raises(RuntimeError):
+        a03.bigcat_cutcat_stream(z, store=True)
+    cut = catstore.store_path(z, 'galshear_cut')
+    assert not os.path.exists(cut + '.part')
+    assert not os.path.exists(cut)
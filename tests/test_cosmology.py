@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""Tabulated distances of cosmology.py."""
+import numpy as np
+import pytest
+
+import cosmology
+
+Z = np.array([0.0, 0.05, 0.3, 0.7, 1.0, 1.5, 3.0, 9.5])
+
+
+@pytest.fixture(autouse=True)
+def table_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(cosmology, 'COSMOLOGY_DIR', str(tmp_path))
+
+
+def simpson(z, n=20000):
+    """Comoving distance by Simpson's rule with n intervals for every z."""
+    out = []
+    for zz in np.atleast_1d(z):
+        t = np.linspace(0.0, zz, n + 1)
+        f = 1.0 / cosmology.E(t)
+        out.append((zz / n / 3) * (f[0] + f[-1] + 4 * f[1:-1:2].sum() + 2 * f[2:-1:2].sum()))
+    return cosmology.c / cosmology.Hubble * np.array(out)
+
+
+def test_table_matches_the_integral():
+    cosmo = cosmology.Cosmology()
+    ref = simpson(Z)
+    np.testing.assert_allclose(cosmo.comoving_distance(Z), ref, rtol=1e-6, atol=1e-6)
+
+
+def test_table_matches_quad():
+    integrate = pytest.importorskip('scipy.integrate')
+    cosmo = cosmology.Cosmology()
+    ref = [cosmology.c / cosmology.Hubble *
+           integrate.quad(lambda t: 1.0 / cosmology.E(t), 0, z)[0] for z in Z]
+    np.testing.assert_allclose(cosmo.comoving_distance(Z), ref, rtol=1e-6, atol=1e-6)
+
+
+def test_einstein_de_sitter():
+    cosmo = cosmology.Cosmology(Omega_m=1.0, Omega_d=0.0)
+    ref = 2 * cosmology.c / cosmology.Hubble * (1 - 1 / np.sqrt(1 + Z))
+    np.testing.assert_allclose(cosmo.comoving_distance(Z), ref, rtol=1e-6, atol=1e-6)
+
+
+def test_distances_and_saved_table():
+    cosmo = cosmology.Cosmology()
+    D_s, D_ds = cosmo.distances(0.3, [0.2, 0.7])
+    D_c = simpson([0.2, 0.3, 0.7])
+    np.testing.assert_allclose(D_s, [D_c[0] / 1.2, D_c[2] / 1.7], rtol=1e-6)
+    np.testing.assert_allclose(D_ds, [0.0, (D_c[2] - D_c[1]) / 1.7], rtol=1e-6, atol=1e-9)
+    with pytest.raises(ValueError):
+        cosmo.comoving_distance(cosmology.ZMAX + 1)
+    # the second cosmology reads the table written by the first
+    again = cosmology.Cosmology()
+    np.testing.assert_array_equal(again.D_c, cosmo.D_c)
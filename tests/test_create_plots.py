@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""Pdf of the eight panels of a08 drawn with matplotlib."""
+import os
+import re
+
+import numpy as np
+from matplotlib.backends import backend_pdf
+
+import a06_cm_galshear_shear_ellip_dat as a06
+import a08_create_plots as a08
+import catalog
+
+
+def cm_files(z):
+    """Write color_mono_galshear_{shear,ellip}.dat and .cat of a06 for redshift z."""
+    pwd = 'galshear/galshear_cat_z{}'.format(z)
+    os.makedirs(pwd)
+    r = np.geomspace(20, 1500, 12)
+    rng = np.random.default_rng(1)
+    for kind in ['shear', 'ellip']:
+        values = [r, np.log(r), np.full(len(r), 100.0)]
+        for k in range(4):
+            values.append(0.01 + 0.001 * rng.normal(size=len(r)) if k % 2 == 0
+                          else np.full(len(r), 0.001))
+        a06.write_cm('{}/color_mono_galshear_{}'.format(pwd, kind),
+                     catalog.Catalog(zip(a06.cm_columns(kind), values)), kind)
+
+
+def test_one_page_per_panel(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    pages = []
+
+    class CountingPdfPages(backend_pdf.PdfPages):
+        def close(self):
+            pages.append(self.get_pagecount())
+            super().close()
+
+    monkeypatch.setattr(backend_pdf, 'PdfPages', CountingPdfPages)
+    for z in [0.5, 0.7]:
+        cm_files(z)
+    a08.run_all([0.5, 0.7], 'numpy')
+
+    assert pages == [len(a08.PANELS)] * 2 and len(a08.PANELS) == 8
+    for z in [0.5, 0.7]:
+        path = a08.pdf_path(z)
+        assert os.listdir(os.path.dirname(path)) == [os.path.basename(path)]
+        with open(path, 'rb') as f:
+            pdf = f.read()
+        assert pdf.startswith(b'%PDF') and len(re.findall(rb'/Type\s*/Page\b', pdf)) == 8
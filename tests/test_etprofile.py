@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""Tangential profiles of etprofile.py."""
+import numpy as np
+
+import etprofile
+
+
+def tangential_sample(n, gt, seed=0):
+    """Positions about ORIGIN with ellipticities of tangential component gt."""
+    rng = np.random.default_rng(seed)
+    r   = np.exp(rng.uniform(np.log(etprofile.RMIN), np.log(etprofile.RMAX), n))
+    phi = rng.uniform(0, 2*np.pi, n)
+    x   = np.column_stack([r*np.cos(phi), r*np.sin(phi)]) + etprofile.ORIGIN
+    e   = -gt * np.column_stack([np.cos(2*phi), np.sin(2*phi)])
+    return x, e + rng.normal(0, 0.01, (n,2))
+
+
+def test_kappa_uses_the_cut_last_bin():
+    edges = etprofile.bin_edges()
+    nbins = len(edges) - 1
+    et  = np.full(nbins, 0.1)
+    err = np.full(nbins, 0.01)
+    prof = etprofile.profile_columns(np.ones(nbins), et, err)
+    # constant et: kappa = 2 et ln(rmax / rkappa)
+    np.testing.assert_allclose(prof[:,6], 0.2 * np.log(etprofile.RMAX / edges[:-1]))
+    width = np.diff(np.log(edges))
+    np.testing.assert_allclose(prof[-1,7], 2 * 0.01 * width[-1])
+    assert width[-1] < etprofile.DLNR
+
+
+def test_recovers_the_tangential_shear():
+    x, e = tangential_sample(20000, 0.05)
+    prof = etprofile.etprofiles(x, {'e': e})['e']
+    assert np.all(prof[:,2] > 0)
+    np.testing.assert_allclose(prof[:,3], 0.05, atol=5 * prof[:,4].max())
+    # rotating the ellipticities by 45 degrees gives no tangential signal
+    cross = etprofile.etprofiles(x, {'e': e[:,::-1] * [1,-1]})['e']
+    assert np.all(np.abs(cross[:,3]) < 5 * cross[:,4] + 1e-12)
+
+
+def test_accumulator_matches_the_stacked_profile(tmp_path):
+    parts = [tangential_sample(2000, 0.05, seed=k) for k in range(3)]
+    acc = etprofile.ProfileAccumulator(['e'])
+    for k, (x, e) in enumerate(parts):
+        acc.add(k, x, {'e': e})
+    acc.remove(1)
+    x = np.concatenate([parts[0][0], parts[2][0]])
+    e = np.concatenate([parts[0][1], parts[2][1]])
+    ref = etprofile.etprofiles(x, {'e': e})['e']
+    np.testing.assert_allclose(acc.profiles()['e'], ref, rtol=1e-9, atol=1e-12)
+
+    path = str(tmp_path / 'sums.npz')
+    acc.save(path)
+    np.testing.assert_allclose(etprofile.ProfileAccumulator.load(path).profiles()['e'], ref)
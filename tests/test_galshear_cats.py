@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+"""Galaxy catalogs of a02 with the imcat programs faked."""
+import os
+import threading
+
+import numpy as np
+
+import a02_galshear_cats as a02
+import catalog
+import peaks
+import psf_correction
+import runner
+import shapes
+import synthetic
+
+
+def write_fits(path, image):
+    """Write image as the float32 primary image of a fitsfile."""
+    cards = ['SIMPLE  = {:>20s}'.format('T'), 'BITPIX  = {:>20d}'.format(-32),
+             'NAXIS   = {:>20d}'.format(2), 'NAXIS1  = {:>20d}'.format(image.shape[1]),
+             'NAXIS2  = {:>20d}'.format(image.shape[0]), 'END']
+    header = ''.join(c.ljust(80) for c in cards).encode('ascii')
+    data = np.asarray(image, dtype='>f4').tobytes()
+    with open(path, 'wb') as f:
+        f.write(header.ljust(2880, b' '))
+        f.write(data + b'\0' * (-len(data) % 2880))
+
+
+def test_map_image(tmp_path):
+    image, _ = synthetic.make_image(5, size=64, seed=1)
+    path = str(tmp_path / 'lsst_z0.7_0.fits')
+    write_fits(path, image)
+    mapped = peaks.map_image(path)
+    assert isinstance(mapped, np.memmap) and mapped.shape == (64, 64)
+    np.testing.assert_array_equal(mapped, image.astype(np.float32))
+
+
+def test_forced_measure_runs_the_images_concurrently(tmp_path, monkeypatch):
+    images, fitsfiles = [], []
+    for k, x in enumerate(['c9', 'm', 'm9']):
+        image, truth = synthetic.make_image(30, size=256, seed=3, index=k, noise=0.0)
+        fitsfiles.append(str(tmp_path / '{}.fits'.format(x)))
+        write_fits(fitsfiles[-1], image)
+        images.append(image.astype(np.float32))
+
+    # the objects of lsst with the psf model of psf10.par
+    n = len(truth)
+    ccat = catalog.Catalog([('x', truth['x']), ('rg', truth['rg']), ('fs', np.full(n, 100.0)),
+                            ('mag', np.zeros(n))])
+    stmod = np.tile([1.0, 0.0, 0.0, 1.0, 0.5, 0.0, 0.0, 0.5, 0.01, -0.02, 0.0], (n, 1))
+    ccat['stmod'] = stmod
+    cfile = str(tmp_path / 'galshear_z0.7_0_c.cat')
+    catalog.write_cat(cfile, ccat)
+
+    # apphot -f: a magnitude per image, all three must be running at once
+    barrier = threading.Barrier(3, timeout=10)
+
+    def run_command(cmdline, cwd=None):
+        stages, stdin, stdout = runner.parse(cmdline)
+        assert stages[0][0] == 'apphot' and stdin == cfile
+        fitsfile = stages[0][stages[0].index('-f') + 1]
+        cat = catalog.read_cat(stdin)
+        cat['mag'] = np.full(len(cat), float(fitsfiles.index(fitsfile)))
+        catalog.write_cat(stdout, cat)
+        barrier.wait()
+        return []
+
+    monkeypatch.setattr(runner, 'run_command', run_command)
+
+    for engine in ['imcat', 'numpy']:
+        ofile = str(tmp_path / 'galshear_z0.7_0.cat.{}'.format(engine))
+        a02.forced_measure(cfile, list(zip(['c9', 'm', 'm9'], fitsfiles)), ofile, engine)
+        # the outputs of apphot are removed
+        assert not [f for f in os.listdir(str(tmp_path)) if f.startswith('galshear_z0.7_0_c.cat.')]
+
+        out = catalog.read_cat(ofile)
+        assert len(out) == n
+        ccat = catalog.read_cat(cfile)
+        for k, x in enumerate(['c9', 'm', 'm9']):
+            res = shapes.measure(images[k], ccat['x'], ccat['rg'], sky=100.0)
+            np.testing.assert_array_equal(out[x + 'mag'], k)
+            if engine == 'numpy':
+                np.testing.assert_allclose(out[x + 'e'], res['e'], rtol=1e-8, atol=1e-12)
+                np.testing.assert_allclose(out[x + 'psh'], res['psh'], rtol=1e-8, atol=1e-12)
+                np.testing.assert_allclose(out[x + 'stmod'], stmod)
+            else:
+                Pg, e = psf_correction.correct(res['psh'], res['psm'], res['e'], stmod)
+                np.testing.assert_allclose(out[x + 'e'], e, rtol=1e-8, atol=1e-12)
+                np.testing.assert_allclose(out[x + 'Pg'], Pg, rtol=1e-8, atol=1e-12)
+        # the plain items are those of the last image
+        np.testing.assert_array_equal(out['mag'], 2)
+        np.testing.assert_array_equal(out['e'], out['m9e'])
+
+
+def jedisim_outputs(indir, z, i, image):
+    """Write image as the four fitsfiles of galaxy index i."""
+    for path in a02.galaxy_fitsfiles(z, i, indir):
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        write_fits(path, image)
+
+
+def test_measure_numpy_runs_no_getshapes(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs('psf')
+    open('psf/psf10.par', 'w').close()
+    os.makedirs('galshear/galshear_cat_z0.7')
+    image, truth = synthetic.make_image(20, size=400, seed=5, noise=0.0)
+    jedisim_outputs('jout', 0.7, 0, image)
+    stmod = [1.0, 0.0, 0.0, 1.0, 0.5, 0.0, 0.0, 0.5, 0.01, -0.02, 0.0]
+
+    # hfindpeaks ... cleancat 5 finds the objects a pixel off, apphot adds
+    # mag and gen2Dpolymodel the psf model
+    commands = []
+
+    def run_command(cmdline, cwd=None):
+        commands.append(cmdline)
+        stages, stdin, stdout = runner.parse(cmdline)
+        if stages[-1][0] == 'cleancat':
+            x = np.floor(truth['x']) + 0.5
+            cat = catalog.Catalog([('x', x), ('rg', truth['rg']), ('fs', np.full(len(x), 100.0)),
+                                   ('ox', x)])
+        else:
+            cat = catalog.read_cat(stdin)
+            cat['mag'] = np.zeros(len(cat))
+            if stages[-1][0] == 'gen2Dpolymodel':
+                cat['stmod'] = np.tile(stmod, (len(cat), 1))
+        catalog.write_cat(stdout, cat)
+        return []
+
+    monkeypatch.setattr(runner, 'run_command', run_command)
+    i, ofile, error, fp, cached, cat, timings = a02.galshear_cat(
+        0.7, 0, 'jout', 'galshear/galshear_cat_z0.7', engine='numpy', refine='numpy',
+        measure='numpy', forced='parallel')
+    assert error is None and not cached
+    assert sorted(os.listdir('galshear/galshear_cat_z0.7')) == ['galshear_z0.7_0.cat']
+
+    # getshapes only runs before cleancat
+    assert [c for c in commands if 'getshapes' in c] == commands[:1]
+    out = catalog.read_cat(ofile)
+    assert np.all(out['converged'] == 1)
+    # the isolated objects converge to their true position
+    sep = np.hypot(*(truth['x'][:,None] - truth['x'][None]).transpose(2, 0, 1))
+    alone = np.sort(sep, axis=1)[:,1] > 40
+    assert alone.sum() > 5
+    np.testing.assert_allclose(out['x'][alone], truth['x'][alone], atol=0.01)
+    np.testing.assert_allclose(out['dx'], out['x'] - np.floor(truth['x']) - 0.5, atol=1e-8)
+    for x in ['c', 'c9', 'm', 'm9']:
+        np.testing.assert_allclose(out[x + 'e'], out['ce'], atol=1e-8)
+        assert out[x + 'Pg'].shape == (len(truth), 2, 2)
+
+
+def test_watch_builds_and_restarts(tmp_path, monkeypatch):
+    import a05_etprofile_cm_shear_ellip as a05
+    import galstats
+
+    monkeypatch.chdir(tmp_path)
+    os.makedirs('psf')
+    open('psf/psf10.par', 'w').close()
+    outdir = 'galshear/galshear_cat_z0.7'
+
+    def appear(indices):
+        for i in indices:
+            for path in a02.galaxy_fitsfiles(0.7, i, 'jout'):
+                if not os.path.isdir(os.path.dirname(path)):
+                    os.makedirs(os.path.dirname(path))
+                with open(path, 'w') as f:
+                    f.write('image {}'.format(i))
+
+    # the catalog of galaxy file 3 can not be made
+    built = []
+
+    def galshear_cat(z, i, indir, outdir, *args):
+        built.append(i)
+        ofile = outdir + '/galshear_z{}_{:d}.cat'.format(z, i)
+        if i == 3:
+            return i, ofile, 'imcat pipeline failed: getshapes', 'fp', False, None, []
+        catalog.write_cat(ofile, synthetic.galshear_catalog(1500, seed=4, gfile=i))
+        return i, ofile, None, 'fp{}'.format(i), False, None, []
+
+    monkeypatch.setattr(a02, 'galshear_cat', galshear_cat)
+
+    appear([0, 1, 2, 3])
+    failures = a02.watch(0.7, 0, 5, 'jout', poll=0, idle=0.2)
+    assert sorted(built) == [0, 1, 2, 3]
+    assert failures == [(3, 'imcat pipeline failed: getshapes')]
+
+    sums = galstats.GalaxySums.load(os.path.join(outdir, galstats.SUMS_NAME))
+    assert sorted(sums.files) == [0, 1, 2]
+    for ofile, ename in a05.PROFILES:
+        assert os.path.isfile(os.path.join(outdir, galstats.running_name(ofile)))
+
+    # after a restart only the new and the failed indices are built
+    del built[:]
+    appear([4])
+    failures = a02.watch(0.7, 0, 5, 'jout', poll=0, idle=0.2)
+    assert sorted(built) == [3, 4]
+    assert [i for i, error in failures] == [3]
+    sums = galstats.GalaxySums.load(os.path.join(outdir, galstats.SUMS_NAME))
+    assert sorted(sums.files) == [0, 1, 2, 4]
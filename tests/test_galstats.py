@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""Per galaxy file sums of galstats.py."""
+import os
+
+import numpy as np
+import pytest
+
+import a03_Pgamma_cat as a03
+import catalog
+import galstats
+import polymodel
+import synthetic
+
+Z = 0.7
+
+
+@pytest.fixture
+def cats(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    paths = synthetic.make_galshear_cats(Z, 3000, 4, seed=2)
+    return [(i, p) for i, p in enumerate(paths)]
+
+
+def totals(sums):
+    return dict((k, np.array(v, copy=True)) for k, v in sums.total.items())
+
+
+def test_fit_matches_create_pars_numpy(cats):
+    sums = galstats.GalaxySums()
+    for i, path in cats:
+        sums.add(i, catalog.read_cat(path))
+    a, rms, nobjects = sums.fit()
+
+    a03.bigcat_cutcat_stream(Z)
+    a03.create_pars_numpy(Z)
+    pwd = 'galshear/galshear_cat_z{}'.format(Z)
+    cut = catalog.read_cat(os.path.join(pwd, 'galshear_cut.cat'))
+    assert nobjects == len(cut)
+    for (x, k), ak, rk in zip(galstats.MODELS, a, rms):
+        path = os.path.join(pwd, 'galshear_{}pg{}.par'.format(x, k))
+        par = polymodel.read_par(path)
+        # the normal equations of rg**4 are ill-conditioned, the models agree better
+        np.testing.assert_allclose(ak, par['a'], rtol=1e-5, atol=1e-9)
+        model = polymodel.evaluate(np.array([ak, par['a']]), cut['rg'], cut[x+'e'][:,k], 4, 1)
+        np.testing.assert_allclose(model[0], model[1], rtol=1e-8)
+        header = catalog.read_header(path)[0].header
+        np.testing.assert_allclose(rk, header['rms'], rtol=1e-6)
+
+
+def test_remove_and_add_again(cats):
+    sums = galstats.GalaxySums()
+    for i, path in cats:
+        sums.add(i, catalog.read_cat(path))
+    before = totals(sums)
+    profile = sums.profile.sums['ce_avg'].copy()
+
+    sums.remove(2)
+    assert sums.total['nfit'] < before['nfit']
+    sums.add(2, catalog.read_cat(cats[2][1]))
+    for k, v in before.items():
+        np.testing.assert_allclose(sums.total[k], v, rtol=1e-12, atol=1e-9)
+    np.testing.assert_allclose(sums.profile.sums['ce_avg'], profile, rtol=1e-12, atol=1e-12)
+    with pytest.raises(ValueError):
+        sums.add(2, catalog.read_cat(cats[2][1]))
+
+
+def test_save_and_load(cats, tmp_path):
+    sums = galstats.GalaxySums(converged=True, rmax=1000.0)
+    sums.sync(cats)
+    path = str(tmp_path / galstats.SUMS_NAME)
+    sums.save(path)
+
+    again = galstats.GalaxySums.load(path)
+    assert again.options == sums.options
+    assert again.stamps == sums.stamps
+    assert all(isinstance(s, tuple) and len(s) == 2 for s in again.stamps.values())
+    for k, v in sums.total.items():
+        np.testing.assert_allclose(again.total[k], v)
+    np.testing.assert_allclose(again.fit()[0], sums.fit()[0])
+    assert galstats.open_sums(path).options == galstats.GalaxySums().options
+    assert galstats.open_sums(path, converged=True, rmax=1000.0).files.keys() == sums.files.keys()
+
+
+def test_sync_by_stamp(cats):
+    sums = galstats.GalaxySums()
+    assert sums.sync(cats) == ([0, 1, 2, 3], [], [])
+    assert sums.sync(cats) == ([], [], [])
+
+    # a rewritten catalog is subtracted and added again, a missing one removed
+    cat = catalog.read_cat(cats[1][1])
+    catalog.write_cat(cats[1][1], cat.select(np.arange(len(cat)) < len(cat) // 2))
+    st = os.stat(cats[1][1])
+    os.utime(cats[1][1], ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    assert sums.sync(cats[:3]) == ([], [1], [3])
+
+    ref = galstats.GalaxySums()
+    for i, path in cats[:3]:
+        ref.add(i, catalog.read_cat(path))
+    for k, v in ref.total.items():
+        np.testing.assert_allclose(sums.total[k], v, rtol=1e-10, atol=1e-8)
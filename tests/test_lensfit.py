@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""SIS fits of lensfit.py on synthetic shear profiles."""
+import os
+
+import numpy as np
+
+import cosmology
+import etprofile
+import lensfit
+
+SIGMA, Z_LENS = 1000.0, 0.3
+
+
+def write_profiles(pwd, cosmo, redshifts, empty=()):
+    r = np.sqrt(etprofile.bin_edges()[:-1] * etprofile.bin_edges()[1:])
+    for k, z in enumerate(redshifts):
+        kc  = cosmo.kappa_constant(SIGMA, Z_LENS, z, lensfit.pix_scale)
+        # one redshift with fewer bins
+        rz  = r[:len(r) - k]
+        gt  = lensfit.reduced_shear(kc, rz)
+        err = 0.05 * gt
+        prof = np.zeros((len(rz), len(etprofile.COLUMNS)))
+        prof[:,0], prof[:,1], prof[:,2] = np.arange(len(rz)), rz, 100
+        prof[:,3], prof[:,4] = gt, err
+        prof[list(empty),2] = 0
+        os.makedirs(pwd.format(z))
+        for kind in ['color','mono']:
+            etprofile.write_profile(os.path.join(pwd.format(z), '{}_galshear_shear.dat'.format(kind)), prof)
+
+
+def test_recovers_the_lens(tmp_path, monkeypatch):
+    monkeypatch.setattr(cosmology, 'COSMOLOGY_DIR', str(tmp_path))
+    cosmo = cosmology.Cosmology()
+    redshifts = [0.5, 1.0, 1.5]
+    pwd = str(tmp_path / 'z{}')
+    write_profiles(pwd, cosmo, redshifts, empty=[1])
+
+    sigma  = np.linspace(800, 1200, 41)
+    z_lens = np.linspace(0.1, 0.5, 41)
+    res = lensfit.fit(redshifts, sigma, z_lens, pwd=pwd, cosmo=cosmo)
+    nbins = len(etprofile.bin_edges()) - 1
+    for kind in ['color','mono']:
+        r = res[kind]
+        assert r['joint_sigma'] == SIGMA
+        np.testing.assert_allclose(r['joint_z_lens'], Z_LENS)
+        assert r['joint_chi2_min'] < 1e-12
+        np.testing.assert_array_equal(r['ndof'], [nbins - 2, nbins - 3, nbins - 4])
+
+    # the chunks of sigma give the same surfaces
+    r, gt, err = lensfit.read_profiles(redshifts, 'color', pwd)
+    chi2, _ = lensfit.chi2_surfaces(r, gt, err, redshifts, sigma, z_lens, cosmo)
+    small, _ = lensfit.chi2_surfaces(r, gt, err, redshifts, sigma, z_lens, cosmo, chunk=1)
+    np.testing.assert_array_equal(chi2, small)
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""Object detection of peaks.py."""
+import numpy as np
+
+import peaks
+
+
+def galaxy_image(objects, size=512, seed=0, sky=100.0, noise=5.0):
+    """Return an image of round Gaussian objects, their positions and scales."""
+    rng  = np.random.default_rng(seed)
+    x    = rng.uniform(24, size - 24, (objects,2))
+    rg   = rng.uniform(1.5, 4.0, objects)
+    flux = rng.uniform(500.0, 5000.0, objects)
+    i, j = np.mgrid[0:size, 0:size]
+    image = sky + rng.normal(0, noise, (size,size))
+    for k in range(objects):
+        # the centre of pixel [i, j] is at (j + 0.5, i + 0.5)
+        r2 = (j + 0.5 - x[k,0])**2 + (i + 0.5 - x[k,1])**2
+        image += flux[k] / (2*np.pi*rg[k]**2) * np.exp(-0.5 * r2 / rg[k]**2)
+    return image, x, rg
+
+
+def test_finds_the_objects():
+    image, x, rg = galaxy_image(60, seed=1)
+    cat = peaks.find_peaks(image)
+    dist = np.hypot(*(x[:,None,:] - cat['x'][None,:,:]).transpose(2,0,1))
+    # blended neighbours aside, every object has a peak within 1.5 pixels
+    assert np.mean(dist.min(axis=1) < 1.5) >= 0.95
+    assert np.sum(dist.min(axis=0) > 3) <= 2
+    # and the best scale follows the size of the object
+    near = dist.argmin(axis=1)
+    assert np.corrcoef(rg, cat['rg'][near])[0,1] > 0.8
+
+
+def test_peak_at_the_pixel_centre():
+    # an object centred on pixel [40, 70] is at x = (70.5, 40.5) for IMCAT
+    image, x, rg = galaxy_image(0, size=128)
+    i, j = np.mgrid[0:128, 0:128]
+    image += 1000.0 * np.exp(-0.5 * ((j - 70)**2 + (i - 40)**2) / 2.5**2)
+    cat = peaks.find_peaks(image)
+    assert len(cat) == 1
+    np.testing.assert_array_equal(cat['x'], [[70.5, 40.5]])
+
+
+def test_noise_has_no_peaks():
+    rng = np.random.default_rng(0)
+    cat = peaks.find_peaks(100.0 + rng.normal(0, 5.0, (256,256)))
+    assert len(cat) <= 2
+
+
+def test_local_maxima_flat_top():
+    a = np.zeros((5,5))
+    a[1:3,1:3] = 1.0
+    iy, ix = peaks.local_maxima(a, 0.5)
+    assert list(zip(iy, ix)) == [(1, 1)]
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""Scheduling of the pipeline nodes."""
+import threading
+import time
+
+import pipeline
+import telemetry
+
+
+def test_fork_stages_run_alone_in_the_main_thread(tmp_path, monkeypatch):
+    monkeypatch.setattr(telemetry, 'TELEMETRY_DIR', str(tmp_path))
+    lock = threading.Lock()
+    active, log = [], []
+
+    def stage(name):
+        def run(z):
+            with lock:
+                active.append(name)
+                log.append((name, z, threading.current_thread() is threading.main_thread(),
+                            list(active)))
+            time.sleep(0.02)
+            with lock:
+                active.remove(name)
+        return run
+
+    funcs = dict((s, stage(s)) for s in pipeline.STAGES)
+    nodes, deps = pipeline.build_graph(['a01','a02','a03','a04'], [0.5, 0.7, 1.0])
+    results = pipeline.run_graph(nodes, deps, funcs, workers=3)
+
+    assert all(r['status'] == 'done' for r in results.values())
+    for name, z, main, others in log:
+        if name in pipeline.MAIN_THREAD_STAGES:
+            assert main and others == [name]
+
+    # without them the nodes run at the same time
+    del log[:]
+    nodes, deps = pipeline.build_graph(['a03','a04'], [0.5, 0.7, 1.0])
+    pipeline.run_graph(nodes, deps, funcs, workers=3)
+    assert max(len(others) for name, z, main, others in log) > 1
+
+
+def test_failure_skips_dependent_nodes(tmp_path, monkeypatch):
+    monkeypatch.setattr(telemetry, 'TELEMETRY_DIR', str(tmp_path))
+
+    def a02(z):
+        if z == 0.7:
+            raise RuntimeError('1 galaxy files failed')
+
+    funcs = dict((s, lambda z: None) for s in pipeline.STAGES)
+    funcs['a02'] = a02
+    nodes, deps = pipeline.build_graph(['a02','a03'], [0.5, 0.7])
+    results = pipeline.run_graph(nodes, deps, funcs, workers=2)
+    assert results[('a02',0.7)]['status'] == 'failed'
+    assert results[('a03',0.7)]['status'] == 'skipped'
+    assert results[('a03',0.5)]['status'] == 'done'
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""polymodel fits and par files."""
+import numpy as np
+import pytest
+
+import polymodel
+
+
+def models(n=2000, seed=0):
+    rng = np.random.default_rng(seed)
+    rg = rng.uniform(1.5, 6.0, n)
+    x1 = rng.normal(0, 0.3, (3,n))
+    # smaller coefficients for the higher powers of rg
+    a  = rng.normal(0, 1, (3,10)) * np.tile(10.0**-np.arange(5), 2)
+    y  = polymodel.evaluate(a, rg, x1, 4, 1)
+    return rg, x1, a, y
+
+
+def test_design_terms():
+    # a[j*(l0+1) + i] multiplies x0**i * x1**j
+    A = polymodel.design(np.array([2.0]), np.array([3.0]), 2, 1)
+    np.testing.assert_allclose(A[0], [1, 2, 4, 3, 6, 12])
+
+
+def test_fit_recovers_models():
+    rg, x1, a, y = models()
+    fit, rms = polymodel.fit(rg, x1, y, 4, 1)
+    np.testing.assert_allclose(polymodel.evaluate(fit, rg, x1, 4, 1), y, atol=1e-9)
+    assert np.all(rms < 1e-9)
+
+
+def test_fit_matches_lstsq():
+    rng = np.random.default_rng(1)
+    rg, x1, a, y = models()
+    y = y + rng.normal(0, 0.05, y.shape)
+    fit, rms = polymodel.fit(rg, x1, y, 4, 1)
+    for k in range(len(y)):
+        A = polymodel.design(rg, x1[k], 4, 1)
+        ref = np.linalg.lstsq(A, y[k], rcond=None)[0]
+        np.testing.assert_allclose(A.dot(fit[k]), A.dot(ref), atol=1e-8)
+        np.testing.assert_allclose(rms[k], np.sqrt(np.mean((y[k] - A.dot(ref))**2)), rtol=1e-6)
+
+
+def test_par_round_trip(tmp_path):
+    path = str(tmp_path / 'galshear_cpg0.par')
+    a = np.linspace(-1, 1, 10) * 1e-5
+    polymodel.write_par(path, a, 4, 1, 'cPg0', rms=0.05, nobjects=100)
+    par = polymodel.read_par(path)
+    np.testing.assert_array_equal(par['a'], a)
+    assert (par['l0'], par['l1'], par['fname'], par['xname']) == (4, 1, 'cPg0', 'x')
+    text = open(path).read()
+    assert 'history: fit2Dpolymodel2 x 4 1 cPg0' in text
+    assert 'writer' not in text
+
+
+def test_par_modes_in_any_order(tmp_path):
+    # the modes of a fit2Dpolymodel2 file listed with the power of x[1] first
+    path = tmp_path / 'galshear_cpg1.par'
+    l, m = polymodel.mode_powers(4, 1)
+    order = np.lexsort((m, l))
+    a = np.arange(1.0, 11.0)
+    line = '# number {:6d} {:8d} {} {}\n'
+    path.write_text('# 0 1 format\n'
+                    '# text      1        1 xname: x\n'
+                    '# text      1        1 fname: cPg1\n' +
+                    line.format(1, 1, 'l0', 4) + line.format(1, 1, 'l1', 1) +
+                    line.format(1, 1, 'nmodes', 10) +
+                    line.format(1, 10, 'l', ' '.join(str(v) for v in l[order])) +
+                    line.format(1, 10, 'm', ' '.join(str(v) for v in m[order])) +
+                    line.format(1, 10, 'a', ' '.join(str(v) for v in a[order])) +
+                    '# x[0] x[1]\n')
+    par = polymodel.read_par(str(path))
+    np.testing.assert_array_equal(par['a'], a)
+
+
+def test_not_a_par_file(tmp_path):
+    path = tmp_path / 'galshear_cpg0.par'
+    path.write_text('# 0 1 format\n# number 1 10 a 1 2 3 4 5 6 7 8 9 10\n# x[0] x[1]\n')
+    with pytest.raises(ValueError, match='not a fit2Dpolymodel2 par file'):
+        polymodel.read_par(str(path))
+
+
+def test_a04_imcat_takes_numpy_par(tmp_path, monkeypatch):
+    import a04_fitted_Pgamma as a04
+    import runner
+    monkeypatch.chdir(tmp_path)
+    pwd = tmp_path / 'galshear' / 'galshear_cat_z0.7'
+    pwd.mkdir(parents=True)
+    polymodel.write_par(str(pwd / 'galshear_mpg0.par'), np.zeros(10), 4, 1, 'mPg0')
+    chains = []
+    monkeypatch.setattr(runner, 'run_command', lambda cmd, cwd=None: chains.append(cmd) or [])
+    a04.fitted_Pgamma(0.7)
+    assert 'gen2Dpolymodel galshear_mpg0.par' in chains[0]
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""Psf fits of a01 with the imcat programs faked."""
+import os
+import threading
+
+import a01_psf10_par as a01
+import runner
+
+
+def fake_imcat(monkeypatch, barrier=None):
+    """Fake ic and the fit pipeline, return the (psf, noisy image) of every fit."""
+    runs = []
+
+    def run_command(cmdline, cwd=None):
+        stages, stdin, stdout = runner.parse(cmdline.strip())
+        if stages[0][0] == 'ic':
+            with open(stages[0][-1]) as f, open(stdout, 'w') as out:
+                out.write('noisy ' + f.read())
+            runs.append((stages[0][-1], stdout))
+        else:
+            assert stages[-1][0] == 'fit2Dpolymodel' and stdout.endswith('.par.part')
+            # the fit reads the noisy image and writes the .part file
+            assert os.path.isfile(stages[0][1])
+            if barrier is not None:
+                barrier.wait()
+            with open(stages[0][1]) as f, open(stdout, 'w') as out:
+                out.write('par of ' + f.read())
+        return []
+
+    monkeypatch.setattr(runner, 'run_command', run_command)
+    return runs
+
+
+def psfs(names):
+    os.makedirs('psf', exist_ok=True)
+    for name in names:
+        with open('psf/{}.fits'.format(name), 'w') as f:
+            f.write(name)
+    return ['psf/{}.fits'.format(name) for name in names]
+
+
+def test_fit_is_skipped_when_fresh(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    runs = fake_imcat(monkeypatch)
+    files = psfs(['psf10', 'psf11'])
+
+    assert a01.run(files) == []
+    assert sorted(psf for psf, noisy in runs) == files
+    with open('psf/psf11.par') as f:
+        assert f.read() == 'par of noisy psf11'
+
+    # up to date
+    del runs[:]
+    assert a01.run(files) == [] and runs == []
+    ofile, error, fp, cached = a01.fit_psf(files[0])
+    assert (ofile, error, cached) == ('psf/psf10.par', None, True)
+
+    # the key holds the psf and psrat
+    with open(files[1], 'w') as f:
+        f.write('psf11 changed')
+    del runs[:]
+    a01.run(files)
+    assert [psf for psf, noisy in runs] == [files[1]]
+    assert a01.fit_psf(files[0], psrat=0.5)[2] != fp
+
+    del runs[:]
+    a01.run(files, force=True)
+    assert sorted(psf for psf, noisy in runs) == files
+
+
+def test_parallel_fits_use_their_own_files(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    runs = fake_imcat(monkeypatch, threading.Barrier(2, timeout=10))
+    files = psfs(['psf10', 'psf11'])
+
+    errors = []
+
+    def fit(ffile):
+        try:
+            a01.par_lmst(ffile[:-5], a01.PSRAT, ffile, ffile[:-5] + '.par')
+        except Exception as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=fit, args=(f,)) for f in files]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+
+    noisy = [noisy for psf, noisy in runs]
+    assert len(set(os.path.dirname(f) for f in noisy)) == 2
+    assert not any(os.path.exists(os.path.dirname(f)) for f in noisy)
+    assert sorted(os.listdir('psf')) == ['psf10.fits', 'psf10.par', 'psf11.fits', 'psf11.par']
+    for name in ['psf10', 'psf11']:
+        with open('psf/{}.par'.format(name)) as f:
+            assert f.read() == 'par of noisy ' + name
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""PSF anisotropy correction of psf_correction.py against the lc expressions of a02."""
+import numpy as np
+
+import a02_galshear_cats as a02
+import catalog
+import psf_correction
+
+
+def lc_eval(expr, items):
+    """Evaluate the RPN expression of ``lc 'name = ...'`` for one object."""
+    stack = []
+    for tok in expr.strip("'").split('=', 1)[1].split():
+        if tok.startswith('%'):
+            name, _, index = tok[1:].partition('[')
+            value = np.asarray(items[name], dtype=float)
+            stack.append(value[int(index[:-1])] if index else value)
+        elif tok == 'vector':
+            n = int(stack.pop())
+            stack[-n:] = [np.array(stack[-n:])]
+        elif tok == 'inverse':
+            stack.append(np.linalg.inv(stack.pop()))
+        elif tok == 'dot':
+            b, a = stack.pop(), stack.pop()
+            stack.append(np.dot(a, b))
+        elif tok in ('msub', 'vsub'):
+            b, a = stack.pop(), stack.pop()
+            stack.append(a - b)
+        else:
+            stack.append(float(tok))
+    assert len(stack) == 1
+    return stack[0]
+
+
+def measurements(n, seed=0):
+    rng = np.random.default_rng(seed)
+    psh   = np.eye(2) + rng.normal(0, 0.2, (n,2,2))
+    psm   = np.eye(2) + rng.normal(0, 0.2, (n,2,2))
+    e     = rng.normal(0, 0.3, (n,2))
+    stmod = rng.normal(0, 0.1, (n,11))
+    stmod[:,4:8] += [1, 0, 0, 1]
+    return psh, psm, e, stmod
+
+
+def test_matches_the_lc_expressions():
+    psh, psm, e, stmod = measurements(50)
+    Pg, ec = psf_correction.correct(psh, psm, e, stmod)
+    for k in range(len(e)):
+        items = {'psh': psh[k], 'psm': psm[k], 'e': e[k], 'stmod': stmod[k]}
+        np.testing.assert_allclose(Pg[k], lc_eval(a02.LC_PG, items), rtol=1e-12, atol=1e-14)
+        np.testing.assert_allclose(ec[k], lc_eval(a02.LC_E, items), rtol=1e-12, atol=1e-14)
+
+
+def test_correct_catalog_columns():
+    n = 10
+    cat = catalog.Catalog()
+    for k, x in enumerate(psf_correction.PREFIXES):
+        cat[x+'psh'], cat[x+'psm'], cat[x+'e'], cat[x+'stmod'] = measurements(n, seed=k)
+    psh, psm, e, stmod = measurements(n, seed=1)
+    psf_correction.correct_catalog(cat)
+    for x in psf_correction.PREFIXES:
+        assert x+'psh' not in cat and x+'stmod' not in cat
+    Pg, ec = psf_correction.correct(psh, psm, e, stmod)
+    np.testing.assert_allclose(cat['c9Pg'], Pg)
+    np.testing.assert_allclose(cat['c9e'], ec)
+    assert cat['e'] is cat['m9e']
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""Resampled covariance of the shear profiles."""
+import numpy as np
+import pytest
+
+import resample
+
+
+def file_sums(nfiles=5, nbins=4, empty=(), seed=0):
+    rng = np.random.default_rng(seed)
+    n  = rng.integers(5, 20, (nfiles,nbins)).astype(float)
+    n[:, list(empty)] = 0
+    sc = n * 0.05 + rng.normal(0, 0.1, n.shape) * np.sqrt(n)
+    sm = n * 0.04 + rng.normal(0, 0.1, n.shape) * np.sqrt(n)
+    return np.array([n, sc, sm])
+
+
+@pytest.mark.parametrize('method', ['bootstrap', 'jackknife'])
+def test_matches_numpy_without_empty_bins(method):
+    sums = file_sums()
+    samples = resample.resample(sums, method, nboot=200)
+    cov = resample.covariance(samples, method)
+    ref = np.cov(samples, rowvar=False, bias=(method == 'jackknife'))
+    if method == 'jackknife':
+        ref = ref * (len(samples) - 1.0)
+    np.testing.assert_allclose(cov, ref, rtol=1e-8, atol=1e-14)
+
+
+def test_jackknife_with_an_empty_bin():
+    sums = file_sums(empty=[2])
+    samples = resample.resample(sums, 'jackknife')
+    cov = resample.covariance(samples, 'jackknife')
+    nbins = sums.shape[2]
+    bad = [q * nbins + 2 for q in range(3)]
+    good = [k for k in range(3 * nbins) if k not in bad]
+    assert np.all(np.isnan(cov[bad]))
+    assert np.all(np.isfinite(cov[np.ix_(good, good)]))
+    # the other bins are the same as without the empty one
+    ref = resample.covariance(samples[:, good], 'jackknife')
+    np.testing.assert_allclose(cov[np.ix_(good, good)], ref)
+
+
+def test_too_few_resamples():
+    with pytest.raises(ValueError, match='fewer than 2'):
+        resample.covariance(np.full((5, 3), np.nan), 'bootstrap')
+
+
+@pytest.mark.parametrize('method', ['bootstrap', 'jackknife'])
+def test_same_resamples_for_any_jobs(method):
+    sums = file_sums(nfiles=7)
+    one = resample.resample(sums, method, nboot=50, seed=3, jobs=1)
+    four = resample.resample(sums, method, nboot=50, seed=3, jobs=4)
+    np.testing.assert_array_equal(one, four)
+    other = resample.resample(sums, method, nboot=50, seed=4, jobs=1)
+    assert (method == 'jackknife') == np.array_equal(one, other)
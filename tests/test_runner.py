@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+"""Exit status of the pipelines of runner.run."""
+import shutil
+
+import pytest
+
+import runner
+
+pytestmark = pytest.mark.skipif(shutil.which('seq') is None, reason='needs seq, grep and head')
+
+
+def test_sigpipe_cascade_is_success(tmp_path):
+    out = str(tmp_path / 'out.txt')
+    results = runner.run([['seq','1','1000000'], ['grep','7'], ['head','-3']], stdout=out)
+    assert results[-1].status == 0
+    assert open(out).read().split() == ['7', '17', '27']
+
+
+def test_sigpipe_before_a_failure_is_an_error():
+    # seq and head may be killed by SIGPIPE, but the last program failed
+    with pytest.raises(runner.PipelineError, match='false failed'):
+        runner.run([['seq','1','1000000'], ['head','-3'], ['false']])
+
+
+def test_failure_in_the_middle():
+    with pytest.raises(runner.PipelineError, match='false failed'):
+        runner.run_command('seq 1 10 | false | cat')
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""Weighted shapes of shapes.py on images of Gaussian objects."""
+import numpy as np
+import pytest
+
+import peaks
+import shapes
+
+
+def gaussian_image(x, Q, flux, size, sky=0.0, noise=0.0, seed=0):
+    """Image of Gaussian objects at x with second moments Q, shape (n,2,2)."""
+    rng = np.random.default_rng(seed)
+    i, j = np.mgrid[0:size, 0:size]
+    image = sky + rng.normal(0, noise, (size,size)) if noise else np.full((size,size), sky)
+    for k in range(len(x)):
+        dx, dy = j + peaks.PIXEL_CENTRE - x[k,0], i + peaks.PIXEL_CENTRE - x[k,1]
+        det = np.linalg.det(Q[k])
+        chi = (Q[k,1,1]*dx*dx - 2*Q[k,0,1]*dx*dy + Q[k,0,0]*dy*dy) / det
+        image += flux[k] / (2*np.pi*np.sqrt(det)) * np.exp(-0.5 * chi)
+    return image
+
+
+def grid(n, step):
+    """Positions on a grid, off the pixel centres."""
+    a, b = np.mgrid[0:n, 0:n]
+    return np.column_stack([((b + 0.5) * step + 0.3 * a / n).ravel(),
+                            ((a + 0.5) * step + 0.2 * b / n).ravel()])
+
+
+def ellipses(n, seed=0):
+    """Scales rg and moments rg^2 (1 + e1, 1 - e1, e2) of n elliptical Gaussians."""
+    rng = np.random.default_rng(seed)
+    rg  = rng.uniform(1.5, 4.0, n)
+    e   = rng.uniform(-0.4, 0.4, (n,2))
+    Q   = rg[:,None,None]**2 * np.stack([np.stack([1 + e[:,0], e[:,1]], -1),
+                                         np.stack([e[:,1], 1 - e[:,0]], -1)], 1)
+    return rg, Q
+
+
+def weighted_ellipticity(Q, rg):
+    """Ellipticity of Gaussians of moments Q under a weight of scale rg."""
+    Qw = np.linalg.inv(np.linalg.inv(Q) + np.eye(2) / rg[:,None,None]**2)
+    return np.column_stack([Qw[:,0,0] - Qw[:,1,1], 2 * Qw[:,0,1]]) / (Qw[:,0,0] + Qw[:,1,1])[:,None]
+
+
+def test_shapes_of_elliptical_gaussians():
+    x = grid(8, 40)
+    rg, Q = ellipses(len(x))
+    image = gaussian_image(x, Q, np.full(len(x), 2000.0), 320, sky=100.0)
+    res = shapes.measure(image, x, rg, sky=100.0, chunk_pixels=5000)
+    # the chunks do not change the shapes
+    for k, v in shapes.measure(image, x, rg, sky=100.0).items():
+        np.testing.assert_array_equal(res[k], v)
+    np.testing.assert_allclose(res['e'], weighted_ellipticity(Q, rg), atol=0.01)
+    # the centroid offsets are small at the true positions
+    assert np.abs(res['d']).max() < 0.05
+
+
+@pytest.mark.parametrize('g', [(0.03, -0.02), (0.0, 0.05)])
+def test_recovers_the_shear(g):
+    # round Gaussians of scale s sheared by g: Q = s^2 (A A)^-1
+    s = 3.0
+    A = np.array([[1 - g[0], -g[1]], [-g[1], 1 + g[0]]])
+    x = grid(10, 40)
+    Q = np.broadcast_to(s * s * np.linalg.inv(A.dot(A)), (len(x),2,2))
+    image = gaussian_image(x, Q, np.full(len(x), 1000.0), 400)
+    res = shapes.measure(image, x, np.full(len(x), s))
+    # e = Psh g to first order in g
+    est = np.linalg.solve(res['psh'].mean(axis=0), res['e'].mean(axis=0))
+    np.testing.assert_allclose(est, g, atol=3e-4)
+
+
+def test_refine_centroids():
+    x = grid(8, 40)
+    rg, Q = ellipses(len(x), seed=1)
+    image = gaussian_image(x, Q, np.full(len(x), 2000.0), 320, sky=100.0)
+    res = shapes.refine_centroids(image, x + [0.7, -0.5], rg, sky=100.0)
+    np.testing.assert_allclose(res['x'], x, atol=0.05)
+    assert res['converged'].all()
+    assert res['niter'].max() < shapes.MAXITER
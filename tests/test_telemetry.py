@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""Object counts, aggregation and tables of the telemetry runs."""
+import numpy as np
+
+import catalog
+import telemetry
+
+
+def small_cat(n):
+    rng = np.random.default_rng(3)
+    return catalog.Catalog([('x', rng.normal(size=(n, 2))), ('rg', rng.uniform(1, 5, n))],
+                           history=['hfindpeaks lsst_z0.7_0.fits -r 0.5 20'])
+
+
+def test_count_objects(tmp_path):
+    cat = small_cat(5000)
+    for binary in [False, True]:
+        path = str(tmp_path / 'galshear_{}.cat'.format(int(binary)))
+        catalog.write_cat(path, cat, binary=binary)
+        assert telemetry.count_objects(path) == 5000
+
+    path = str(tmp_path / 'empty.cat')
+    catalog.write_cat(path, small_cat(0))
+    assert telemetry.count_objects(path) == 0
+
+    path = str(tmp_path / 'galshear_z0.7.dat')
+    with open(path, 'w') as f:
+        f.write('# z  rg  g\n0.7 1.0 0.01\n\n0.7 2.0 0.02\n')
+    assert telemetry.count_objects(path) == 2
+    assert telemetry.count_objects(str(tmp_path / 'lsst_z0.7_0.fits')) is None
+
+
+def record(stage, z, wall, cpu, status='ok', overlap=False, run='old', **counts):
+    r = {'run': run, 'stage': stage, 'z': z, 'status': status, 'start': 0.0,
+         'wall': wall, 'cpu_user': cpu, 'cpu_sys': 0.0, 'maxrss_kb': 1024,
+         'children_maxrss_kb': 2048, 'objects_in': 0, 'objects_out': 0,
+         'bytes_in': 0, 'bytes_out': 0, 'overlap': overlap, 'host': 'h',
+         'pid': 1, 'extra': {}}
+    r.update(counts)
+    return r
+
+
+def test_aggregate():
+    records = [record('a02', 0.7, 2.0, 1.5, objects_in=100, bytes_out=10),
+               record('a02', 0.7, 3.0, 2.5, status='failed', objects_in=50, bytes_out=5,
+                      overlap=True),
+               record('a03', 0.7, 1.0, 1.0, objects_out=7),
+               record('a07', None, 0.5, 0.25)]
+    totals = telemetry.aggregate(records)
+    assert set(totals) == {('a02', 0.7), ('a03', 0.7), ('a07', None)}
+    t = totals[('a02', 0.7)]
+    assert (t['count'], t['failed']) == (2, 1)
+    assert (t['wall'], t['cpu']) == (5.0, 4.0)
+    assert (t['objects_in'], t['bytes_out']) == (150, 15)
+    assert t['maxrss_kb'] == 2048 and t['overlap']
+    assert totals[('a03', 0.7)]['objects_out'] == 7
+    assert not totals[('a03', 0.7)]['overlap']
+
+
+def test_summary_and_compare(tmp_path, monkeypatch):
+    monkeypatch.setattr(telemetry, 'TELEMETRY_DIR', str(tmp_path))
+    for r in [record('a07', None, 0.5, 0.25),
+              record('a02', 1.0, 4.0, 3.0, objects_in=400),
+              record('a02', 0.7, 2.0, 1.0, objects_in=100, status='failed', overlap=True)]:
+        telemetry.write(r)
+    for r in [record('a02', 0.7, 1.0, 1.0, run='new'),
+              record('a03', 0.7, 1.0, 1.0, run='new')]:
+        telemetry.write(r)
+    assert sorted(telemetry.runs()) == ['new', 'old']
+
+    lines = telemetry.summary('old').splitlines()
+    assert lines[0] == 'run old'
+    rows = [line.split() for line in lines[2:5]]
+    assert [row[:2] for row in rows] == [['a02', '0.7'], ['a02', '1.0'], ['a07', 'ok']]
+    assert rows[0][2:4] == ['1', 'fail'] and rows[0][-1] == '*'
+    assert rows[1][2] == 'ok' and rows[1][-1] == '100'
+    assert lines[-1].startswith('*')
+
+    lines = telemetry.compare('old', 'new').splitlines()
+    assert lines[0] == 'old -> new'
+    rows = dict((tuple(line.split()[:2]), line.split()[2:]) for line in lines[2:])
+    assert rows[('a02', '0.7')] == ['2.00', '1.00', '0.50', '1.00', '1.00', '1.00']
+    assert rows[('a02', '1.0')] == ['4.00', '-', '-', '3.00', '-', '-']
+    assert rows[('a03', '0.7')] == ['-', '1.00', '-', '-', '1.00', '-']